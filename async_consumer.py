@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+import asyncio
+import inspect
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+import aio_pika
+import httpx
+
+from common.log import SAMPLED, get_logger
+from common.metrics import ConsumerMetrics, published_at
+from common.retry import DEFAULT_RETRY_POLICY, ORIGINAL_ROUTING_KEY_HEADER, parking_queue_name
+from common.serialization import SerializationError, decode
+from common.topic_trie import TopicTrie
+from consumer import DEFAULT_PREFETCH
+
+Handler = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+BatchHandler = Callable[[List[Dict[str, Any]]], Union[Optional[Iterable[int]], Awaitable[Optional[Iterable[int]]]]]
+
+
+async def _call(handler, payload):
+    """Ejecuta un manejador async en el loop o uno síncrono en un hilo"""
+    if inspect.iscoroutinefunction(handler):
+        return await handler(payload)
+    return await asyncio.to_thread(handler, payload)
+
+
+class _AsyncBatchState:
+    """Entregas acumuladas de una cola con manejador por lotes."""
+
+    def __init__(self, queue_name, handler, max_batch, max_wait):
+        self.queue_name = queue_name
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.channel = None
+        self.buffer = []  # (mensaje entrante, mensaje decodificado)
+        self.first_at = None
+        self.timer = None
+        self.in_flight = False
+
+
+class AsyncEventConsumer:
+    def __init__(self, rabbitmq_host='localhost', rabbitmq_port=5672, consumer_id=None,
+                 broker_api=None, prefetch_count=DEFAULT_PREFETCH, concurrency=10,
+                 retry_policy=DEFAULT_RETRY_POLICY, dedup=None, metrics=None):
+        """
+        Variante asyncio de EventConsumer (aio-pika)
+
+        Mismo ciclo de vida (register_handler, start, stop), pero los manejadores
+        pueden ser ``async def`` y se ejecutan muchos a la vez en el event loop,
+        como máximo ``concurrency``. Los manejadores síncronos se ejecutan en un hilo.
+
+        Args:
+            rabbitmq_host: Host donde se ejecuta RabbitMQ
+            rabbitmq_port: Puerto de RabbitMQ
+            consumer_id: Identificador del consumidor
+            broker_api: URL de la API del broker para registrar las colas (opcional)
+            prefetch_count: Mensajes sin ack en vuelo (como mínimo concurrency)
+            concurrency: Manejadores ejecutándose a la vez
+            retry_policy: RetryPolicy para los mensajes que fallan; con None se
+                devuelven a la cola de inmediato
+            dedup: DedupStore para descartar mensajes ya procesados (por message_id)
+            metrics: ConsumerMetrics donde registrar entregas, resultados y tiempos
+        """
+        self.rabbitmq_host = rabbitmq_host
+        self.rabbitmq_port = rabbitmq_port
+        self.broker_api = broker_api
+        self.consumer_id = consumer_id or f"consumer-{uuid.uuid4().hex[:6]}"
+        self.log = get_logger('async_consumer', consumer=self.consumer_id)
+        self.prefetch_count = max(prefetch_count or 0, concurrency)
+        self.concurrency = concurrency
+        self.retry_policy = retry_policy
+        self.dedup = dedup
+        self.metrics = metrics or ConsumerMetrics()
+        self.connection = None
+        self.channel = None
+        self.message_handlers: Dict[str, Handler] = {}
+        self.routes: Dict[str, TopicTrie] = {}  # cola -> patrón de routing -> manejador
+        self.batch_handlers: Dict[str, _AsyncBatchState] = {}
+        self.subscriptions = []  # (cola, exchange, clave de routing)
+        self.running = False
+        self._semaphore = None
+        self._tasks = set()
+        self._consumers = []  # (cola de aio-pika, consumer tag)
+
+    async def connect(self):
+        """Establece conexión robusta con RabbitMQ."""
+        try:
+            self.connection = await aio_pika.connect_robust(host=self.rabbitmq_host, port=self.rabbitmq_port)
+            self.channel = await self.connection.channel()
+            await self.channel.set_qos(prefetch_count=self.prefetch_count)
+            self.log.info("Conectado a RabbitMQ")
+        except Exception as e:
+            self.log.error("Error de conexión: %s", e)
+            raise
+
+    def register_handler(self, queue_name: str, handler: Handler, pattern: Optional[str] = None):
+        """Registra un manejador (async o síncrono) para una cola, opcionalmente solo para un patrón de routing."""
+        if not callable(handler):
+            raise ValueError("El manejador debe ser una función.")
+        if pattern is None:
+            self.message_handlers[queue_name] = handler
+            self.log.info("Manejador registrado para '%s'", queue_name)
+        else:
+            self.routes.setdefault(queue_name, TopicTrie()).add(pattern, handler)
+            self.log.info("Manejador registrado para '%s' con patrón '%s'", queue_name, pattern)
+
+    def _resolve_handler(self, queue_name: str, routing_key: str):
+        """Primer patrón registrado que encaje con la clave o, si no, el manejador por defecto de la cola."""
+        routes = self.routes.get(queue_name)
+        if routes is not None:
+            matches = routes.match(routing_key)
+            if matches:
+                return matches[0]
+        return self.message_handlers.get(queue_name)
+
+    def register_batch_handler(self, queue_name: str, handler: BatchHandler,
+                               max_batch: int = 100, max_wait: float = 1.0):
+        """
+        Registra un manejador por lotes, con la misma semántica que en EventConsumer:
+        puede devolver los índices que fallaron; el resto se confirma con un ack múltiple.
+        """
+        if not callable(handler):
+            raise ValueError("El manejador debe ser una función.")
+        if max_batch < 1:
+            raise ValueError("max_batch debe ser al menos 1.")
+        self.batch_handlers[queue_name] = _AsyncBatchState(queue_name, handler, max_batch, max_wait)
+        self.log.info("Manejador por lotes registrado para '%s' (máx. %d)", queue_name, max_batch)
+
+    def subscribe(self, queue_name: str, exchange_name: str, routing_key: str = ''):
+        """Vincula (al iniciar) una cola a un exchange topic con una clave de routing."""
+        self.subscriptions.append((queue_name, exchange_name, routing_key))
+
+    async def _setup_queue(self, channel, queue_name: str):
+        """Declara una cola y la vincula a amq.topic con su nombre, como EventConsumer."""
+        queue = await channel.declare_queue(queue_name, durable=True)
+        await queue.bind('amq.topic', routing_key=queue_name)
+        if self.retry_policy is not None:
+            for name, arguments in self.retry_policy.queue_arguments(queue_name):
+                await channel.declare_queue(name, durable=True, arguments=arguments)
+        for name, exchange_name, routing_key in self.subscriptions:
+            if name == queue_name:
+                await channel.declare_exchange(exchange_name, aio_pika.ExchangeType.TOPIC, durable=True)
+                await queue.bind(exchange_name, routing_key=routing_key)
+                self.log.info("'%s' suscrita a '%s' con clave '%s'", queue_name, exchange_name, routing_key)
+        await self._register_with_broker(queue_name)
+        return queue
+
+    async def _register_with_broker(self, queue_name: str):
+        """Informa de la cola a la API del broker para sus estadísticas (si está configurada)."""
+        if not self.broker_api:
+            return
+        try:
+            async with httpx.AsyncClient(timeout=2) as client:
+                await client.post(f"{self.broker_api}/queues/watch", json={"queueName": queue_name})
+        except Exception as e:
+            self.log.warning("No se pudo registrar '%s' en el broker: %s", queue_name, e)
+
+    async def _retry(self, channel, queue_name: str, incoming, error, ack=True):
+        """
+        Envía un mensaje fallido a su cola de espera (o a aparcados) y, con ack, lo confirma.
+
+        Sin política de reintentos, o si no se puede republicar, vuelve a la cola.
+
+        Returns:
+            True si se republicó
+        """
+        if self.retry_policy is not None:
+            try:
+                target, headers = self.retry_policy.next_hop(
+                    queue_name, incoming.routing_key or '', incoming.headers, error
+                )
+                await channel.default_exchange.publish(
+                    aio_pika.Message(
+                        incoming.body,
+                        headers=headers,
+                        content_type=incoming.content_type,
+                        content_encoding=incoming.content_encoding,
+                        message_id=incoming.message_id,
+                        correlation_id=incoming.correlation_id,
+                        timestamp=incoming.timestamp,
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                    ),
+                    routing_key=target
+                )
+                self.metrics.outcome(queue_name, 'parked' if target == parking_queue_name(queue_name) else 'retry')
+                if ack:
+                    await incoming.ack()
+                return True
+            except Exception as e:
+                self.log.error("No se pudo programar el reintento: %s", e)
+        await incoming.nack(requeue=True)
+        self.metrics.outcome(queue_name, 'requeue')
+        return False
+
+    async def _timed_call(self, queue_name: str, handler, payload):
+        """Ejecuta un manejador registrando su duración (también si falla)."""
+        started = time.perf_counter()
+        try:
+            return await _call(handler, payload)
+        finally:
+            self.metrics.handler_time(queue_name, time.perf_counter() - started)
+
+    def _record_ack(self, queue_name: str, message, incoming):
+        """Registra un mensaje confirmado y su latencia desde que se publicó."""
+        self.metrics.outcome(queue_name, 'ack')
+        sent_at = published_at(message, incoming)
+        if sent_at is not None:
+            self.metrics.latency(queue_name, time.time() - sent_at)
+
+    async def _dedup_call(self, func, *args):
+        """Operación del registro de deduplicación; con backend persistente, en un hilo."""
+        if self.dedup.backend is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def _processed_ids(self, incomings):
+        """Ids de las entregas que ya se procesaron (si falla la consulta, ninguno)."""
+        if self.dedup is None:
+            return set()
+        try:
+            return await self._dedup_call(
+                self.dedup.filter_seen,
+                [incoming.message_id for incoming in incomings]
+            )
+        except Exception as e:
+            self.log.warning("Error consultando la deduplicación: %s", e)
+            return set()
+
+    async def _mark_processed(self, message_ids):
+        if self.dedup is None:
+            return
+        try:
+            await self._dedup_call(self.dedup.mark_processed, message_ids)
+        except Exception as e:
+            self.log.warning("Error registrando mensajes procesados: %s", e)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # Mensajes individuales
+
+    async def _on_message(self, queue_name: str, incoming: aio_pika.abc.AbstractIncomingMessage):
+        """Recibe una entrega y la procesa en una tarea, respetando el límite de concurrencia."""
+        await self._semaphore.acquire()
+        self._spawn(self._process(queue_name, incoming))
+
+    async def _process(self, queue_name: str, incoming):
+        self.metrics.delivered(queue_name)
+        try:
+            message = decode(incoming.body, incoming.content_type, incoming.content_encoding)
+            routing_key = (incoming.headers or {}).get(ORIGINAL_ROUTING_KEY_HEADER, incoming.routing_key or '')
+            handler = self._resolve_handler(queue_name, routing_key)
+            if await self._processed_ids([incoming]):
+                self.log.debug("Mensaje %s ya procesado, se descarta", incoming.message_id, extra=SAMPLED)
+                await incoming.ack()
+                self.metrics.outcome(queue_name, 'duplicate')
+                return
+            if handler is None:
+                self.log.warning("No hay manejador en '%s' para '%s'", queue_name, routing_key)
+                await incoming.nack(requeue=False)
+                self.metrics.outcome(queue_name, 'reject')
+                return
+            await self._timed_call(queue_name, handler, message)
+            await self._mark_processed([incoming.message_id])
+            await incoming.ack()
+            self._record_ack(queue_name, message, incoming)
+        except SerializationError as e:
+            self.log.warning("Mensaje no decodificable: %s", e)
+            await incoming.nack(requeue=False)
+            self.metrics.outcome(queue_name, 'reject')
+        except Exception as e:
+            self.log.error("Error procesando mensaje: %s", e)
+            await self._retry(self.channel, queue_name, incoming, e)
+        finally:
+            self._semaphore.release()
+
+    # Lotes
+
+    async def _on_batch_message(self, state: _AsyncBatchState, incoming):
+        self.metrics.delivered(state.queue_name)
+        try:
+            message = decode(incoming.body, incoming.content_type, incoming.content_encoding)
+        except SerializationError as e:
+            self.log.warning("Mensaje no decodificable: %s", e)
+            await incoming.nack(requeue=False)
+            self.metrics.outcome(state.queue_name, 'reject')
+            return
+
+        if not state.buffer:
+            state.first_at = time.monotonic()
+        state.buffer.append((incoming, message))
+        if len(state.buffer) >= state.max_batch:
+            self._flush_batch(state)
+        elif state.timer is None and not state.in_flight:
+            state.timer = asyncio.get_running_loop().call_later(state.max_wait, self._batch_timeout, state)
+
+    def _batch_timeout(self, state):
+        state.timer = None
+        self._flush_batch(state)
+
+    def _flush_batch(self, state):
+        """Lanza el lote pendiente (un lote en curso por cola)."""
+        if state.in_flight or not state.buffer:
+            return
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        batch, state.buffer = state.buffer[:state.max_batch], state.buffer[state.max_batch:]
+        state.first_at = time.monotonic() if state.buffer else None
+        state.in_flight = True
+        self._spawn(self._process_batch(state, batch))
+
+    async def _process_batch(self, state, batch):
+        # Los ya procesados no llegan al manejador; se confirman con el resto del lote
+        processed = await self._processed_ids([incoming for incoming, _ in batch])
+        pending = [index for index, (incoming, _) in enumerate(batch) if incoming.message_id not in processed]
+        if len(pending) < len(batch):
+            self.metrics.outcome(state.queue_name, 'duplicate', len(batch) - len(pending))
+            self.log.debug("%d mensajes de '%s' ya procesados, se descartan", len(batch) - len(pending), state.queue_name)
+
+        failed, error = (), None
+        if pending:
+            async with self._semaphore:
+                try:
+                    failed = await self._timed_call(state.queue_name, state.handler, [batch[index][1] for index in pending])
+                except Exception as e:
+                    self.log.error("Error procesando lote de '%s': %s", state.queue_name, e)
+                    failed, error = range(len(pending)), e
+
+        # Índices del manejador -> índices del lote
+        failed = {pending[index] for index in (failed or ())}
+        error = error or "El manejador por lotes marcó el mensaje como fallido"
+        await self._mark_processed([batch[index][0].message_id for index in pending if index not in failed])
+        try:
+            requeued = set()
+            for index in sorted(failed):
+                # Los republicados se confirman junto con el resto en el ack múltiple
+                if not await self._retry(state.channel, state.queue_name, batch[index][0], error, ack=False):
+                    requeued.add(index)
+            acked = [incoming for index, (incoming, _) in enumerate(batch) if index not in requeued]
+            if acked:
+                # Los tags menores ya están confirmados o devueltos: un solo ack los cubre
+                await max(acked, key=lambda incoming: incoming.delivery_tag).ack(multiple=True)
+                for index in pending:
+                    if index not in failed:
+                        self._record_ack(state.queue_name, batch[index][1], batch[index][0])
+            if failed:
+                destination = "enviados a reintento" if self.retry_policy is not None else "devueltos a la cola"
+                self.log.info("%d de %d mensajes de '%s' %s", len(failed), len(batch), state.queue_name, destination)
+        except Exception as e:
+            self.log.warning("No se pudo confirmar el lote de '%s': %s", state.queue_name, e)
+        finally:
+            state.in_flight = False
+
+        if state.buffer:
+            remaining = state.max_wait - (time.monotonic() - state.first_at)
+            if len(state.buffer) >= state.max_batch or remaining <= 0:
+                self._flush_batch(state)
+            elif state.timer is None:
+                state.timer = asyncio.get_running_loop().call_later(remaining, self._batch_timeout, state)
+
+    # Ciclo de vida
+
+    async def start(self):
+        """Declara las colas y empieza a consumir en el event loop actual."""
+        if self.running:
+            return
+        if self.connection is None:
+            await self.connect()
+        self.running = True
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        for queue_name in dict.fromkeys([*self.message_handlers, *self.routes]):
+            queue = await self._setup_queue(self.channel, queue_name)
+            tag = await queue.consume(lambda incoming, name=queue_name: self._on_message(name, incoming))
+            self._consumers.append((queue, tag))
+
+        for queue_name, state in self.batch_handlers.items():
+            # Canal propio: el ack múltiple solo debe cubrir entregas de esta cola
+            state.channel = await self.connection.channel()
+            await state.channel.set_qos(prefetch_count=max(self.prefetch_count, 2 * state.max_batch))
+            queue = await self._setup_queue(state.channel, queue_name)
+            tag = await queue.consume(lambda incoming, s=state: self._on_batch_message(s, incoming))
+            self._consumers.append((queue, tag))
+
+        self.log.info("Escuchando mensajes...")
+
+    async def stop(self, timeout=30.0):
+        """Deja de recibir mensajes, espera a los manejadores en curso y cierra la conexión."""
+        if not self.running:
+            return
+        self.running = False
+        for queue, tag in self._consumers:
+            try:
+                await queue.cancel(tag)
+            except Exception:
+                pass
+        self._consumers.clear()
+        for state in self.batch_handlers.values():
+            if state.timer is not None:
+                state.timer.cancel()
+                state.timer = None
+            # Lo acumulado sin procesar vuelve a la cola al cerrar el canal
+            state.buffer.clear()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+        if self.dedup is not None:
+            self.log.info("Deduplicación: %s", self.dedup.stats())
+        self.log.info("Detenido")
@@ -0,0 +1,746 @@
+#!/usr/bin/env python
+import asyncio
+import random
+import uuid
+import time
+import aio_pika
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from common.log import SAMPLED, get_logger
+from common.queue_stats import QueueStatsCollector
+from common.transport import get_transport
+from common.retry import (LAST_ERROR_HEADER, ORIGINAL_ROUTING_KEY_HEADER, PARKED_AT_HEADER,
+                          RETRY_COUNT_HEADER, parking_queue_name)
+from common.serialization import SerializationError, decode, get_codec
+
+# Máximo de mensajes aceptados en una sola petición de lote
+MAX_BATCH_SIZE = 1000
+
+# Mensajes aparcados devueltos como máximo por una inspección
+MAX_PARKED_INSPECT = 500
+
+logger = get_logger('async_event_broker')
+
+class AsyncEventBroker:
+    def __init__(self, host='localhost', port=5672, management_port=5000, heartbeat=60,
+                 reconnect_base_delay=1.0, reconnect_max_delay=30.0,
+                 stats_ttl=5.0, management_url=None,
+                 serializer='json', compression=None, compress_threshold=1024):
+        """
+        Inicializa la variante asyncio del Event Broker (ASGI + aio-pika)
+
+        Expone las mismas rutas y el mismo contrato JSON que EventBroker, pero cada
+        petición publica sin bloquear el event loop, de modo que un solo proceso
+        puede mantener miles de publicaciones en curso.
+
+        Args:
+            host: Host donde se ejecuta RabbitMQ
+            port: Puerto de RabbitMQ
+            management_port: Puerto para la API REST de gestión
+            heartbeat: Intervalo de heartbeat negociado con RabbitMQ (segundos)
+            reconnect_base_delay: Espera inicial antes de reintentar la conexión
+            reconnect_max_delay: Espera máxima entre reintentos de conexión
+            stats_ttl: Segundos de validez de la caché de estadísticas de colas
+            management_url: URL de la API de management de RabbitMQ (tasas y descubrimiento de colas)
+            serializer: Serializador por defecto de los mensajes ('json', 'orjson', 'msgpack')
+            compression: Compresión por defecto ('gzip', 'deflate') o None
+            compress_threshold: Tamaño mínimo en bytes para comprimir
+        """
+        self.host = host
+        self.port = port
+        self.management_port = management_port
+        self.heartbeat = heartbeat
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.codec = get_codec(serializer, compression, compress_threshold)
+        self.connection = None
+        self.channel = None
+        self.confirm_channel = None
+        self.exchanges = {}  # Mapeo de nombre de exchange -> info
+        self.queues = {}  # Mapeo de nombre de cola -> info
+        self.bindings = set()  # Tuplas (cola, exchange, clave de routing)
+        # Corutinas sin argumentos que se ejecutan al establecer la conexión
+        self.connect_callbacks = []
+
+        # Estado de la conexión expuesto por la API de gestión
+        self.state = 'disconnected'
+        self.connected_at = None
+        self.last_error = None
+        self.reconnect_attempts = 0
+        self.reconnections = 0
+        self._exchange_objects = {}  # Caché de objetos Exchange por canal
+        self._connect_task = None
+
+        # Las estadísticas se refrescan en su propio hilo con una conexión bloqueante:
+        # las peticiones solo leen la instantánea en caché y no tocan el event loop
+        self.stats = QueueStatsCollector(
+            lambda: get_transport('rabbitmq').connect(self.host, self.port, heartbeat=self.heartbeat),
+            ttl=stats_ttl,
+            management_url=management_url
+        )
+
+        # API REST para gestión
+        self.app = FastAPI(title="Event Broker")
+        self.app.add_event_handler("startup", self.start_connecting)
+        self.app.add_event_handler("shutdown", self.close)
+        self.setup_routes()
+
+    async def connect(self):
+        """
+        Establece conexión robusta con RabbitMQ (reconecta y restaura la topología)
+
+        aio-pika solo reintenta una conexión que ya se estableció: si RabbitMQ no
+        está disponible al arrancar, el reintento lo hace _connect_loop.
+
+        Returns:
+            True si se conectó, False si falló
+        """
+        self.state = 'connecting'
+        try:
+            self.connection = await aio_pika.connect_robust(
+                host=self.host,
+                port=self.port,
+                heartbeat=self.heartbeat
+            )
+            self.connection.reconnect_callbacks.add(self._on_reconnect)
+            self.channel = await self.connection.channel(publisher_confirms=False)
+            self.confirm_channel = await self.connection.channel(publisher_confirms=True)
+        except Exception as e:
+            self.state = 'disconnected'
+            self.last_error = str(e)
+            logger.error("Error al conectar a RabbitMQ: %s", e)
+            await self._close_connection()
+            return False
+
+        self.state = 'connected'
+        self.connected_at = time.time()
+        self.last_error = None
+        logger.info("Conectado a RabbitMQ en %s:%s", self.host, self.port)
+        for callback in self.connect_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error("Error en callback de conexión: %s", e)
+        return True
+
+    async def _connect_loop(self):
+        """Reintenta la conexión con backoff exponencial y jitter hasta lograrlo"""
+        self.reconnect_attempts = 0
+        while True:
+            # Full jitter: espera aleatoria entre 0 y el límite exponencial
+            delay = min(
+                self.reconnect_max_delay,
+                self.reconnect_base_delay * (2 ** self.reconnect_attempts)
+            )
+            delay = random.uniform(0, delay)
+            self.reconnect_attempts += 1
+            self.state = 'reconnecting'
+            logger.warning("Reintento de conexión #%d en %.1fs", self.reconnect_attempts, delay)
+            await asyncio.sleep(delay)
+            if await self.connect():
+                self.reconnect_attempts = 0
+                self._connect_task = None
+                return
+
+    async def start_connecting(self):
+        """Conecta al arrancar la API; si falla, sigue reintentando en segundo plano"""
+        self.stats.start()
+        if not await self.connect():
+            self.state = 'reconnecting'
+            self._connect_task = asyncio.create_task(self._connect_loop())
+
+    async def _close_connection(self):
+        connection, self.connection = self.connection, None
+        self.channel = None
+        self.confirm_channel = None
+        self._exchange_objects.clear()
+        if connection is not None and not connection.is_closed:
+            try:
+                await connection.close()
+            except Exception:
+                pass
+
+    def is_connected(self):
+        """Indica si la conexión y los canales están abiertos (aio-pika no está reconectando)"""
+        return bool(
+            self.connection and not self.connection.is_closed
+            and self.channel and not self.channel.is_closed
+            and self.confirm_channel and not self.confirm_channel.is_closed
+        )
+
+    def _unavailable(self):
+        """Respuesta 503 para las rutas que necesitan RabbitMQ mientras no hay conexión"""
+        return JSONResponse({
+            "error": "Sin conexión con RabbitMQ",
+            "state": self.connection_status()["state"]
+        }, status_code=503)
+
+    def _on_reconnect(self, *args, **kwargs):
+        """Callback de aio-pika tras reconectar"""
+        self.reconnections += 1
+        self.connected_at = time.time()
+        self._exchange_objects.clear()
+        logger.info("Conexión con RabbitMQ restablecida")
+
+    async def close(self):
+        """Detiene los reintentos y cierra la conexión con RabbitMQ"""
+        if self._connect_task is not None:
+            self._connect_task.cancel()
+            self._connect_task = None
+        await asyncio.to_thread(self.stats.stop)
+        await self._close_connection()
+        self.state = 'stopped'
+        logger.info("Event Broker detenido")
+
+    def connection_status(self):
+        """Devuelve el estado de la conexión para la API de gestión"""
+        state = self.state
+        if state == 'connected' and not self.is_connected():
+            # aio-pika está restableciendo la conexión
+            state = 'reconnecting'
+        return {
+            "state": state,
+            "host": self.host,
+            "port": self.port,
+            "connectedAt": self.connected_at,
+            "reconnectAttempts": self.reconnect_attempts,
+            "reconnections": self.reconnections,
+            "lastError": self.last_error,
+        }
+
+    def setup_routes(self):
+        """Configura las rutas de la API REST para gestión del broker"""
+
+        @self.app.post('/queues')
+        async def create_queue(request: Request):
+            """Crear una nueva cola"""
+            data = await request.json()
+            queue_name = data.get('queueName')
+            durable = data.get('durable', True)
+
+            if not queue_name:
+                return JSONResponse({"error": "Nombre de cola requerido"}, status_code=400)
+
+            if not self.is_connected():
+                return self._unavailable()
+
+            try:
+                await self.declare_queue(queue_name, durable)
+                return JSONResponse({"message": f'Cola "{queue_name}" creada correctamente'}, status_code=201)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        @self.app.post('/exchanges')
+        async def create_exchange(request: Request):
+            """Crear un nuevo exchange"""
+            data = await request.json()
+            exchange_name = data.get('exchangeName')
+            exchange_type = data.get('type', 'topic')
+            durable = data.get('durable', True)
+
+            if not exchange_name:
+                return JSONResponse({"error": "Nombre de exchange requerido"}, status_code=400)
+
+            if not self.is_connected():
+                return self._unavailable()
+
+            try:
+                await self.declare_exchange(exchange_name, exchange_type, durable)
+                return JSONResponse({"message": f'Exchange "{exchange_name}" creado correctamente'}, status_code=201)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        @self.app.post('/bindings')
+        async def create_binding(request: Request):
+            """Vincular una cola a un exchange con una clave de routing"""
+            data = await request.json()
+            queue_name = data.get('queueName')
+            exchange_name = data.get('exchangeName')
+            routing_key = data.get('routingKey', '')
+
+            if not queue_name or not exchange_name:
+                return JSONResponse({"error": "Nombre de cola y exchange requeridos"}, status_code=400)
+
+            if not self.is_connected():
+                return self._unavailable()
+
+            try:
+                await self.bind_queue(queue_name, exchange_name, routing_key)
+                return JSONResponse({
+                    "message": f'Cola "{queue_name}" vinculada a exchange "{exchange_name}" con clave "{routing_key}"'
+                }, status_code=201)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        @self.app.post('/messages')
+        async def publish_message(request: Request):
+            """Publicar un mensaje en un exchange"""
+            data = await request.json()
+            exchange_name = data.get('exchangeName', '')
+            routing_key = data.get('routingKey', '')
+            message = data.get('message')
+
+            if message is None:
+                return JSONResponse({"error": "Mensaje requerido"}, status_code=400)
+
+            if not self.is_connected():
+                return self._unavailable()
+
+            try:
+                codec = self.request_codec(data)
+            except SerializationError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+
+            try:
+                message_id = await self.publish_message(exchange_name, routing_key, message, codec=codec)
+                return JSONResponse({
+                    "messageId": message_id,
+                    "message": "Mensaje publicado correctamente"
+                }, status_code=201)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        @self.app.post('/messages/batch')
+        async def publish_message_batch(request: Request):
+            """Publicar un lote de mensajes con confirmación del broker"""
+            data = await request.json()
+            entries = data.get('messages') if isinstance(data, dict) else data
+
+            if not isinstance(entries, list) or not entries:
+                return JSONResponse({"error": "Lista de mensajes requerida"}, status_code=400)
+
+            if len(entries) > MAX_BATCH_SIZE:
+                return JSONResponse({"error": f"El lote excede el máximo de {MAX_BATCH_SIZE} mensajes"}, status_code=400)
+
+            if not self.is_connected():
+                return self._unavailable()
+
+            try:
+                # Codec común del lote; cada entrada puede sobrescribirlo
+                codec = self.request_codec(data) if isinstance(data, dict) else self.codec
+            except SerializationError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+
+            try:
+                results = await self.publish_batch(entries, codec=codec)
+                acked = sum(1 for r in results if r['status'] == 'ack')
+                return JSONResponse({
+                    "results": results,
+                    "acked": acked,
+                    "failed": len(results) - acked
+                }, status_code=201 if acked == len(results) else 207)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        @self.app.get('/queues')
+        async def list_queues():
+            """Listar todas las colas"""
+            return JSONResponse({"queues": list(self.queues.keys())}, status_code=200)
+
+        @self.app.get('/queues/stats')
+        async def queue_stats():
+            """Profundidad, consumidores y tasas de las colas conocidas (en caché)"""
+            return JSONResponse(self.stats.snapshot(), status_code=200)
+
+        @self.app.post('/queues/watch')
+        async def watch_queue(request: Request):
+            """Registrar una cola declarada fuera del broker para sus estadísticas"""
+            data = await request.json()
+            queue_name = data.get('queueName')
+
+            if not queue_name:
+                return JSONResponse({"error": "Nombre de cola requerido"}, status_code=400)
+
+            self.stats.watch(queue_name)
+            return JSONResponse({"message": f'Cola "{queue_name}" registrada para estadísticas'}, status_code=201)
+
+        @self.app.get('/queues/{queue_name}/parked')
+        async def list_parked(queue_name: str, limit: int = 50):
+            """Mensajes aparcados de una cola tras agotar sus reintentos (sin retirarlos)"""
+            if not self.is_connected():
+                return self._unavailable()
+            try:
+                parked = await self.inspect_parked(queue_name, min(limit, MAX_PARKED_INSPECT))
+                return JSONResponse({"queue": parking_queue_name(queue_name), "messages": parked}, status_code=200)
+            except aio_pika.exceptions.ChannelNotFoundEntity as e:
+                return JSONResponse({"error": str(e)}, status_code=404)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        @self.app.post('/queues/{queue_name}/parked/replay')
+        async def replay_parked(queue_name: str, request: Request):
+            """Devolver a su cola los mensajes aparcados (todos, los N primeros o los indicados)"""
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            data = data if isinstance(data, dict) else {}
+            if not self.is_connected():
+                return self._unavailable()
+            try:
+                replayed = await self.replay_parked(queue_name, data.get('limit'), data.get('messageIds'))
+                return JSONResponse({"replayed": len(replayed), "messageIds": replayed}, status_code=200)
+            except aio_pika.exceptions.ChannelNotFoundEntity as e:
+                return JSONResponse({"error": str(e)}, status_code=404)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        @self.app.get('/exchanges')
+        async def list_exchanges():
+            """Listar todos los exchanges"""
+            return JSONResponse({"exchanges": list(self.exchanges)}, status_code=200)
+
+        @self.app.get('/status')
+        async def get_status():
+            """Estado de la conexión con RabbitMQ"""
+            status = self.connection_status()
+            return JSONResponse(status, status_code=200 if status["state"] == 'connected' else 503)
+
+    def request_codec(self, data, default=None):
+        """Codec pedido por el cliente ('serializer'/'compression') o el codec por defecto"""
+        base = default or self.codec
+        if 'serializer' not in data and 'compression' not in data:
+            return base
+        return get_codec(
+            data.get('serializer', base.serializer.name),
+            data.get('compression', base.compression),
+            base.compress_threshold
+        )
+
+    async def declare_queue(self, queue_name, durable=True):
+        """
+        Declara una cola en RabbitMQ
+
+        Args:
+            queue_name: Nombre de la cola
+            durable: Si la cola debe persistir después de reiniciar el broker
+
+        Returns:
+            True si se creó correctamente
+        """
+        try:
+            await self.channel.declare_queue(queue_name, durable=durable)
+            self.queues[queue_name] = {
+                'name': queue_name,
+                'durable': durable,
+                'created_at': time.time()
+            }
+            self.stats.watch(queue_name)
+            logger.info('Cola "%s" declarada', queue_name)
+            return True
+        except Exception as e:
+            logger.error('Error al declarar cola "%s": %s', queue_name, e)
+            raise
+
+    async def declare_exchange(self, exchange_name, exchange_type='topic', durable=True):
+        """
+        Declara un exchange en RabbitMQ
+
+        Args:
+            exchange_name: Nombre del exchange
+            exchange_type: Tipo de exchange (direct, fanout, topic, headers)
+            durable: Si el exchange debe persistir después de reiniciar el broker
+
+        Returns:
+            True si se creó correctamente
+        """
+        try:
+            await self.channel.declare_exchange(
+                exchange_name,
+                type=aio_pika.ExchangeType(exchange_type),
+                durable=durable
+            )
+            self.exchanges[exchange_name] = {
+                'name': exchange_name,
+                'type': exchange_type,
+                'durable': durable,
+                'created_at': time.time()
+            }
+            logger.info('Exchange "%s" declarado', exchange_name)
+            return True
+        except Exception as e:
+            logger.error('Error al declarar exchange "%s": %s', exchange_name, e)
+            raise
+
+    async def bind_queue(self, queue_name, exchange_name, routing_key=''):
+        """
+        Vincula una cola a un exchange
+
+        Args:
+            queue_name: Nombre de la cola
+            exchange_name: Nombre del exchange
+            routing_key: Clave de routing para el binding
+
+        Returns:
+            True si se vinculó correctamente
+        """
+        try:
+            queue = await self.channel.get_queue(queue_name, ensure=False)
+            await queue.bind(exchange_name, routing_key=routing_key)
+            self.bindings.add((queue_name, exchange_name, routing_key))
+            logger.info('Cola "%s" vinculada a exchange "%s" con clave "%s"', queue_name, exchange_name, routing_key)
+            return True
+        except Exception as e:
+            logger.error('Error al vincular cola "%s" a exchange "%s": %s', queue_name, exchange_name, e)
+            raise
+
+    async def _get_exchange(self, channel, exchange_name):
+        """Obtiene (sin redeclarar) el objeto Exchange de aio-pika para publicar"""
+        if not exchange_name:
+            return channel.default_exchange
+        key = (id(channel), exchange_name)
+        exchange = self._exchange_objects.get(key)
+        if exchange is None:
+            exchange = await channel.get_exchange(exchange_name, ensure=False)
+            self._exchange_objects[key] = exchange
+        return exchange
+
+    async def publish_message(self, exchange_name, routing_key, message, channel=None, codec=None):
+        """
+        Publica un mensaje en un exchange
+
+        Args:
+            exchange_name: Nombre del exchange
+            routing_key: Clave de routing para el mensaje
+            message: Mensaje a publicar (será serializado con el codec)
+            channel: Canal a usar (por defecto el canal sin confirmaciones)
+            codec: MessageCodec a usar (por defecto el del broker)
+
+        Returns:
+            ID del mensaje publicado
+        """
+        try:
+            # Si el mensaje no es un diccionario, lo encapsulamos
+            if not isinstance(message, dict):
+                message = {'data': message}
+
+            # Conservar el ID que puso el productor: sus reintentos, el spool y la
+            # vía directa reutilizan el mismo y la deduplicación lo reconoce
+            message_id = str(message.get('message_id') or uuid.uuid4())
+            message['message_id'] = message_id
+
+            # Serializar (y comprimir si corresponde) el mensaje
+            body, content_type, content_encoding = (codec or self.codec).encode(message)
+
+            exchange = await self._get_exchange(channel or self.channel, exchange_name)
+            await exchange.publish(
+                aio_pika.Message(
+                    body=body,
+                    message_id=message_id,
+                    timestamp=int(time.time()),
+                    content_type=content_type,
+                    content_encoding=content_encoding,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=routing_key
+            )
+
+            logger.debug('Mensaje %s publicado en exchange "%s" con clave "%s"', message_id, exchange_name, routing_key,
+                         extra=SAMPLED)
+            return message_id
+        except Exception as e:
+            logger.error('Error al publicar mensaje: %s', e)
+            raise
+
+    async def publish_batch(self, entries, codec=None):
+        """
+        Publica un lote de mensajes en el canal con confirmaciones
+
+        Las publicaciones se lanzan concurrentemente y se esperan juntas, de modo que
+        las confirmaciones del lote viajan en paralelo.
+
+        Args:
+            entries: Lista de diccionarios {exchangeName, routingKey, message}
+            codec: MessageCodec por defecto del lote (por defecto el del broker)
+
+        Returns:
+            Lista con el resultado de cada mensaje (messageId y estado ack/nack/error)
+        """
+        return list(await asyncio.gather(*(
+            self._publish_batch_entry(index, entry, codec)
+            for index, entry in enumerate(entries)
+        )))
+
+    async def _publish_batch_entry(self, index, entry, codec=None):
+        """Publica una entrada de un lote y devuelve su resultado"""
+        result = {"index": index, "messageId": None, "status": "error"}
+
+        if not isinstance(entry, dict) or entry.get('message') is None:
+            result["error"] = "Mensaje requerido"
+            return result
+
+        message = entry['message']
+        if isinstance(message, dict):
+            # Evitar que publish_message modifique el payload del cliente
+            message = dict(message)
+
+        try:
+            result["messageId"] = await self.publish_message(
+                entry.get('exchangeName', ''),
+                entry.get('routingKey', ''),
+                message,
+                channel=self.confirm_channel,
+                codec=self.request_codec(entry, codec)
+            )
+            result["status"] = "ack"
+        except aio_pika.exceptions.DeliveryError as e:
+            result["status"] = "nack"
+            result["error"] = str(e)
+        except Exception as e:
+            result["error"] = str(e)
+
+        return result
+
+    async def inspect_parked(self, queue_name, limit=50):
+        """
+        Lee los mensajes aparcados de una cola sin retirarlos
+
+        Args:
+            queue_name: Cola original (se lee su cola de aparcados)
+            limit: Número máximo de mensajes a leer
+
+        Returns:
+            Lista de diccionarios con el mensaje y sus datos de reintento
+        """
+        parked = []
+        # Canal propio: si la cola no existe, RabbitMQ cierra el canal con un 404
+        async with self.connection.channel() as channel:
+            queue = await channel.get_queue(parking_queue_name(queue_name), ensure=False)
+            last = None
+            try:
+                while len(parked) < limit:
+                    message = await queue.get(no_ack=False, fail=False)
+                    if message is None:
+                        break
+                    last = message
+                    parked.append(self._describe_parked(message))
+            finally:
+                if last is not None and not channel.is_closed:
+                    # Solo lectura: todos vuelven a la cola de aparcados en su orden
+                    await last.nack(multiple=True, requeue=True)
+        return parked
+
+    def _describe_parked(self, message):
+        headers = message.headers or {}
+        try:
+            body = decode(message.body, message.content_type, message.content_encoding)
+        except SerializationError:
+            body = None
+        return {
+            "messageId": message.message_id,
+            "routingKey": headers.get(ORIGINAL_ROUTING_KEY_HEADER, message.routing_key),
+            "retries": headers.get(RETRY_COUNT_HEADER, 0),
+            "error": headers.get(LAST_ERROR_HEADER),
+            "parkedAt": headers.get(PARKED_AT_HEADER),
+            "message": body
+        }
+
+    async def replay_parked(self, queue_name, limit=None, message_ids=None):
+        """
+        Devuelve mensajes aparcados a su cola original con el contador de reintentos a cero
+
+        Args:
+            queue_name: Cola original
+            limit: Número máximo de mensajes a reenviar (por defecto todos)
+            message_ids: Reenviar solo estos mensajes (el resto sigue aparcado)
+
+        Returns:
+            IDs de los mensajes reenviados
+        """
+        wanted = set(message_ids) if message_ids else None
+        replayed = []
+        skipped = []
+        reset = (RETRY_COUNT_HEADER, LAST_ERROR_HEADER, PARKED_AT_HEADER)
+
+        # Con confirmación: el aparcado solo se retira si la cola original lo recibió
+        async with self.connection.channel(publisher_confirms=True) as channel:
+            queue = await channel.get_queue(parking_queue_name(queue_name), ensure=False)
+            try:
+                while limit is None or len(replayed) < limit:
+                    if wanted is not None and len(replayed) == len(wanted):
+                        break
+                    message = await queue.get(no_ack=False, fail=False)
+                    if message is None:
+                        break
+                    if wanted is not None and message.message_id not in wanted:
+                        skipped.append(message)
+                        continue
+                    headers = {k: v for k, v in (message.headers or {}).items() if k not in reset}
+                    await channel.default_exchange.publish(
+                        aio_pika.Message(
+                            body=message.body,
+                            headers=headers,
+                            content_type=message.content_type,
+                            content_encoding=message.content_encoding,
+                            message_id=message.message_id,
+                            correlation_id=message.correlation_id,
+                            timestamp=message.timestamp,
+                            delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                        ),
+                        routing_key=queue_name
+                    )
+                    await message.ack()
+                    replayed.append(message.message_id)
+            finally:
+                if not channel.is_closed:
+                    for message in skipped:
+                        await message.nack(requeue=True)
+
+        logger.info('%d mensajes aparcados de "%s" reenviados', len(replayed), queue_name)
+        return replayed
+
+    def start(self):
+        """Inicia la API de gestión sobre un servidor ASGI"""
+        import uvicorn
+        logger.info("Event Broker (asyncio) iniciado. API de gestión en puerto %s", self.management_port)
+        uvicorn.run(self.app, host='0.0.0.0', port=self.management_port)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Event Broker asyncio con RabbitMQ')
+    parser.add_argument('--host', default='localhost', help='Host de RabbitMQ')
+    parser.add_argument('--port', type=int, default=5672, help='Puerto de RabbitMQ')
+    parser.add_argument('--api-port', type=int, default=5000, help='Puerto para API de gestión')
+    parser.add_argument('--heartbeat', type=int, default=60, help='Intervalo de heartbeat (segundos)')
+    parser.add_argument('--max-reconnect-delay', type=float, default=30.0,
+                        help='Espera máxima entre reintentos de conexión (segundos)')
+    parser.add_argument('--stats-ttl', type=float, default=5.0,
+                        help='Segundos de caché de las estadísticas de colas')
+    parser.add_argument('--management-url', default=None,
+                        help='URL de la API de management de RabbitMQ (p. ej. http://localhost:15672)')
+    parser.add_argument('--watch-queue', action='append', default=[],
+                        help='Cola existente a incluir en las estadísticas (repetible)')
+    parser.add_argument('--serializer', default='json', choices=['json', 'orjson', 'msgpack'],
+                        help='Serializador por defecto de los mensajes')
+    parser.add_argument('--compression', default=None, choices=['gzip', 'deflate'],
+                        help='Compresión de mensajes grandes')
+
+    args = parser.parse_args()
+
+    broker = AsyncEventBroker(
+        host=args.host,
+        port=args.port,
+        management_port=args.api_port,
+        heartbeat=args.heartbeat,
+        reconnect_max_delay=args.max_reconnect_delay,
+        stats_ttl=args.stats_ttl,
+        management_url=args.management_url,
+        serializer=args.serializer,
+        compression=args.compression
+    )
+    broker.stats.watch(*args.watch_queue)
+
+    async def setup_defaults():
+        # Declarar exchange y cola por defecto
+        try:
+            await broker.declare_exchange('default', 'topic')
+            await broker.declare_queue('default')
+            await broker.bind_queue('default', 'default', '#')
+        except Exception as e:
+            logger.error("Error al configurar recursos por defecto: %s", e)
+
+    # Al conectar, aunque RabbitMQ no esté disponible todavía al arrancar
+    broker.connect_callbacks.append(setup_defaults)
+    broker.start()
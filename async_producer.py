@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import uuid
+from datetime import datetime
+
+import aio_pika
+import httpx
+
+from common.log import SAMPLED, get_logger
+from common.topology import topology
+from common.serialization import get_codec
+from producer import BATCH_CHUNK_SIZE, HTTP_POOL_SIZE
+
+logger = get_logger('async_producer')
+
+class AsyncEventProducer:
+    def __init__(self, rabbitmq_host='localhost', rabbitmq_port=5672,
+                 broker_api='http://localhost:5000', producer_id=None,
+                 serializer='json', compression=None, compress_threshold=1024,
+                 http_pool_size=HTTP_POOL_SIZE):
+        """
+        Inicializa la variante asyncio de EventProducer (httpx + aio-pika)
+
+        Ofrece la misma interfaz (publish, publish_batch, ensure_exchange) como
+        corrutinas, para publicar desde servicios FastAPI sin bloquear el event loop
+        ni ocupar un hilo del threadpool. La conexión AMQP se abre solo cuando se
+        necesita la vía directa.
+
+        Args:
+            rabbitmq_host: Host donde se ejecuta RabbitMQ
+            rabbitmq_port: Puerto de RabbitMQ
+            broker_api: URL de la API del broker
+            producer_id: Identificador único del productor
+            serializer: Serializador de los mensajes ('json', 'orjson', 'msgpack')
+            compression: Compresión ('gzip', 'deflate') o None
+            compress_threshold: Tamaño mínimo en bytes para comprimir
+            http_pool_size: Conexiones keep-alive a la API del broker
+        """
+        self.rabbitmq_host = rabbitmq_host
+        self.rabbitmq_port = rabbitmq_port
+        self.broker_api = broker_api
+        self.producer_id = producer_id or str(uuid.uuid4())
+        self.codec = get_codec(serializer, compression, compress_threshold)
+        self.http = httpx.AsyncClient(
+            base_url=broker_api,
+            limits=httpx.Limits(max_connections=http_pool_size, max_keepalive_connections=http_pool_size)
+        )
+        self.connection = None
+        self.channel = None
+        self._exchange_objects = {}  # Caché de objetos Exchange de aio-pika
+        self._connect_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        """Establece conexión directa (robusta) con RabbitMQ"""
+        try:
+            self.connection = await aio_pika.connect_robust(host=self.rabbitmq_host, port=self.rabbitmq_port)
+            self.connection.reconnect_callbacks.add(self._on_reconnect)
+            self.channel = await self.connection.channel(publisher_confirms=True)
+            logger.info("Productor %s conectado a RabbitMQ en %s:%s", self.producer_id, self.rabbitmq_host, self.rabbitmq_port)
+            return True
+        except Exception as e:
+            logger.error("Error al conectar a RabbitMQ: %s", e)
+            return False
+
+    def _on_reconnect(self, *args, **kwargs):
+        """Callback de aio-pika tras reconectar: la topología registrada ya no es fiable"""
+        topology.invalidate(self.connection)
+        self._exchange_objects.clear()
+
+    async def _get_channel(self):
+        """Canal con confirmaciones, conectando la primera vez que se necesita"""
+        async with self._connect_lock:
+            if self.channel is None or self.channel.is_closed:
+                if self.connection is not None:
+                    topology.invalidate(self.connection)
+                    self._exchange_objects.clear()
+                    if not self.connection.is_closed:
+                        # La conexión robusta sigue viva: basta con un canal nuevo
+                        try:
+                            self.channel = await self.connection.channel(publisher_confirms=True)
+                            return self.channel
+                        except Exception as e:
+                            logger.warning("No se pudo abrir un canal: %s; reconectando", e)
+                    await self._close_connection()
+                if not await self.connect():
+                    raise ConnectionError(f"No se pudo conectar a RabbitMQ en {self.rabbitmq_host}:{self.rabbitmq_port}")
+        return self.channel
+
+    async def _close_connection(self):
+        """Cierra la conexión actual (si la hay) antes de abrir otra"""
+        connection, self.connection, self.channel = self.connection, None, None
+        if connection is not None and not connection.is_closed:
+            try:
+                await connection.close()
+            except Exception:
+                pass
+
+    async def ensure_exchange(self, exchange_name, exchange_type='topic', use_api=True):
+        """
+        Asegura que exista un exchange, creándolo si es necesario
+
+        Args:
+            exchange_name: Nombre del exchange
+            exchange_type: Tipo de exchange (direct, fanout, topic, headers)
+            use_api: Si es True, intenta primero la API del broker
+
+        Returns:
+            True si se creó o ya existía
+        """
+        # El exchange por defecto ('') siempre existe y no se puede declarar
+        if not exchange_name:
+            return True
+
+        if (topology.is_declared(self.broker_api, exchange_name, exchange_type)
+                or (self.connection is not None
+                    and topology.is_declared(self.connection, exchange_name, exchange_type))):
+            return True
+
+        try:
+            if use_api:
+                response = await self.http.post(
+                    "/exchanges",
+                    json={
+                        "exchangeName": exchange_name,
+                        "type": exchange_type,
+                        "durable": True
+                    }
+                )
+                if response.status_code in [201, 200]:
+                    topology.mark_declared(self.broker_api, exchange_name, exchange_type)
+                    logger.info('Exchange "%s" verificado/creado mediante API', exchange_name)
+                    return True
+
+            # Sin API (o si falla), declarar directamente con RabbitMQ
+            channel = await self._get_channel()
+            exchange = await channel.declare_exchange(
+                exchange_name,
+                type=aio_pika.ExchangeType(exchange_type),
+                durable=True
+            )
+            self._exchange_objects[exchange_name] = exchange
+            topology.mark_declared(self.connection, exchange_name, exchange_type)
+            logger.info('Exchange "%s" declarado directamente', exchange_name)
+            return True
+        except Exception as e:
+            logger.error('Error al asegurar exchange "%s": %s', exchange_name, e)
+            return False
+
+    async def publish(self, message, exchange_name='default', routing_key='', use_api=True):
+        """
+        Publica un mensaje en un exchange
+
+        Args:
+            message: Mensaje a publicar (puede ser un diccionario o cualquier valor)
+            exchange_name: Nombre del exchange
+            routing_key: Clave de routing
+            use_api: Si es True, usa la API del broker, sino usa conexión directa
+
+        Returns:
+            ID del mensaje si se publicó correctamente, None en caso contrario
+        """
+        message_id, message_data = self._build_message(message)
+        return await self._publish_now(use_api, exchange_name, routing_key, message_id, message_data)
+
+    async def _publish_now(self, use_api, exchange_name, routing_key, message_id, message_data):
+        """Publica un mensaje ya preparado por la API o directamente"""
+        try:
+            if use_api:
+                response = await self.http.post(
+                    "/messages",
+                    json={
+                        "exchangeName": exchange_name,
+                        "routingKey": routing_key,
+                        "message": message_data,
+                        **self._codec_fields()
+                    }
+                )
+
+                if response.status_code == 201:
+                    result = response.json()
+                    logger.debug('Mensaje %s publicado mediante API', result.get("messageId"), extra=SAMPLED)
+                    return result.get("messageId")
+                logger.error('Error al publicar mensaje mediante API: %s', response.text)
+                # Si falla la API, intentar publicación directa con el mismo message_id
+                return await self._publish_now(False, exchange_name, routing_key, message_id, message_data)
+
+            await self.ensure_exchange(exchange_name, use_api=False)
+            await self._publish_direct(exchange_name, routing_key, message_id, message_data)
+            logger.debug('Mensaje %s publicado directamente en "%s" con clave "%s"',
+                         message_id, exchange_name, routing_key, extra=SAMPLED)
+            return message_id
+        except aio_pika.exceptions.AMQPError as e:
+            topology.invalidate(self.connection)
+            self._exchange_objects.clear()
+            logger.error('Error al publicar mensaje: %s', e)
+            return None
+        except Exception as e:
+            logger.error('Error al publicar mensaje: %s', e)
+            return None
+
+    def _build_message(self, message):
+        """Genera el ID y agrega los metadatos del productor al mensaje"""
+        message_id = str(uuid.uuid4())
+        message_data = message.copy() if isinstance(message, dict) else {'data': message}
+        message_data.update({
+            'message_id': message_id,
+            'producer_id': self.producer_id,
+            'timestamp': datetime.now().isoformat(),
+        })
+        return message_id, message_data
+
+    def _codec_fields(self):
+        """Campos para que el broker use el mismo codec que este productor"""
+        if self.codec.serializer.name == 'json' and not self.codec.compression:
+            return {}
+        return {
+            "serializer": self.codec.serializer.name,
+            "compression": self.codec.compression,
+        }
+
+    async def _get_exchange(self, exchange_name):
+        """Obtiene (sin redeclarar) el objeto Exchange de aio-pika para publicar"""
+        channel = await self._get_channel()
+        if not exchange_name:
+            return channel.default_exchange
+        exchange = self._exchange_objects.get(exchange_name)
+        if exchange is None:
+            exchange = await channel.get_exchange(exchange_name, ensure=False)
+            self._exchange_objects[exchange_name] = exchange
+        return exchange
+
+    async def _publish_direct(self, exchange_name, routing_key, message_id, message_data):
+        """Serializa y publica un mensaje ya preparado esperando su confirmación"""
+        body, content_type, content_encoding = self.codec.encode(message_data)
+        exchange = await self._get_exchange(exchange_name)
+        await exchange.publish(
+            aio_pika.Message(
+                body=body,
+                message_id=message_id,
+                timestamp=datetime.now(),
+                content_type=content_type,
+                content_encoding=content_encoding,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+            ),
+            routing_key=routing_key
+        )
+
+    async def publish_batch(self, messages, exchange_name='default', routing_key='', use_api=True,
+                            chunk_size=BATCH_CHUNK_SIZE):
+        """
+        Publica un lote de mensajes
+
+        Igual que EventProducer.publish_batch: con use_api se envían bloques a
+        /messages/batch y solo los mensajes que fallan se publican directamente, con
+        sus confirmaciones en paralelo.
+
+        Args:
+            messages: Lista de mensajes a publicar
+            exchange_name: Nombre del exchange
+            routing_key: Clave de routing
+            use_api: Si es True, usa la API del broker, sino usa conexión directa
+            chunk_size: Mensajes por petición a la API
+
+        Returns:
+            Lista con el resultado de cada mensaje, en el mismo orden:
+            {"messageId", "status" ('ack' o 'error'), "error", "path" ('api' o 'direct')}
+        """
+        entries = [self._build_message(message) for message in messages]
+        results = [None] * len(entries)
+        pending = list(range(len(entries)))
+
+        if use_api:
+            pending = await self._publish_batch_api(
+                exchange_name, routing_key, entries, pending, results, chunk_size)
+            if pending:
+                logger.warning('%d mensajes del lote fallaron en la API; reintentando directamente', len(pending))
+
+        if pending:
+            await self.ensure_exchange(exchange_name, use_api=False)
+            await asyncio.gather(*(
+                self._publish_batch_direct(exchange_name, routing_key, entries[i], i, results)
+                for i in pending
+            ))
+
+        return results
+
+    async def _publish_batch_api(self, exchange_name, routing_key, entries, indexes, results, chunk_size):
+        """
+        Envía las entradas a /messages/batch por bloques
+
+        Returns:
+            Índices de las entradas que no fueron confirmadas
+        """
+        failed = []
+
+        for offset in range(0, len(indexes), chunk_size):
+            chunk = indexes[offset:offset + chunk_size]
+            try:
+                response = await self.http.post(
+                    "/messages/batch",
+                    json={
+                        "messages": [
+                            {"exchangeName": exchange_name, "routingKey": routing_key, "message": entries[i][1]}
+                            for i in chunk
+                        ],
+                        **self._codec_fields()
+                    }
+                )
+                if response.status_code not in (201, 207):
+                    logger.error('Error al publicar lote mediante API: %s', response.text)
+                    failed.extend(chunk)
+                    continue
+
+                for i, result in zip(chunk, response.json().get("results", [])):
+                    if result.get("status") == "ack":
+                        results[i] = {
+                            "messageId": result.get("messageId"),
+                            "status": "ack",
+                            "error": None,
+                            "path": "api",
+                        }
+                # Entradas rechazadas o sin resultado en la respuesta
+                failed.extend(i for i in chunk if results[i] is None)
+            except Exception as e:
+                logger.error('Error al publicar lote mediante API: %s', e)
+                failed.extend(chunk)
+
+        return failed
+
+    async def _publish_batch_direct(self, exchange_name, routing_key, entry, index, results):
+        """Publica directamente una entrada del lote y anota su resultado"""
+        message_id, message_data = entry
+        try:
+            await self._publish_direct(exchange_name, routing_key, message_id, message_data)
+            results[index] = {"messageId": message_id, "status": "ack", "error": None, "path": "direct"}
+        except Exception as e:
+            if isinstance(e, aio_pika.exceptions.AMQPError):
+                topology.invalidate(self.connection)
+                self._exchange_objects.clear()
+            results[index] = {"messageId": None, "status": "error", "error": str(e), "path": "direct"}
+
+    async def close(self):
+        """Cierra la sesión HTTP y la conexión con RabbitMQ"""
+        await self.http.aclose()
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+            logger.info("Productor %s desconectado", self.producer_id)
+
+
+async def run(args):
+    async with AsyncEventProducer(
+        rabbitmq_host=args.host,
+        rabbitmq_port=args.port,
+        broker_api=args.api,
+        serializer=args.serializer,
+        compression=args.compression
+    ) as producer:
+        message_id = await producer.publish(
+            message=args.message,
+            exchange_name=args.exchange,
+            routing_key=args.routing_key
+        )
+
+    if message_id:
+        print(f"Mensaje publicado correctamente con ID: {message_id}")
+    else:
+        print("Error al publicar mensaje")
+
+
+def main():
+    """Función principal para uso como script"""
+    parser = argparse.ArgumentParser(description='Productor de eventos asyncio para RabbitMQ')
+    parser.add_argument('--host', default='localhost', help='Host de RabbitMQ')
+    parser.add_argument('--port', type=int, default=5672, help='Puerto de RabbitMQ')
+    parser.add_argument('--api', default='http://localhost:5000', help='URL de la API del broker')
+    parser.add_argument('--exchange', default='default', help='Nombre del exchange')
+    parser.add_argument('--routing-key', default='', help='Clave de routing')
+    parser.add_argument('--message', required=True, help='Mensaje a enviar')
+    parser.add_argument('--serializer', default='json', choices=['json', 'orjson', 'msgpack'],
+                        help='Serializador de los mensajes')
+    parser.add_argument('--compression', default=None, choices=['gzip', 'deflate'],
+                        help='Compresión de mensajes grandes')
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
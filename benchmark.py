@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+import argparse
+import json
+import logging
+import platform
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from producer import EventProducer
+from consumer import EventConsumer
+from common.log import configure_logging
+
+# Este script mide throughput y latencia productor -> manejador usando el broker
+# en memoria, de modo que se puede ejecutar sin RabbitMQ.
+
+BENCH_EXCHANGE = 'amq.topic'
+
+
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def start_broker_api(host, port, api_port):
+    """Levanta un EventBroker en memoria con su API de gestión en un hilo."""
+    from event_broker import EventBroker
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    broker = EventBroker(host=host, port=port, management_port=api_port, transport='memory')
+    threading.Thread(target=broker.start, daemon=True).start()
+    time.sleep(1)
+    return broker
+
+
+def run_scenario(path, payload_size, batch_size, consumers, messages, host, port, broker_api, timeout,
+                 serializer='json', compression=None):
+    """
+    Ejecuta un escenario y devuelve sus métricas
+
+    Args:
+        path: 'api' (API del broker) o 'direct' (conexión directa)
+        payload_size: Tamaño aproximado del payload en bytes
+        batch_size: 1 para publish(), >1 para publish_batch() en lotes de ese tamaño
+        consumers: Número de EventConsumer compitiendo por la cola
+        messages: Mensajes a publicar
+        serializer: Serializador del productor
+        compression: Compresión del productor (o None)
+    """
+    queue_name = f"bench-{uuid.uuid4().hex[:8]}"
+    latencies = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def handler(message):
+        sent_at = datetime.fromisoformat(message['timestamp'])
+        latency = (datetime.now() - sent_at).total_seconds()
+        with lock:
+            latencies.append(latency)
+            if len(latencies) >= messages:
+                done.set()
+
+    workers = []
+    for index in range(consumers):
+        consumer = EventConsumer(
+            rabbitmq_host=host,
+            rabbitmq_port=port,
+            consumer_id=f"bench-consumer-{index}",
+            transport='memory'
+        )
+        consumer.register_handler(queue_name, handler)
+        consumer.start()
+        workers.append(consumer)
+
+    producer = EventProducer(
+        rabbitmq_host=host,
+        rabbitmq_port=port,
+        broker_api=broker_api,
+        producer_id='bench-producer',
+        transport='memory',
+        serializer=serializer,
+        compression=compression
+    )
+    payload = {'data': 'x' * payload_size}
+    use_api = path == 'api'
+
+    started = time.perf_counter()
+    if batch_size <= 1:
+        for _ in range(messages):
+            producer.publish(payload, BENCH_EXCHANGE, queue_name, use_api=use_api)
+    else:
+        for offset in range(0, messages, batch_size):
+            chunk = [payload] * min(batch_size, messages - offset)
+            producer.publish_batch(chunk, BENCH_EXCHANGE, queue_name, use_api=use_api)
+    published = time.perf_counter()
+
+    done.wait(timeout)
+    finished = time.perf_counter()
+
+    for consumer in workers:
+        consumer.stop()
+    producer.close()
+
+    with lock:
+        values = sorted(latencies)
+    duration = finished - started
+    return {
+        "path": path,
+        "payloadSize": payload_size,
+        "batchSize": batch_size,
+        "consumers": consumers,
+        "serializer": serializer,
+        "compression": compression,
+        "messages": messages,
+        "delivered": len(values),
+        "publishSeconds": round(published - started, 6),
+        "durationSeconds": round(duration, 6),
+        "msgsPerSec": round(len(values) / duration, 2) if duration > 0 else None,
+        "latencyMs": {
+            "p50": round(percentile(values, 50) * 1000, 3) if values else None,
+            "p95": round(percentile(values, 95) * 1000, 3) if values else None,
+            "p99": round(percentile(values, 99) * 1000, 3) if values else None,
+            "max": round(values[-1] * 1000, 3) if values else None,
+        },
+    }
+
+
+def scenario_key(result):
+    return (result['path'], result['payloadSize'], result['batchSize'], result['consumers'],
+            result.get('serializer', 'json'), result.get('compression'))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compara con resultados anteriores
+
+    Returns:
+        Lista de regresiones (throughput menor o p99 mayor que la tolerancia)
+    """
+    previous = {scenario_key(r): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get(scenario_key(result))
+        if before is None:
+            continue
+        if before.get('msgsPerSec') and result.get('msgsPerSec') is not None:
+            if result['msgsPerSec'] < before['msgsPerSec'] * (1 - tolerance):
+                regressions.append(f"{scenario_key(result)} msgs/s {before['msgsPerSec']} -> {result['msgsPerSec']}")
+        before_p99 = before.get('latencyMs', {}).get('p99')
+        after_p99 = result.get('latencyMs', {}).get('p99')
+        if before_p99 and after_p99 is not None and after_p99 > before_p99 * (1 + tolerance):
+            regressions.append(f"{scenario_key(result)} p99 {before_p99}ms -> {after_p99}ms")
+    return regressions
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main():
+    """Función principal para uso como script"""
+    parser = argparse.ArgumentParser(description='Benchmark de mensajería productor -> consumidor')
+    parser.add_argument('--paths', default='direct,api', help='Caminos a medir (direct, api)')
+    parser.add_argument('--payload-sizes', type=int_list, default=[64, 1024, 16384], help='Tamaños de payload en bytes')
+    parser.add_argument('--batch-sizes', type=int_list, default=[1, 100], help='Tamaños de lote (1 = publish)')
+    parser.add_argument('--consumers', type=int_list, default=[1, 4], help='Número de consumidores')
+    parser.add_argument('--serializer', default='json', choices=['json', 'orjson', 'msgpack'],
+                        help='Serializador del productor')
+    parser.add_argument('--compression', default=None, choices=['gzip', 'deflate'],
+                        help='Compresión del productor')
+    parser.add_argument('--messages', type=int, default=2000, help='Mensajes por escenario')
+    parser.add_argument('--api-port', type=int, default=5055, help='Puerto de la API del broker en memoria')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Espera máxima por escenario (segundos)')
+    parser.add_argument('--output', default=None, help='Fichero JSON de resultados')
+    parser.add_argument('--baseline', default=None, help='Resultados anteriores con los que comparar')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Regresión tolerada (fracción)')
+    parser.add_argument('--verbose', action='store_true', help='Registrar también los eventos por mensaje (LOG_LEVEL=DEBUG)')
+
+    args = parser.parse_args()
+
+    # Los eventos de log (conexiones, colas, mensajes) ensucian la salida y compiten
+    # con la medida por el hilo que escribe en stdout
+    configure_logging(level='DEBUG' if args.verbose else 'WARNING')
+
+    host, port = 'bench', 5672
+    paths = [p for p in args.paths.split(',') if p]
+    broker_api = f"http://127.0.0.1:{args.api_port}"
+    if 'api' in paths:
+        start_broker_api(host, port, args.api_port)
+
+    results = []
+    for path in paths:
+        for payload_size in args.payload_sizes:
+            for batch_size in args.batch_sizes:
+                for consumers in args.consumers:
+                    result = run_scenario(
+                        path, payload_size, batch_size, consumers, args.messages,
+                        host, port, broker_api, args.timeout,
+                        args.serializer, args.compression
+                    )
+                    results.append(result)
+                    latency = result['latencyMs']
+                    print(f"{path:6} payload={payload_size:<6} batch={batch_size:<4} consumers={consumers:<2} "
+                          f"{result['msgsPerSec']} msgs/s  p50={latency['p50']}ms p95={latency['p95']}ms "
+                          f"p99={latency['p99']}ms  ({result['delivered']}/{result['messages']})")
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "messages": args.messages,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESIÓN: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BufferFullError(Exception):
+    """El buffer del productor está lleno y no se pudo encolar el mensaje."""
+
+
+class PublishError(Exception):
+    """El mensaje encolado no se pudo publicar."""
+
+
+class MessageAccumulator:
+    """
+    Buffer acotado de mensajes pendientes con un hilo emisor en segundo plano.
+
+    El emisor envía un lote cuando se juntan ``batch_size`` mensajes o cuando el más
+    antiguo lleva ``linger_ms`` esperando (como linger.ms/batch.size de Kafka).
+    Cada mensaje encolado devuelve un Future que se resuelve con su ID cuando el
+    lote se confirma, o con PublishError si falla.
+    """
+
+    def __init__(self, send_batch, batch_size=500, linger_ms=5, buffer_size=10000,
+                 block_on_full=True, max_block_ms=None):
+        """
+        Args:
+            send_batch: Función que recibe una lista de elementos y devuelve, en el
+                mismo orden, un resultado {messageId, status, error} por elemento
+            batch_size: Máximo de mensajes por lote
+            linger_ms: Espera máxima de un mensaje antes de enviar un lote incompleto
+            buffer_size: Máximo de mensajes pendientes en el buffer
+            block_on_full: Si es True, append() espera hueco; si no, falla enseguida
+            max_block_ms: Espera máxima de append() con el buffer lleno (None = sin límite)
+        """
+        if batch_size < 1 or buffer_size < 1:
+            raise ValueError("batch_size y buffer_size deben ser al menos 1")
+        self.send_batch = send_batch
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000.0
+        self.buffer_size = buffer_size
+        self.block_on_full = block_on_full
+        self.max_block = max_block_ms / 1000.0 if max_block_ms is not None else None
+        self._buffer = collections.deque()  # (elemento, future, instante de encolado)
+        self._cond = threading.Condition()
+        self._pending = 0  # encolados y aún sin resolver
+        self._flushing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='producer-sender', daemon=True)
+        self._thread.start()
+
+    def append(self, item):
+        """
+        Encola un elemento para el próximo lote
+
+        Returns:
+            Future que se resuelve con el ID del mensaje
+
+        Raises:
+            BufferFullError: Si el buffer sigue lleno tras la espera configurada
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise PublishError("El productor está cerrado")
+            if len(self._buffer) >= self.buffer_size:
+                if not self.block_on_full:
+                    raise BufferFullError(f"Buffer lleno ({self.buffer_size} mensajes pendientes)")
+                deadline = time.monotonic() + self.max_block if self.max_block is not None else None
+                while len(self._buffer) >= self.buffer_size and not self._closed:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise BufferFullError(f"Buffer lleno ({self.buffer_size} mensajes pendientes)")
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise PublishError("El productor está cerrado")
+            self._buffer.append((item, future, time.monotonic()))
+            self._pending += 1
+            self._cond.notify_all()
+        return future
+
+    def flush(self, timeout=None):
+        """
+        Envía ya lo pendiente y espera a que se resuelva
+
+        Returns:
+            True si no quedan mensajes pendientes
+        """
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=None):
+        """Envía lo pendiente y detiene el hilo emisor"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "buffered": len(self._buffer),
+                "pending": self._pending,
+                "bufferSize": self.buffer_size,
+            }
+
+    def _next_batch(self):
+        """Espera a que haya un lote listo; devuelve None al cerrar con el buffer vacío"""
+        with self._cond:
+            while True:
+                if self._buffer:
+                    if self._closed or self._flushing or len(self._buffer) >= self.batch_size:
+                        break
+                    remaining = self._buffer[0][2] + self.linger - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            # Hay hueco para los productores bloqueados
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            futures = [future for _, future, _ in batch]
+            error = None
+            try:
+                results = self.send_batch([item for item, _, _ in batch])
+                for future, result in zip(futures, results):
+                    # 'spooled': guardado en el spool del productor, se reenviará
+                    if result and result.get("status") in ("ack", "spooled"):
+                        future.set_result(result.get("messageId"))
+                    elif result:
+                        future.set_exception(PublishError(result.get("error") or "Mensaje no confirmado"))
+            except Exception as e:
+                error = str(e)
+            for future in futures:
+                if not future.done():
+                    future.set_exception(PublishError(error or "Mensaje no confirmado"))
+            with self._cond:
+                self._pending -= len(batch)
+                if self._pending == 0:
+                    self._flushing = False
+                self._cond.notify_all()
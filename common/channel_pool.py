@@ -0,0 +1,173 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+import pika
+
+from common.confirms import ConfirmTracker
+
+
+class PoolTimeoutError(Exception):
+    """No hay canales disponibles en el pool dentro del tiempo de espera."""
+
+
+class PooledChannel:
+    """Conexión dedicada del pool con su canal de publicación."""
+
+    def __init__(self, connection, generation):
+        self.connection = connection
+        self.generation = generation
+        self.channel = connection.channel()
+        self._confirm_channel = None
+        self._confirm_tracker = None
+
+    @property
+    def confirm_channel(self):
+        """Canal en modo confirmación, creado solo cuando se necesita."""
+        if self._confirm_channel is None or not self._confirm_channel.is_open:
+            self._confirm_channel = self.connection.channel()
+            self._confirm_channel.confirm_delivery()
+        return self._confirm_channel
+
+    @property
+    def confirm_tracker(self):
+        """Canal en modo confirmación para lotes (ConfirmTracker), creado solo cuando se necesita."""
+        if self._confirm_tracker is None or not self._confirm_tracker.is_open:
+            self._confirm_tracker = ConfirmTracker(self.connection.channel())
+        return self._confirm_tracker
+
+    def reopen_channel(self):
+        """Sustituye el canal de publicación tras cerrarlo el broker (p. ej. un 404)."""
+        self.channel = self.connection.channel()
+
+    def is_open(self):
+        return self.connection.is_open and self.channel.is_open
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+
+
+class ChannelPool:
+    """
+    Pool de canales para publicar desde varios hilos.
+
+    Una BlockingConnection de pika no es thread-safe (tampoco sus canales), así que
+    cada elemento del pool es una conexión propia con su canal. Un hilo toma un
+    elemento en exclusiva mientras publica y lo devuelve al terminar.
+    """
+
+    def __init__(self, connection_factory, size=4, acquire_timeout=10.0):
+        """
+        Args:
+            connection_factory: Función sin argumentos que devuelve una conexión nueva
+            size: Número máximo de conexiones abiertas
+            acquire_timeout: Segundos de espera por un canal libre (None = sin límite)
+        """
+        if size < 1:
+            raise ValueError("El tamaño del pool debe ser al menos 1")
+        self.connection_factory = connection_factory
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._created = 0
+        self._in_use = 0
+
+    def _create(self):
+        pooled = PooledChannel(self.connection_factory(), self._generation)
+        with self._lock:
+            self._created += 1
+        return pooled
+
+    def _take(self):
+        """Obtiene un canal abierto de los libres o crea uno nuevo."""
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return self._create()
+            if pooled.generation == self._generation and pooled.is_open():
+                return pooled
+            pooled.close()
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """
+        Toma un canal del pool en exclusiva durante el bloque ``with``
+
+        Args:
+            timeout: Segundos de espera por un canal libre (por defecto acquire_timeout)
+
+        Yields:
+            PooledChannel con ``channel``, ``confirm_channel`` y ``confirm_tracker``
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError(f"No hay canales libres tras {timeout}s")
+
+        pooled = None
+        discard = False
+        try:
+            pooled = self._take()
+            with self._lock:
+                self._in_use += 1
+            yield pooled
+        except pika.exceptions.AMQPError:
+            # Conexión o canal en estado desconocido: no se devuelve al pool
+            discard = True
+            raise
+        finally:
+            if pooled is not None:
+                with self._lock:
+                    self._in_use -= 1
+                if discard or pooled.generation != self._generation or not pooled.is_open():
+                    pooled.close()
+                else:
+                    self._idle.put(pooled)
+            self._slots.release()
+
+    def heartbeat(self):
+        """Atiende I/O y heartbeats de las conexiones libres sin bloquear."""
+        for _ in range(self._idle.qsize()):
+            if not self._slots.acquire(blocking=False):
+                return
+            try:
+                try:
+                    pooled = self._idle.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    pooled.connection.process_data_events(time_limit=0)
+                    self._idle.put(pooled)
+                except Exception:
+                    pooled.close()
+            finally:
+                self._slots.release()
+
+    def reset(self):
+        """Descarta todas las conexiones (p. ej. tras una reconexión del broker)."""
+        with self._lock:
+            self._generation += 1
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def close(self):
+        self.reset()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "inUse": self._in_use,
+                "created": self._created,
+            }
@@ -0,0 +1,126 @@
+import pika
+from pika.adapters.blocking_connection import BlockingChannel
+
+NACK_ERROR = "Mensaje rechazado por el broker (nack)"
+
+
+class ConfirmTracker:
+    """
+    Publicaciones en modo confirm con las confirmaciones recogidas por lotes.
+
+    En modo confirm, BlockingChannel.basic_publish espera el ack de cada mensaje
+    antes de volver, así que un lote cuesta una ida y vuelta por mensaje. Sobre un
+    canal de pika, el tracker activa el modo confirm en el canal asíncrono
+    subyacente con su propio callback: basic_publish() solo escribe el mensaje y
+    devuelve su delivery tag, y wait() atiende la E/S una vez hasta recibir los
+    acks y nacks pendientes (RabbitMQ los agrupa con ``multiple``).
+
+    Con otros canales (transporte en memoria) cada basic_publish() se confirma al
+    momento con el basic_publish del canal en modo confirm.
+
+    El canal debe ser exclusivo del tracker: los delivery tags se cuentan aquí.
+    """
+
+    def __init__(self, channel):
+        """
+        Args:
+            channel: Canal recién abierto (sin modo confirm ni transaccional)
+        """
+        self.channel = channel
+        self._next_tag = 1
+        self._pending = set()
+        self._confirmed = {}  # delivery tag -> None (ack) o descripción del error
+        self._pipelined = isinstance(channel, BlockingChannel)
+        if self._pipelined:
+            selected = []
+            channel._impl.confirm_delivery(
+                ack_nack_callback=self._on_confirm,
+                callback=lambda frame: selected.append(frame)
+            )
+            channel._flush_output(lambda: selected)
+        else:
+            channel.confirm_delivery()
+
+    @property
+    def is_open(self):
+        return self.channel.is_open
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        """
+        Publica un mensaje sin esperar su confirmación
+
+        Returns:
+            Delivery tag con el que aparecerá en take()
+
+        Raises:
+            pika.exceptions.AMQPError: Si el canal o la conexión se cerraron
+        """
+        tag = self._next_tag
+        if self._pipelined:
+            self.channel._impl.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=properties
+            )
+            self._pending.add(tag)
+        else:
+            try:
+                self.channel.basic_publish(exchange=exchange, routing_key=routing_key, body=body,
+                                           properties=properties)
+                self._confirmed[tag] = None
+            except pika.exceptions.NackError:
+                self._confirmed[tag] = NACK_ERROR
+        self._next_tag += 1
+        return tag
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        error = None if isinstance(method, pika.spec.Basic.Ack) else NACK_ERROR
+        if method.multiple:
+            tags = [tag for tag in self._pending if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            self._pending.discard(tag)
+            self._confirmed[tag] = error
+
+    def wait(self, timeout=None):
+        """
+        Espera las confirmaciones de todo lo publicado
+
+        Args:
+            timeout: Segundos de espera como máximo (None = sin límite); lo que no se
+                confirme a tiempo falta en take()
+
+        Raises:
+            pika.exceptions.AMQPError: Si el canal o la conexión se cerraron antes de
+                recibirlas todas (lo ya confirmado sigue disponible en take())
+        """
+        if not self._pending:
+            return
+        expired = []
+        timer = None
+        if timeout is not None:
+            timer = self.channel.connection.call_later(timeout, lambda: expired.append(True))
+        try:
+            self.channel._flush_output(lambda: not self._pending or expired)
+        finally:
+            if timer is not None and not expired:
+                self.channel.connection.remove_timeout(timer)
+        if expired:
+            # Lo que no llegó a tiempo queda sin confirmar; no se vuelve a esperar
+            self._pending.clear()
+        elif self._pending and self.channel.is_closed:
+            raise pika.exceptions.ChannelWrongStateError("Canal cerrado antes de recibir las confirmaciones")
+
+    def take(self):
+        """
+        Devuelve y olvida las confirmaciones recibidas
+
+        Returns:
+            Diccionario delivery tag -> None (ack) o descripción del error (nack).
+            Los tags que falten siguen sin confirmar
+        """
+        confirmed, self._confirmed = self._confirmed, {}
+        return confirmed
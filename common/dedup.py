@@ -0,0 +1,164 @@
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteDedupBackend:
+    """
+    Registro persistente de mensajes procesados en SQLite.
+
+    Lo comparten los procesos de una misma máquina (por ejemplo los workers de
+    consumer_supervisor). Los registros más antiguos que ``retention`` se purgan.
+    """
+
+    def __init__(self, path, retention=7 * 24 * 3600, purge_interval=3600):
+        """
+        Args:
+            path: Fichero de la base de datos
+            retention: Segundos que se recuerda un mensaje procesado
+            purge_interval: Segundos entre purgas de registros caducados
+        """
+        self.path = path
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed_messages ("
+                "message_id TEXT PRIMARY KEY, processed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS processed_messages_at ON processed_messages (processed_at)")
+
+    def _connection(self):
+        # sqlite3 no comparte conexiones entre hilos: una por hilo
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+        return conn
+
+    def contains(self, message_ids):
+        """Devuelve el subconjunto de message_ids ya procesados."""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return set()
+        placeholders = ','.join('?' * len(message_ids))
+        rows = self._connection().execute(
+            f"SELECT message_id FROM processed_messages WHERE message_id IN ({placeholders})",
+            message_ids
+        )
+        return {row[0] for row in rows}
+
+    def add(self, message_ids):
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO processed_messages (message_id, processed_at) VALUES (?, ?)",
+                [(message_id, now) for message_id in message_ids]
+            )
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                conn.execute("DELETE FROM processed_messages WHERE processed_at < ?", (now - self.retention,))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class DedupStore:
+    """
+    Registro de message_id ya procesados para descartar reentregas.
+
+    Dos niveles: un LRU acotado en memoria (respuesta exacta para los recientes)
+    y un backend persistente opcional compartido entre procesos. Los ids que no
+    están en el LRU se consultan siempre en el backend, en una sola consulta por
+    lote: un duplicado puede llegar como entrega nueva (reintento del productor,
+    spool) a otro worker, así que lo que este proceso no vio no prueba nada.
+    """
+
+    def __init__(self, capacity=100000, backend=None):
+        """
+        Args:
+            capacity: Ids recordados en el LRU
+            backend: Backend persistente (p. ej. SqliteDedupBackend) o None
+        """
+        self.capacity = capacity
+        self.backend = backend
+        self._recent = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._checks = 0
+        self._duplicates = 0
+        self._backend_lookups = 0
+
+    def filter_seen(self, message_ids):
+        """
+        Devuelve los ids ya procesados
+
+        Args:
+            message_ids: Ids a comprobar (se ignoran los vacíos)
+        """
+        message_ids = [message_id for message_id in message_ids if message_id]
+        seen = set()
+        lookup = []
+        with self._lock:
+            self._checks += len(message_ids)
+            for message_id in message_ids:
+                if message_id in self._recent:
+                    self._recent.move_to_end(message_id)
+                    seen.add(message_id)
+                elif self.backend is not None:
+                    lookup.append(message_id)
+
+        if lookup:
+            found = self.backend.contains(lookup)
+            with self._lock:
+                self._backend_lookups += len(lookup)
+                for message_id in found:
+                    self._remember(message_id)
+            seen |= found
+
+        with self._lock:
+            self._duplicates += len(seen)
+        return seen
+
+    def seen(self, message_id):
+        """Indica si un mensaje ya se procesó."""
+        return bool(message_id) and message_id in self.filter_seen([message_id])
+
+    def _remember(self, message_id):
+        self._recent[message_id] = None
+        self._recent.move_to_end(message_id)
+        if len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+
+    def mark_processed(self, message_ids):
+        """Registra ids procesados correctamente."""
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids:
+            return
+        with self._lock:
+            for message_id in message_ids:
+                self._remember(message_id)
+        if self.backend is not None:
+            self.backend.add(message_ids)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checks": self._checks,
+                "duplicates": self._duplicates,
+                "hitRate": round(self._duplicates / self._checks, 4) if self._checks else 0.0,
+                "backendLookups": self._backend_lookups,
+                "recent": len(self._recent),
+            }
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
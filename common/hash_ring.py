@@ -0,0 +1,86 @@
+import bisect
+import hashlib
+
+
+def parse_nodes(spec, default_port=5672):
+    """
+    Interpreta una lista de nodos de RabbitMQ
+
+    Args:
+        spec: Cadena 'host1:5672,host2:5673' o lista de 'host:puerto' / (host, puerto)
+        default_port: Puerto si un nodo no lo indica
+
+    Returns:
+        Lista de tuplas (host, puerto)
+    """
+    if isinstance(spec, str):
+        spec = [item.strip() for item in spec.split(',') if item.strip()]
+    nodes = []
+    for item in spec or []:
+        if isinstance(item, str):
+            host, _, port = item.partition(':')
+            nodes.append((host, int(port) if port else default_port))
+        else:
+            host, port = item
+            nodes.append((host, int(port)))
+    return nodes
+
+
+class HashRing:
+    """
+    Anillo de hash consistente.
+
+    Cada nodo ocupa ``replicas`` puntos del anillo; una clave pertenece al primer
+    punto igual o posterior a su hash. Añadir o quitar un nodo solo mueve las claves
+    de ese nodo.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self._points = []  # hashes ordenados
+        self._owners = {}  # hash -> nodo
+        self.nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            if point not in self._owners:
+                self._owners[point] = node
+                bisect.insort(self._points, point)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+
+    def get(self, key):
+        """Nodo al que pertenece la clave (None si el anillo está vacío)"""
+        return next(self.iter_nodes(key), None)
+
+    def iter_nodes(self, key):
+        """Nodos distintos en orden de anillo a partir de la clave (para failover)"""
+        if not self._points:
+            return
+        start = bisect.bisect_left(self._points, self._hash(key or ''))
+        seen = set()
+        for offset in range(len(self._points)):
+            node = self._owners[self._points[(start + offset) % len(self._points)]]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+    def __len__(self):
+        return len(self.nodes)
@@ -0,0 +1,175 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+# Logger raíz de los módulos del broker; todos cuelgan de él
+ROOT_LOGGER = 'events'
+
+# Atributos propios de LogRecord: el resto son campos estructurados (extra=...)
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sampled'}
+
+_configured = False
+_configure_lock = threading.RLock()
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar solo una fracción de los eventos por mensaje.
+
+    Afecta a los registros emitidos con ``extra={'sampled': True}`` por debajo de
+    WARNING; los avisos y errores siempre pasan.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or record.levelno >= logging.WARNING:
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por evento, con los campos pasados en ``extra``."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible: hora, nivel, logger, mensaje y campos clave=valor."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in _RECORD_ATTRS and not key.startswith('_')
+        )
+        return f"{line} {fields}" if fields else line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que emite.
+
+    El QueueHandler estándar formatea el mensaje antes de encolarlo; aquí se
+    encola el registro tal cual y el formateo (y la escritura) ocurre en el hilo
+    del QueueListener. Si la cola está llena se descarta el evento en lugar de
+    bloquear.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def configure_logging(level=None, fmt=None, sample_rate=None, stream=None, queue_size=10000):
+    """
+    Configura el logging de los módulos del broker
+
+    Los eventos se encolan sin bloquear y un hilo aparte los formatea y escribe.
+
+    Args:
+        level: Nivel mínimo (por defecto LOG_LEVEL o INFO)
+        fmt: 'text' o 'json' (por defecto LOG_FORMAT o 'text')
+        sample_rate: Fracción de eventos por mensaje que se registran
+            (por defecto LOG_SAMPLE_RATE o 1.0)
+        stream: Destino (por defecto stdout)
+        queue_size: Eventos pendientes como máximo antes de descartar
+    """
+    global _configured, _listener
+    with _configure_lock:
+        level = level or os.environ.get('LOG_LEVEL', 'INFO')
+        fmt = fmt or os.environ.get('LOG_FORMAT', 'text')
+        if sample_rate is None:
+            sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+
+        if _listener is not None:
+            _listener.stop()
+
+        sink = logging.StreamHandler(stream or sys.stdout)
+        sink.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        handler = _DeferredQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter(sample_rate))
+        _listener = logging.handlers.QueueListener(log_queue, sink, respect_handler_level=False)
+        _listener.start()
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        for existing in list(logger.handlers):
+            logger.removeHandler(existing)
+        logger.addHandler(handler)
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+        logger.propagate = False
+        _configured = True
+
+
+def shutdown_logging():
+    """Vacía la cola de eventos pendientes (se llama al salir)."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+class ContextLogger(logging.LoggerAdapter):
+    """Logger que añade campos fijos (p. ej. el id del consumidor) a cada evento."""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **kwargs.get('extra', {})}
+        return msg, kwargs
+
+
+def get_logger(name, **context):
+    """
+    Logger de un módulo (``events.<name>``)
+
+    Si la aplicación no configuró el logging, se configura con las variables de
+    entorno LOG_LEVEL, LOG_FORMAT y LOG_SAMPLE_RATE.
+
+    Args:
+        name: Nombre del módulo
+        **context: Campos que se añaden a todos los eventos del logger
+    """
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                configure_logging()
+    logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+    return ContextLogger(logger, context) if context else logger
+
+
+# extra= de los eventos por mensaje, que se muestrean (ver SamplingFilter)
+SAMPLED = {'sampled': True}
@@ -0,0 +1,548 @@
+import collections
+import itertools
+import queue
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pika
+
+from common.topic_trie import TopicTrie
+
+# Exchanges que RabbitMQ crea por defecto
+DEFAULT_EXCHANGES = {
+    '': 'direct',
+    'amq.direct': 'direct',
+    'amq.fanout': 'fanout',
+    'amq.topic': 'topic',
+}
+
+
+class _Exchange:
+    def __init__(self, name, exchange_type, durable):
+        if exchange_type not in ('direct', 'fanout', 'topic'):
+            raise ValueError(f"Tipo de exchange no soportado en memoria: {exchange_type}")
+        self.name = name
+        self.type = exchange_type
+        self.durable = durable
+        self.bindings = set()  # Tuplas (cola, clave de routing)
+        self.direct = collections.defaultdict(set)  # clave -> colas
+        self.trie = TopicTrie() if exchange_type == 'topic' else None
+
+    def bind(self, queue_name, routing_key):
+        self.bindings.add((queue_name, routing_key))
+        if self.type == 'topic':
+            self.trie.add(routing_key, queue_name)
+        elif self.type == 'direct':
+            self.direct[routing_key].add(queue_name)
+
+    def unbind(self, queue_name, routing_key):
+        self.bindings.discard((queue_name, routing_key))
+        if self.type == 'topic':
+            self.trie.remove(routing_key, queue_name)
+        elif self.type == 'direct':
+            self.direct[routing_key].discard(queue_name)
+
+    def route(self, routing_key):
+        if self.type == 'topic':
+            return self.trie.match(routing_key)
+        if self.type == 'direct':
+            return tuple(self.direct.get(routing_key, ()))
+        return tuple(queue_name for queue_name, _ in self.bindings)
+
+
+class _Queue:
+    def __init__(self, name, durable, arguments):
+        self.name = name
+        self.durable = durable
+        self.arguments = arguments or {}
+        self.messages = collections.deque()
+        self.consumers = collections.deque()  # consumer tags en orden round-robin
+        self.ttl = self.arguments.get('x-message-ttl')
+        self.expiry_timer = None
+
+    def dead_letter_target(self, routing_key):
+        """(exchange, clave) a los que se envían los mensajes expirados o rechazados, o None"""
+        exchange = self.arguments.get('x-dead-letter-exchange')
+        if exchange is None:
+            return None
+        return exchange, self.arguments.get('x-dead-letter-routing-key', routing_key)
+
+
+class _Message:
+    __slots__ = ('exchange', 'routing_key', 'body', 'properties', 'redelivered', 'expires_at')
+
+    def __init__(self, exchange, routing_key, body, properties):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.redelivered = False
+        self.expires_at = None
+
+
+class InMemoryBroker:
+    """
+    Broker AMQP en memoria para ejecutar el pipeline sin RabbitMQ.
+
+    Implementa exchanges (direct, fanout y topic), colas, bindings, consumo con
+    prefetch y acks, y el TTL por cola con dead-lettering (``x-message-ttl``,
+    ``x-dead-letter-exchange``, ``x-dead-letter-routing-key``). El routing de
+    los exchanges topic usa un TopicTrie, así que el coste por mensaje no crece
+    con el número de bindings. Solo es visible dentro del proceso.
+    """
+
+    def __init__(self):
+        self.exchanges = {
+            name: _Exchange(name, exchange_type, True)
+            for name, exchange_type in DEFAULT_EXCHANGES.items()
+        }
+        self.queues = {}
+        self.consumers = {}  # consumer tag -> (cola, canal, callback, auto_ack)
+        self._lock = threading.RLock()
+
+    def connect(self):
+        return MemoryConnection(self)
+
+    # Topología
+
+    def exchange_declare(self, exchange, exchange_type='direct', durable=False, passive=False):
+        with self._lock:
+            existing = self.exchanges.get(exchange)
+            if existing is not None:
+                if not passive and existing.type != exchange_type:
+                    raise pika.exceptions.ChannelClosedByBroker(
+                        406, f"PRECONDITION_FAILED - inequivalent arg 'type' for exchange '{exchange}'"
+                    )
+                return
+            if passive:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+            self.exchanges[exchange] = _Exchange(exchange, exchange_type, durable)
+
+    def queue_declare(self, queue_name, durable=False, passive=False, arguments=None):
+        with self._lock:
+            if not queue_name:
+                queue_name = f"amq.gen-{uuid.uuid4().hex}"
+            existing = self.queues.get(queue_name)
+            if existing is None:
+                if passive:
+                    raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue_name}'")
+                existing = self.queues[queue_name] = _Queue(queue_name, durable, arguments)
+                # Toda cola queda vinculada al exchange por defecto con su nombre
+                self.exchanges[''].bind(queue_name, queue_name)
+            return SimpleNamespace(method=SimpleNamespace(
+                queue=queue_name,
+                message_count=len(existing.messages),
+                consumer_count=len(existing.consumers)
+            ))
+
+    def queue_bind(self, queue_name, exchange, routing_key=None):
+        with self._lock:
+            if queue_name not in self.queues:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue_name}'")
+            if exchange not in self.exchanges:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+            self.exchanges[exchange].bind(queue_name, routing_key if routing_key is not None else queue_name)
+
+    def queue_unbind(self, queue_name, exchange, routing_key=None):
+        with self._lock:
+            if exchange in self.exchanges:
+                self.exchanges[exchange].unbind(queue_name, routing_key if routing_key is not None else queue_name)
+
+    # Publicación y entrega
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        """
+        Enruta un mensaje a las colas correspondientes
+
+        Returns:
+            Número de colas a las que se entregó
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        properties = properties or pika.BasicProperties()
+        with self._lock:
+            target = self.exchanges.get(exchange)
+            if target is None:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+            queue_names = target.route(routing_key)
+            for queue_name in queue_names:
+                self._enqueue(queue_name, _Message(exchange, routing_key, body, properties))
+            return len(queue_names)
+
+    def _enqueue(self, queue_name, message, front=False):
+        target = self.queues.get(queue_name)
+        if target is None:
+            return
+        if front:
+            target.messages.appendleft(message)
+        else:
+            if target.ttl is not None:
+                message.expires_at = time.monotonic() + target.ttl / 1000
+            target.messages.append(message)
+        self._dispatch(target)
+        self._schedule_expiry(target)
+
+    def _schedule_expiry(self, target):
+        """Programa la expiración del primer mensaje de una cola con TTL."""
+        if target.ttl is None or target.expiry_timer is not None or not target.messages:
+            return
+        delay = max(0.0, target.messages[0].expires_at - time.monotonic())
+        target.expiry_timer = threading.Timer(delay, self._expire, (target.name,))
+        target.expiry_timer.daemon = True
+        target.expiry_timer.start()
+
+    def _expire(self, queue_name):
+        """Retira los mensajes expirados de la cabeza de la cola (como RabbitMQ)."""
+        with self._lock:
+            target = self.queues.get(queue_name)
+            if target is None:
+                return
+            target.expiry_timer = None
+            now = time.monotonic()
+            while target.messages and target.messages[0].expires_at <= now:
+                self.dead_letter(target.name, target.messages.popleft())
+            self._schedule_expiry(target)
+
+    def dead_letter(self, queue_name, message):
+        """Reenvía un mensaje expirado o rechazado al dead-letter de su cola (si tiene)."""
+        with self._lock:
+            target = self.queues.get(queue_name)
+            dead_letter = target.dead_letter_target(message.routing_key) if target is not None else None
+            if dead_letter is not None and dead_letter[0] in self.exchanges:
+                self.publish(dead_letter[0], dead_letter[1], message.body, message.properties)
+
+    def _dispatch(self, target):
+        """Entrega mensajes de la cola a consumidores con capacidad (round-robin)."""
+        while target.messages and target.consumers:
+            for _ in range(len(target.consumers)):
+                tag = target.consumers[0]
+                target.consumers.rotate(-1)
+                _, channel, callback, auto_ack = self.consumers[tag]
+                if auto_ack or channel.has_capacity():
+                    break
+            else:
+                return
+            message = target.messages.popleft()
+            channel.deliver(tag, target.name, message, callback, auto_ack)
+
+    def dispatch_queues(self, queue_names):
+        with self._lock:
+            for queue_name in queue_names:
+                target = self.queues.get(queue_name)
+                if target is not None:
+                    self._dispatch(target)
+
+    def requeue(self, queue_name, message):
+        with self._lock:
+            message.redelivered = True
+            self._enqueue(queue_name, message, front=True)
+
+    def basic_get(self, queue_name):
+        """Extrae el primer mensaje de una cola (o None si está vacía)."""
+        with self._lock:
+            target = self.queues.get(queue_name)
+            if target is None:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue_name}'")
+            if not target.messages:
+                return None, 0
+            message = target.messages.popleft()
+            return message, len(target.messages)
+
+    def basic_consume(self, channel, queue_name, callback, auto_ack=False, consumer_tag=None):
+        with self._lock:
+            target = self.queues.get(queue_name)
+            if target is None:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue_name}'")
+            consumer_tag = consumer_tag or f"ctag-{uuid.uuid4().hex}"
+            self.consumers[consumer_tag] = (queue_name, channel, callback, auto_ack)
+            target.consumers.append(consumer_tag)
+            self._dispatch(target)
+            return consumer_tag
+
+    def basic_cancel(self, consumer_tag):
+        with self._lock:
+            entry = self.consumers.pop(consumer_tag, None)
+            if entry is not None:
+                target = self.queues.get(entry[0])
+                if target is not None and consumer_tag in target.consumers:
+                    target.consumers.remove(consumer_tag)
+
+
+class MemoryChannel:
+    """Canal compatible con el subconjunto de BlockingChannel que usa el proyecto."""
+
+    def __init__(self, connection, channel_number):
+        self.connection = connection
+        self.channel_number = channel_number
+        self.broker = connection.broker
+        self.is_open = True
+        self.prefetch_count = 0
+        self.consumer_tags = set()
+        self._unacked = collections.OrderedDict()  # delivery tag -> (cola, mensaje)
+        self._tags = itertools.count(1)
+        self._confirm = False
+        self._tx_pending = None  # publicaciones pendientes de tx_commit (modo transaccional)
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    def _check_open(self):
+        if not self.is_open:
+            raise pika.exceptions.ChannelWrongStateError("Channel is closed.")
+
+    def _call(self, func, *args, **kwargs):
+        """Ejecuta una operación del broker; los errores del broker cierran el canal."""
+        self._check_open()
+        try:
+            return func(*args, **kwargs)
+        except pika.exceptions.ChannelClosedByBroker:
+            self._close(requeue=True)
+            raise
+
+    # Topología
+
+    def exchange_declare(self, exchange, exchange_type='direct', passive=False, durable=False,
+                         auto_delete=False, internal=False, arguments=None):
+        self._call(self.broker.exchange_declare, exchange, exchange_type, durable, passive)
+
+    def queue_declare(self, queue, passive=False, durable=False, exclusive=False,
+                      auto_delete=False, arguments=None):
+        return self._call(self.broker.queue_declare, queue, durable, passive, arguments)
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self._call(self.broker.queue_bind, queue, exchange, routing_key)
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None):
+        self._call(self.broker.queue_unbind, queue, exchange, routing_key)
+
+    # Publicación
+
+    def confirm_delivery(self):
+        self._check_open()
+        self._confirm = True
+
+    def tx_select(self):
+        self._check_open()
+        self._tx_pending = []
+
+    def tx_commit(self):
+        self._check_open()
+        if self._tx_pending is None:
+            raise pika.exceptions.ChannelWrongStateError("Channel is not in transactional mode.")
+        pending, self._tx_pending = self._tx_pending, []
+        for args in pending:
+            self._call(self.broker.publish, *args)
+
+    def tx_rollback(self):
+        self._check_open()
+        if self._tx_pending is None:
+            raise pika.exceptions.ChannelWrongStateError("Channel is not in transactional mode.")
+        self._tx_pending = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if self._tx_pending is not None:
+            self._check_open()
+            self._tx_pending.append((exchange, routing_key, body, properties))
+            return
+        routed = self._call(self.broker.publish, exchange, routing_key, body, properties)
+        if mandatory and not routed and self._confirm:
+            raise pika.exceptions.UnroutableError([])
+
+    # Consumo
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        self._check_open()
+        self.prefetch_count = prefetch_count
+        self.broker.dispatch_queues(self._consumed_queues())
+
+    def has_capacity(self):
+        return self.is_open and (not self.prefetch_count or len(self._unacked) < self.prefetch_count)
+
+    def _consumed_queues(self):
+        return {self.broker.consumers[tag][0] for tag in self.consumer_tags if tag in self.broker.consumers}
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False,
+                      consumer_tag=None, arguments=None):
+        consumer_tag = self._call(self.broker.basic_consume, self, queue, on_message_callback,
+                                  auto_ack, consumer_tag)
+        self.consumer_tags.add(consumer_tag)
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag=''):
+        self.broker.basic_cancel(consumer_tag)
+        self.consumer_tags.discard(consumer_tag)
+        return []
+
+    def basic_get(self, queue, auto_ack=False):
+        """Extrae un mensaje sin consumidor: (method, properties, body) o (None, None, None)."""
+        message, remaining = self._call(self.broker.basic_get, queue)
+        if message is None:
+            return None, None, None
+        delivery_tag = next(self._tags)
+        if not auto_ack:
+            self._unacked[delivery_tag] = (queue, message)
+        method = SimpleNamespace(
+            delivery_tag=delivery_tag,
+            redelivered=message.redelivered,
+            exchange=message.exchange,
+            routing_key=message.routing_key,
+            message_count=remaining,
+        )
+        return method, message.properties, message.body
+
+    def deliver(self, consumer_tag, queue_name, message, callback, auto_ack):
+        """Llamado por el broker (con su lock tomado) para entregar un mensaje."""
+        delivery_tag = next(self._tags)
+        if not auto_ack:
+            self._unacked[delivery_tag] = (queue_name, message)
+        method = SimpleNamespace(
+            consumer_tag=consumer_tag,
+            delivery_tag=delivery_tag,
+            redelivered=message.redelivered,
+            exchange=message.exchange,
+            routing_key=message.routing_key,
+        )
+
+        def invoke():
+            if self.is_open:
+                callback(self, method, message.properties, message.body)
+
+        self.connection.add_callback_threadsafe(invoke)
+
+    def _settle(self, delivery_tag, multiple):
+        """Extrae del registro de pendientes los tags confirmados."""
+        with self.broker._lock:
+            if multiple:
+                tags = [tag for tag in self._unacked if tag <= delivery_tag or delivery_tag == 0]
+            else:
+                tags = [delivery_tag] if delivery_tag in self._unacked else []
+            if not tags:
+                raise pika.exceptions.ChannelClosedByBroker(
+                    406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}"
+                )
+            return [self._unacked.pop(tag) for tag in tags]
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        settled = self._call(self._settle, delivery_tag, multiple)
+        self.broker.dispatch_queues({queue_name for queue_name, _ in settled} | self._consumed_queues())
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        settled = self._call(self._settle, delivery_tag, multiple)
+        for queue_name, message in reversed(settled):
+            if requeue:
+                self.broker.requeue(queue_name, message)
+            else:
+                self.broker.dead_letter(queue_name, message)
+        self.broker.dispatch_queues(self._consumed_queues())
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.basic_nack(delivery_tag, multiple=False, requeue=requeue)
+
+    def start_consuming(self):
+        """Procesa entregas hasta que se cancelen todos los consumidores."""
+        while self.is_open and self.consumer_tags:
+            self.connection.process_data_events(time_limit=0.2)
+
+    def stop_consuming(self, consumer_tag=None):
+        for tag in list(self.consumer_tags):
+            self.basic_cancel(tag)
+
+    def close(self, reply_code=0, reply_text='Normal shutdown'):
+        self._close(requeue=True)
+
+    def _close(self, requeue):
+        if not self.is_open:
+            return
+        self.is_open = False
+        for tag in list(self.consumer_tags):
+            self.broker.basic_cancel(tag)
+        self.consumer_tags.clear()
+        with self.broker._lock:
+            pending, self._unacked = list(self._unacked.values()), collections.OrderedDict()
+        if requeue:
+            # Los mensajes sin ack vuelven a su cola, como en RabbitMQ
+            for queue_name, message in reversed(pending):
+                self.broker.requeue(queue_name, message)
+
+
+class MemoryConnection:
+    """Conexión compatible con el subconjunto de BlockingConnection que usa el proyecto."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+        self._channels = []
+        self._channel_numbers = itertools.count(1)
+        self._events = queue.Queue()
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    def channel(self, channel_number=None):
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError("Connection is closed.")
+        channel = MemoryChannel(self, channel_number or next(self._channel_numbers))
+        self._channels.append(channel)
+        return channel
+
+    def add_callback_threadsafe(self, callback):
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError("Connection is closed.")
+        self._events.put(callback)
+
+    def call_later(self, delay, callback):
+        timer = threading.Timer(delay, lambda: self.is_open and self._events.put(callback))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def remove_timeout(self, timeout_id):
+        timeout_id.cancel()
+
+    def process_data_events(self, time_limit=0):
+        """Ejecuta las entregas y callbacks pendientes (esperando hasta time_limit)."""
+        try:
+            if time_limit:
+                callback = self._events.get(timeout=time_limit)
+            elif time_limit is None:
+                callback = self._events.get()
+            else:
+                callback = self._events.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            if callback is not None:
+                callback()
+            try:
+                callback = self._events.get_nowait()
+            except queue.Empty:
+                return
+
+    def sleep(self, duration):
+        self.process_data_events(time_limit=duration)
+
+    def close(self, reply_code=200, reply_text='Normal shutdown'):
+        if not self.is_open:
+            return
+        for channel in self._channels:
+            channel.close()
+        self.is_open = False
+        # Despierta a quien esté esperando en process_data_events
+        self._events.put(None)
+
+
+# Un broker en memoria por (host, puerto) dentro del proceso
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_memory_broker(host='localhost', port=5672):
+    with _brokers_lock:
+        broker = _brokers.get((host, port))
+        if broker is None:
+            broker = _brokers[(host, port)] = InMemoryBroker()
+        return broker
@@ -0,0 +1,204 @@
+import bisect
+import collections
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common.log import get_logger
+
+# Límites superiores (segundos) de los buckets de los histogramas
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Resultados de una entrega
+OUTCOMES = ('ack', 'duplicate', 'retry', 'parked', 'requeue', 'reject')
+
+logger = get_logger('metrics')
+
+
+class Histogram:
+    """Histograma de buckets fijos con percentiles aproximados (límite superior del bucket)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # el último es +inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+class _QueueMetrics:
+    def __init__(self, buckets):
+        self.delivered = 0
+        self.outcomes = collections.Counter()
+        self.handler = Histogram(buckets)
+        self.latency = Histogram(buckets)
+
+
+def published_at(message, properties):
+    """
+    Instante (epoch) en que el productor creó el mensaje
+
+    Usa el campo 'timestamp' que añade EventProducer (con microsegundos) y, si no
+    está, la propiedad AMQP timestamp (con resolución de segundos).
+    """
+    if isinstance(message, dict) and isinstance(message.get('timestamp'), str):
+        try:
+            return datetime.fromisoformat(message['timestamp']).timestamp()
+        except ValueError:
+            pass
+    timestamp = getattr(properties, 'timestamp', None)
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return timestamp
+
+
+class ConsumerMetrics:
+    """
+    Métricas de un consumidor por cola.
+
+    Cuenta entregas y su resultado (ack, duplicado, reintento, aparcado,
+    devuelto, rechazado) y mide en histogramas el tiempo del manejador y la
+    latencia de extremo a extremo (desde que el productor creó el mensaje hasta
+    que el manejador terminó). Si la latencia crece y el tiempo del manejador
+    no, el retraso está en la cola (backlog) y no en el procesamiento.
+
+    Se consultan con ``snapshot()``, por HTTP con ``serve(port)`` o registrando
+    listeners que reciben cada observación.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._queues = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _queue(self, queue_name):
+        metrics = self._queues.get(queue_name)
+        if metrics is None:
+            metrics = self._queues[queue_name] = _QueueMetrics(self.buckets)
+        return metrics
+
+    def add_listener(self, listener):
+        """
+        Registra un callback ``listener(cola, métrica, valor)`` para cada observación
+
+        Las métricas son 'delivered', los resultados de OUTCOMES (valor = número de
+        mensajes), 'handler_seconds' y 'latency_seconds'. Se llama desde el hilo
+        que observa, así que debe ser rápido.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, queue_name, name, value):
+        for listener in self._listeners:
+            try:
+                listener(queue_name, name, value)
+            except Exception as e:
+                logger.warning("Error en listener de métricas: %s", e)
+
+    def delivered(self, queue_name, count=1):
+        with self._lock:
+            self._queue(queue_name).delivered += count
+        self._notify(queue_name, 'delivered', count)
+
+    def outcome(self, queue_name, outcome, count=1):
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Resultado desconocido: {outcome}")
+        with self._lock:
+            self._queue(queue_name).outcomes[outcome] += count
+        self._notify(queue_name, outcome, count)
+
+    def handler_time(self, queue_name, seconds):
+        with self._lock:
+            self._queue(queue_name).handler.observe(seconds)
+        self._notify(queue_name, 'handler_seconds', seconds)
+
+    def latency(self, queue_name, seconds):
+        with self._lock:
+            self._queue(queue_name).latency.observe(max(0.0, seconds))
+        self._notify(queue_name, 'latency_seconds', seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime": round(time.time() - self.started_at, 3),
+                "queues": {
+                    queue_name: {
+                        "delivered": metrics.delivered,
+                        **{outcome: metrics.outcomes[outcome] for outcome in OUTCOMES},
+                        "handlerSeconds": metrics.handler.snapshot(),
+                        "latencySeconds": metrics.latency.snapshot(),
+                    }
+                    for queue_name, metrics in self._queues.items()
+                },
+            }
+
+    def serve(self, port, host='0.0.0.0'):
+        """
+        Expone ``GET /metrics`` (JSON de snapshot) en un hilo en segundo plano
+
+        Returns:
+            Servidor HTTP (se detiene con stop())
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info("Métricas disponibles en http://%s:%s/metrics", host, self._server.server_port)
+        return self._server
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
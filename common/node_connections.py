@@ -0,0 +1,172 @@
+import threading
+import time
+
+import pika
+
+from common.confirms import ConfirmTracker
+from common.hash_ring import HashRing
+from common.log import get_logger
+from common.topology import topology
+
+logger = get_logger('node_connections')
+
+
+class BrokerNode:
+    """Conexión y canales abiertos contra un nodo de RabbitMQ."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.name = f"{host}:{port}"
+        self.connection = None
+        self.channel = None
+        self.confirm_tracker = None
+        self.failed_at = None
+        self.last_error = None
+
+    def is_open(self):
+        return (self.connection is not None and self.connection.is_open
+                and self.channel is not None and self.channel.is_open)
+
+    def get_confirm_tracker(self):
+        """Canal en modo confirm de este nodo (ConfirmTracker), creado solo cuando se necesita"""
+        if self.confirm_tracker is None or not self.confirm_tracker.is_open:
+            self.confirm_tracker = ConfirmTracker(self.connection.channel())
+        return self.confirm_tracker
+
+    def close(self):
+        try:
+            if self.connection is not None and self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+
+
+class NodeConnections:
+    """
+    Conexiones por nodo con reparto de claves de routing por hash consistente.
+
+    Cada clave de routing va siempre al mismo nodo (y conserva su orden); si ese
+    nodo falla se usa el siguiente del anillo hasta que pase ``retry_interval``.
+    El primer nodo configurado es el primario, usado para declarar topología.
+    Un error de canal (exchange inexistente, PRECONDITION_FAILED...) no aparta el
+    nodo: solo se reabre el canal. Nunca se aparta el último nodo disponible.
+    """
+
+    def __init__(self, transport, nodes, retry_interval=5.0, replicas=100, **params):
+        """
+        Args:
+            transport: Transporte con método connect(host, port, **params)
+            nodes: Lista de tuplas (host, puerto)
+            retry_interval: Segundos sin reintentar un nodo que falló
+            replicas: Puntos por nodo en el anillo de hash
+            params: Parámetros extra de conexión (credenciales, heartbeat...)
+        """
+        if not nodes:
+            raise ValueError("Se necesita al menos un nodo de RabbitMQ")
+        self.transport = transport
+        self.params = params
+        self.retry_interval = retry_interval
+        self.nodes = {}
+        for host, port in nodes:
+            node = BrokerNode(host, port)
+            self.nodes.setdefault(node.name, node)
+        self.primary = next(iter(self.nodes.values()))
+        self.ring = HashRing(self.nodes, replicas=replicas)
+        self._lock = threading.RLock()
+
+    def connect(self, node):
+        """Abre (o reabre) la conexión con un nodo"""
+        with self._lock:
+            # Lo declarado en una conexión anterior no se da por válido en la nueva
+            if node.connection is not None:
+                topology.invalidate(node.connection)
+                node.close()
+            try:
+                node.connection = self.transport.connect(node.host, node.port, **self.params)
+                node.channel = node.connection.channel()
+                node.confirm_tracker = None
+                node.failed_at = None
+                node.last_error = None
+                logger.info("Conectado a RabbitMQ en %s", node.name)
+                return True
+            except Exception as e:
+                node.last_error = str(e)
+                self._back_off(node)
+                logger.error("Error al conectar a RabbitMQ en %s: %s", node.name, e)
+                return False
+
+    def _back_off(self, node):
+        """Aparta un nodo durante retry_interval, salvo que sea el único disponible"""
+        now = time.monotonic()
+        others = any(
+            other is not node and (other.failed_at is None or now - other.failed_at >= self.retry_interval)
+            for other in self.nodes.values()
+        )
+        # Sin alternativa, apartarlo solo bloquearía las publicaciones: se reconecta al momento
+        node.failed_at = now if others else None
+
+    def is_connection_error(self, node, error):
+        """Indica si el error es de la conexión con el nodo y no solo de un canal"""
+        return (isinstance(error, pika.exceptions.AMQPConnectionError)
+                or node.connection is None or not node.connection.is_open)
+
+    def mark_failed(self, node, error=None):
+        """
+        Gestiona un error AMQP de un nodo
+
+        Si solo se cerró el canal se reabre al momento; si se perdió la conexión el
+        nodo se aparta y se reintentará pasado retry_interval.
+
+        Returns:
+            True si el nodo quedó apartado (conviene pasar al siguiente del anillo)
+        """
+        with self._lock:
+            topology.invalidate(node.connection)
+            node.confirm_tracker = None
+            node.last_error = str(error) if error else node.last_error
+            if not self.is_connection_error(node, error):
+                try:
+                    if node.channel is None or not node.channel.is_open:
+                        node.channel = node.connection.channel()
+                    return False
+                except Exception as e:
+                    node.last_error = str(e)
+            node.close()
+            self._back_off(node)
+            return True
+
+    def _available(self, node):
+        if node.is_open() and node.failed_at is None:
+            return True
+        if node.failed_at is not None and time.monotonic() - node.failed_at < self.retry_interval:
+            return False
+        return self.connect(node)
+
+    def candidates(self, routing_key):
+        """Nodos disponibles para una clave de routing, en orden de failover"""
+        for name in self.ring.iter_nodes(routing_key):
+            node = self.nodes[name]
+            if self._available(node):
+                yield node
+
+    def node_for(self, routing_key):
+        """Nodo disponible que corresponde a la clave de routing (o None)"""
+        return next(self.candidates(routing_key), None)
+
+    def status(self):
+        now = time.monotonic()
+        return [
+            {
+                "node": node.name,
+                "connected": node.is_open(),
+                "primary": node is self.primary,
+                "failedSecondsAgo": round(now - node.failed_at, 1) if node.failed_at is not None else None,
+                "lastError": node.last_error,
+            }
+            for node in self.nodes.values()
+        ]
+
+    def close(self):
+        for node in self.nodes.values():
+            node.close()
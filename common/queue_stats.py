@@ -0,0 +1,161 @@
+import threading
+import time
+
+import pika
+import requests
+
+from common.log import get_logger
+
+logger = get_logger('queue_stats')
+
+
+class QueueStatsCollector:
+    """
+    Recolector de estadísticas de colas con caché.
+
+    Un hilo en segundo plano refresca periódicamente la profundidad y el número de
+    consumidores de cada cola conocida mediante declaraciones pasivas agrupadas en
+    una única conexión propia. Si se configura la API de management de RabbitMQ,
+    se usa además para descubrir todas las colas y obtener las tasas de publicación
+    y entrega. Las peticiones HTTP solo leen la instantánea en caché, de modo que
+    los dashboards no generan carga AMQP por petición.
+    """
+
+    def __init__(self, connection_factory, ttl=5.0, management_url=None,
+                 management_auth=('guest', 'guest')):
+        """
+        Args:
+            connection_factory: Función sin argumentos que devuelve una conexión nueva
+            ttl: Segundos de validez de la instantánea (y periodo de refresco)
+            management_url: URL de la API de management de RabbitMQ (opcional)
+            management_auth: Credenciales para la API de management
+        """
+        self.connection_factory = connection_factory
+        self.ttl = ttl
+        self.management_url = management_url.rstrip('/') if management_url else None
+        self.management_auth = management_auth
+        self.watched = set()
+        self.last_error = None
+        self._connection = None
+        self._channel = None
+        self._snapshot = {}
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def watch(self, *queue_names):
+        """Añade colas a la lista de colas conocidas."""
+        with self._lock:
+            self.watched.update(name for name in queue_names if name)
+
+    def _get_channel(self):
+        if self._connection is None or not self._connection.is_open:
+            self._connection = self.connection_factory()
+            self._channel = None
+        if self._channel is None or not self._channel.is_open:
+            self._channel = self._connection.channel()
+        return self._channel
+
+    def _from_management(self):
+        """Consulta todas las colas en la API de management de RabbitMQ."""
+        response = requests.get(
+            f"{self.management_url}/api/queues",
+            auth=self.management_auth,
+            timeout=self.ttl
+        )
+        response.raise_for_status()
+
+        stats = {}
+        for queue in response.json():
+            message_stats = queue.get('message_stats', {})
+            stats[queue['name']] = {
+                'messages': queue.get('messages', 0),
+                'consumers': queue.get('consumers', 0),
+                'publishRate': message_stats.get('publish_details', {}).get('rate', 0.0),
+                'deliverRate': message_stats.get('deliver_get_details', {}).get('rate', 0.0),
+            }
+        return stats
+
+    def _from_passive_declares(self, queue_names):
+        """Obtiene profundidad y consumidores con declaraciones pasivas."""
+        stats = {}
+        for queue_name in sorted(queue_names):
+            try:
+                result = self._get_channel().queue_declare(queue=queue_name, passive=True)
+            except pika.exceptions.ChannelClosedByBroker:
+                # 404: la cola no existe; el broker cierra el canal
+                self._channel = None
+                continue
+            stats[queue_name] = {
+                'messages': result.method.message_count,
+                'consumers': result.method.consumer_count,
+                'publishRate': None,
+                'deliverRate': None,
+            }
+        return stats
+
+    def refresh(self):
+        """Refresca la instantánea de estadísticas."""
+        with self._refresh_lock:
+            with self._lock:
+                watched = set(self.watched)
+            stats = {}
+            try:
+                if self.management_url:
+                    stats.update(self._from_management())
+                stats.update(self._from_passive_declares(watched - set(stats)))
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Error al refrescar estadísticas de colas: %s", e)
+                return
+
+            now = time.time()
+            with self._lock:
+                previous, previous_at = self._snapshot, self._refreshed_at
+                for queue_name, queue_stats in stats.items():
+                    # Variación neta de la profundidad desde el refresco anterior
+                    before = previous.get(queue_name)
+                    if before is not None and previous_at and now > previous_at:
+                        queue_stats['depthRate'] = (queue_stats['messages'] - before['messages']) / (now - previous_at)
+                    else:
+                        queue_stats['depthRate'] = None
+                self.watched.update(stats)
+                self._snapshot = stats
+                self._refreshed_at = now
+
+    def snapshot(self):
+        """Devuelve la instantánea en caché sin tocar RabbitMQ."""
+        with self._lock:
+            age = time.time() - self._refreshed_at if self._refreshed_at else None
+            return {
+                "queues": [dict(stats, name=name) for name, stats in sorted(self._snapshot.items())],
+                "refreshedAt": self._refreshed_at,
+                "age": age,
+                "stale": age is None or age > self.ttl * 2,
+                "lastError": self.last_error,
+            }
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._stop_event.wait(self.ttl)
+
+    def start(self):
+        """Inicia el refresco periódico en segundo plano."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.ttl)
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
@@ -1,18 +1,97 @@
 import pika
+import time
+import uuid
 from common.settings import settings
+from common.topology import topology
+from common.transport import get_transport
+from common.serialization import get_codec
+from common.hash_ring import parse_nodes
+from common.node_connections import NodeConnections
 
 class RabbitMQ:
     def __init__(self):
-        creds = pika.PlainCredentials(settings.rabbit_user, settings.rabbit_pass)
-        params = pika.ConnectionParameters(
-            host=settings.rabbit_host,
-            port=settings.rabbit_port,
-            credentials=creds
+        self.codec = get_codec(
+            settings.event_serializer,
+            settings.event_compression,
+            settings.event_compress_threshold
         )
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
+        # RABBIT_NODES='h1:5672,h2:5672' reparte las publicaciones entre varios nodos
+        nodes = parse_nodes(settings.rabbit_nodes) if settings.rabbit_nodes else [
+            (settings.rabbit_host, settings.rabbit_port)
+        ]
+        self.nodes = NodeConnections(
+            get_transport(settings.event_transport),
+            nodes,
+            credentials=pika.PlainCredentials(settings.rabbit_user, settings.rabbit_pass)
+        )
+        self.exchanges = {}  # exchange -> (tipo, durable), para declararlo en cada nodo
+        self.connect()
+
+    @property
+    def connection(self):
+        return self.nodes.primary.connection
+
+    @property
+    def channel(self):
+        return self.nodes.primary.channel
+
+    def connect(self):
+        if not self.nodes.connect(self.nodes.primary):
+            raise pika.exceptions.AMQPConnectionError(self.nodes.primary.last_error)
 
     def get_channel(self):
+        if not self.nodes.primary.is_open():
+            self.connect()
         return self.channel
 
-rabbitmq = RabbitMQ()
\ No newline at end of file
+    def declare_exchange(self, exchange, exchange_type='topic', durable=True):
+        """Declara el exchange solo la primera vez en esta conexión."""
+        self.exchanges[exchange] = (exchange_type, durable)
+        channel = self.get_channel()
+        topology.declare_exchange(channel, exchange, exchange_type, durable, scope=self.connection)
+        return channel
+
+    def publish(self, exchange, routing_key, payload, delivery_mode=None, message_id=None):
+        """
+        Serializa el payload con el codec configurado y lo publica en el nodo que
+        corresponde a la clave de routing (o en el siguiente si ese falla).
+
+        El message_id (el indicado, el del payload o uno nuevo) es el que usan los
+        consumidores para descartar reentregas; quien reintente una publicación
+        debe pasar el mismo.
+
+        Returns:
+            ID del mensaje publicado
+        """
+        if message_id is None and isinstance(payload, dict):
+            message_id = payload.get('message_id')
+        message_id = str(message_id or uuid.uuid4())
+        body, content_type, content_encoding = self.codec.encode(payload)
+        properties = pika.BasicProperties(
+            message_id=message_id,
+            timestamp=int(time.time()),
+            content_type=content_type,
+            content_encoding=content_encoding,
+            delivery_mode=delivery_mode
+        )
+        error = None
+        for node in self.nodes.candidates(routing_key):
+            try:
+                if exchange in self.exchanges:
+                    exchange_type, durable = self.exchanges[exchange]
+                    topology.declare_exchange(node.channel, exchange, exchange_type, durable, scope=node.connection)
+                node.channel.basic_publish(
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=properties
+                )
+                return message_id
+            except pika.exceptions.AMQPError as e:
+                error = e
+                if not self.nodes.mark_failed(node, e):
+                    # Error del canal (ya reabierto): es de esta publicación, no del nodo
+                    raise
+        raise error or pika.exceptions.AMQPConnectionError("Ningún nodo de RabbitMQ disponible")
+
+rabbitmq = RabbitMQ()
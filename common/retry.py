@@ -0,0 +1,131 @@
+import time
+
+import pika
+
+# Cabeceras que acompañan a un mensaje en sus reintentos
+RETRY_COUNT_HEADER = 'x-retry-count'
+ORIGINAL_ROUTING_KEY_HEADER = 'x-original-routing-key'
+LAST_ERROR_HEADER = 'x-last-error'
+PARKED_AT_HEADER = 'x-parked-at'
+
+# Longitud máxima del error guardado en cabecera
+MAX_ERROR_LENGTH = 500
+
+
+def retry_queue_name(queue_name, delay_ms):
+    return f"{queue_name}.retry.{delay_ms}"
+
+
+def parking_queue_name(queue_name):
+    return f"{queue_name}.parking"
+
+
+def copy_properties(properties, headers):
+    """Propiedades de un mensaje con otras cabeceras (persistente)."""
+    return pika.BasicProperties(
+        content_type=properties.content_type,
+        content_encoding=properties.content_encoding,
+        message_id=properties.message_id,
+        correlation_id=properties.correlation_id,
+        timestamp=properties.timestamp,
+        headers=headers,
+        delivery_mode=2
+    )
+
+
+class RetryPolicy:
+    """
+    Reintentos diferidos con colas de espera en lugar de devolver a la cola.
+
+    Cada nivel es una cola ``<cola>.retry.<ms>`` sin consumidores, con
+    ``x-message-ttl`` y como dead-letter la propia cola: al expirar, RabbitMQ
+    devuelve el mensaje a la cola original. Como todos los mensajes de un nivel
+    tienen el mismo TTL, ninguno bloquea a los demás. Agotados los intentos, el
+    mensaje se aparca en ``<cola>.parking`` para revisarlo y reenviarlo desde la
+    API del broker.
+    """
+
+    def __init__(self, max_attempts=5, base_delay_ms=1000, multiplier=5):
+        """
+        Args:
+            max_attempts: Entregas como máximo, contando la primera
+            base_delay_ms: Espera antes del primer reintento
+            multiplier: Factor de crecimiento de la espera entre niveles
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts debe ser al menos 1.")
+        self.max_attempts = max_attempts
+        self.delays = tuple(int(base_delay_ms * multiplier ** tier) for tier in range(max_attempts - 1))
+
+    def queue_arguments(self, queue_name):
+        """
+        Colas auxiliares de una cola
+
+        Returns:
+            Lista de (nombre, argumentos) con los niveles de reintento y la cola de aparcados
+        """
+        queues = [
+            (retry_queue_name(queue_name, delay), {
+                'x-message-ttl': delay,
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': queue_name,
+            })
+            for delay in dict.fromkeys(self.delays)
+        ]
+        queues.append((parking_queue_name(queue_name), None))
+        return queues
+
+    def next_hop(self, queue_name, routing_key, headers, error):
+        """
+        Destino de un mensaje que ha fallado
+
+        Args:
+            queue_name: Cola de la que se consumió
+            routing_key: Clave de routing con la que se entregó
+            headers: Cabeceras del mensaje
+            error: Excepción o descripción del fallo
+
+        Returns:
+            Tupla (cola destino, nuevas cabeceras)
+        """
+        headers = dict(headers or {})
+        retries = int(headers.get(RETRY_COUNT_HEADER, 0))
+        # Al volver de la cola de espera la clave es el nombre de la cola: se conserva la primera
+        headers.setdefault(ORIGINAL_ROUTING_KEY_HEADER, routing_key)
+        headers[LAST_ERROR_HEADER] = str(error)[:MAX_ERROR_LENGTH]
+        if retries < len(self.delays):
+            headers[RETRY_COUNT_HEADER] = retries + 1
+            return retry_queue_name(queue_name, self.delays[retries]), headers
+        headers[PARKED_AT_HEADER] = int(time.time())
+        return parking_queue_name(queue_name), headers
+
+    def declare(self, channel, queue_name):
+        """Declara las colas de reintento y de aparcados de una cola."""
+        for name, arguments in self.queue_arguments(queue_name):
+            channel.queue_declare(queue=name, durable=True, arguments=arguments)
+
+    def republish(self, channel, queue_name, routing_key, properties, body, error):
+        """
+        Publica un mensaje fallido en su siguiente nivel (o lo aparca)
+
+        Returns:
+            Nombre de la cola destino
+        """
+        target, headers = self.next_hop(queue_name, routing_key, properties.headers, error)
+        channel.basic_publish(
+            exchange='',
+            routing_key=target,
+            body=body,
+            properties=copy_properties(properties, headers)
+        )
+        return target
+
+
+def original_routing_key(properties, routing_key):
+    """Clave de routing con la que se publicó el mensaje, aunque venga de un reintento."""
+    headers = properties.headers or {}
+    return headers.get(ORIGINAL_ROUTING_KEY_HEADER, routing_key)
+
+
+# Política por defecto: reintentos a 1 s, 5 s, 25 s y 125 s, después a aparcados
+DEFAULT_RETRY_POLICY = RetryPolicy()
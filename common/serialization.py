@@ -0,0 +1,162 @@
+import gzip
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+
+class SerializationError(ValueError):
+    """El cuerpo del mensaje no se pudo codificar o decodificar."""
+
+
+class JsonSerializer:
+    name = 'json'
+    content_type = 'application/json'
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """JSON con orjson: mismo formato en el cable, bastante menos CPU."""
+
+    name = 'orjson'
+    content_type = 'application/json'
+
+    def __init__(self):
+        if orjson is None:
+            raise SerializationError("El serializador 'orjson' requiere instalar orjson")
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgpackSerializer:
+    name = 'msgpack'
+    content_type = 'application/x-msgpack'
+
+    def __init__(self):
+        if msgpack is None:
+            raise SerializationError("El serializador 'msgpack' requiere instalar msgpack")
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    OrjsonSerializer.name: OrjsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+
+# content_encoding -> (comprimir, descomprimir)
+COMPRESSORS = {
+    'gzip': (gzip.compress, gzip.decompress),
+    'deflate': (zlib.compress, zlib.decompress),
+}
+
+
+class MessageCodec:
+    """
+    Codifica cuerpos de mensaje con un serializador y compresión opcional.
+
+    La compresión solo se aplica a cuerpos de al menos ``compress_threshold`` bytes;
+    el consumidor la detecta por ``content_encoding``.
+    """
+
+    def __init__(self, serializer='json', compression=None, compress_threshold=1024):
+        """
+        Args:
+            serializer: Nombre del serializador ('json', 'orjson', 'msgpack')
+            compression: Compresión ('gzip', 'deflate') o None
+            compress_threshold: Tamaño mínimo en bytes para comprimir
+        """
+        if serializer not in SERIALIZERS:
+            raise SerializationError(f"Serializador desconocido: {serializer}")
+        if compression is not None and compression not in COMPRESSORS:
+            raise SerializationError(f"Compresión desconocida: {compression}")
+        self.serializer = SERIALIZERS[serializer]()
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+
+    @property
+    def content_type(self):
+        return self.serializer.content_type
+
+    def encode(self, obj):
+        """
+        Serializa (y comprime si corresponde) un objeto
+
+        Returns:
+            Tupla (body, content_type, content_encoding)
+        """
+        try:
+            body = self.serializer.dumps(obj)
+        except (TypeError, ValueError) as e:
+            raise SerializationError(f"No se pudo serializar el mensaje: {str(e)}")
+        if self.compression and len(body) >= self.compress_threshold:
+            compress, _ = COMPRESSORS[self.compression]
+            return compress(body), self.content_type, self.compression
+        return body, self.content_type, None
+
+
+# Decodificador preferido por content_type (orjson si está disponible)
+_DECODERS = {
+    'application/json': (OrjsonSerializer if orjson is not None else JsonSerializer)(),
+}
+if msgpack is not None:
+    _DECODERS['application/x-msgpack'] = MsgpackSerializer()
+
+
+def decode(body, content_type=None, content_encoding=None):
+    """
+    Decodifica un cuerpo según su content_type y content_encoding
+
+    Sin content_type se asume JSON, que es lo que publicaban todas las versiones
+    anteriores.
+    """
+    if content_encoding and content_encoding != 'identity':
+        if content_encoding not in COMPRESSORS:
+            raise SerializationError(f"content_encoding no soportado: {content_encoding}")
+        _, decompress = COMPRESSORS[content_encoding]
+        try:
+            body = decompress(body)
+        except (OSError, zlib.error) as e:
+            raise SerializationError(f"No se pudo descomprimir el mensaje: {str(e)}")
+
+    decoder = _DECODERS.get(content_type or 'application/json')
+    if decoder is None:
+        raise SerializationError(f"content_type no soportado: {content_type}")
+    try:
+        return decoder.loads(body)
+    except Exception as e:
+        raise SerializationError(f"Mensaje no válido ({content_type}): {str(e)}")
+
+
+_codecs = {}
+
+
+def get_codec(serializer='json', compression=None, compress_threshold=1024):
+    """Devuelve un MessageCodec compartido para la combinación pedida."""
+    key = (serializer or 'json', compression or None, compress_threshold)
+    codec = _codecs.get(key)
+    if codec is None:
+        codec = _codecs[key] = MessageCodec(*key)
+    return codec
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -6,7 +7,12 @@ class Settings(BaseSettings):
     rabbit_port: int = 5672
     rabbit_user: str = 'guest'
     rabbit_pass: str = 'guest'
+    rabbit_nodes: Optional[str] = None
     min_threshold: int = 30
+    event_transport: str = 'rabbitmq'
+    event_serializer: str = 'json'
+    event_compression: Optional[str] = None
+    event_compress_threshold: int = 1024
 
     class Config:
         env_file = '.env'
@@ -0,0 +1,291 @@
+import collections
+import json
+import os
+import threading
+import time
+
+from common.log import get_logger
+
+SEGMENT_SUFFIX = '.spool'
+CURSOR_FILE = 'cursor.json'
+# Registros que fallaron de forma permanente al vaciar el spool (uno por línea)
+PARKED_FILE = 'parked.jsonl'
+
+logger = get_logger('spool')
+
+
+class MessageSpool:
+    """
+    Spool local de mensajes en disco: solo se añade al final, en segmentos.
+
+    Cada registro es una línea JSON. Las escrituras se sincronizan con fsync por
+    grupos (cada ``fsync_batch`` registros o ``fsync_interval_ms``), de modo que
+    encolar cuesta lo que una escritura en disco. La lectura avanza con un cursor
+    persistido y los segmentos consumidos se borran. Los registros que no se
+    pueden publicar por un error del propio mensaje se apartan a ``parked.jsonl``.
+    """
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, fsync_interval_ms=50, fsync_batch=1000):
+        """
+        Args:
+            directory: Directorio del spool (se crea si no existe)
+            segment_bytes: Tamaño a partir del cual se abre un segmento nuevo
+            fsync_interval_ms: Tiempo máximo sin sincronizar registros escritos
+            fsync_batch: Registros escritos que fuerzan un fsync
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.fsync_batch = fsync_batch
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.spooled = 0
+        self.drained = 0
+        self.failed = 0
+        self._drain_history = collections.deque()  # (instante, registros confirmados)
+
+        segments = self._segments()
+        self._read_seq, self._read_offset = self._load_cursor(segments)
+        self._write_seq = segments[-1] if segments else self._read_seq
+        self._file = open(self._path(self._write_seq), 'ab')
+        self._records = self._count_pending()
+
+    # Segmentos y cursor
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _load_cursor(self, segments):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                cursor = json.load(f)
+            return cursor['segment'], cursor['offset']
+        except (OSError, ValueError, KeyError):
+            return (segments[0] if segments else 0), 0
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'segment': self._read_seq, 'offset': self._read_offset}, f)
+        os.replace(path + '.tmp', path)
+
+    def _scan(self, seq, offset, limit=None):
+        """Lee registros desde (seq, offset); devuelve [(registro, (seq, offset final))]"""
+        records = []
+        while seq <= self._write_seq and (limit is None or len(records) < limit):
+            try:
+                with open(self._path(seq), 'rb') as f:
+                    f.seek(offset)
+                    while limit is None or len(records) < limit:
+                        line = f.readline()
+                        # Una línea sin salto es una escritura a medias (o la cola del segmento activo)
+                        if not line.endswith(b'\n'):
+                            break
+                        offset += len(line)
+                        try:
+                            records.append((json.loads(line), (seq, offset)))
+                        except ValueError:
+                            logger.warning('Registro corrupto descartado en el spool (segmento %s)', seq)
+            except FileNotFoundError:
+                pass
+            if seq == self._write_seq or (limit is not None and len(records) >= limit):
+                break
+            seq, offset = seq + 1, 0
+        return records
+
+    def _count_pending(self):
+        return len(self._scan(self._read_seq, self._read_offset))
+
+    # Escritura
+
+    def append(self, record):
+        """Añade un registro (serializable a JSON) al final del spool"""
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file.tell() > 0 and self._file.tell() + len(line) > self.segment_bytes:
+                self._roll()
+            self._file.write(line)
+            self._records += 1
+            self.spooled += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def sync(self):
+        """Fuerza el fsync de los registros escritos"""
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _roll(self):
+        self._sync()
+        self._file.close()
+        self._write_seq += 1
+        self._file = open(self._path(self._write_seq), 'ab')
+
+    # Lectura
+
+    def pending(self):
+        """Registros escritos y aún no confirmados"""
+        return self._records
+
+    def read(self, max_records=1000):
+        """
+        Lee registros pendientes sin consumirlos
+
+        Returns:
+            Lista de (registro, posición); la posición se pasa a commit()
+        """
+        with self._lock:
+            self._file.flush()
+            return self._scan(self._read_seq, self._read_offset, max_records)
+
+    def commit(self, position, count, failed=()):
+        """
+        Avanza el cursor hasta position (tras count registros) y borra segmentos consumidos
+
+        Args:
+            position: Posición devuelta por read() para el último registro consumido
+            count: Registros consumidos, incluidos los fallidos
+            failed: Pares (registro, error) que no se publicarán; se apartan en
+                parked.jsonl antes de mover el cursor
+        """
+        with self._lock:
+            if failed:
+                self._park(failed)
+            seq, offset = position
+            previous = self._read_seq
+            self._read_seq, self._read_offset = seq, offset
+            self._records = max(0, self._records - count)
+            self.drained += count - len(failed)
+            self.failed += len(failed)
+            self._drain_history.append((time.monotonic(), count - len(failed)))
+            self._save_cursor()
+            for old in range(previous, seq):
+                try:
+                    os.remove(self._path(old))
+                except FileNotFoundError:
+                    pass
+
+    def _park(self, failed):
+        with open(os.path.join(self.directory, PARKED_FILE), 'ab') as f:
+            for record, error in failed:
+                f.write((json.dumps({"record": record, "error": error}, default=str) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def stats(self, window=60.0):
+        """Tamaño del spool y ritmo de vaciado (mensajes/s en la última ventana)"""
+        with self._lock:
+            now = time.monotonic()
+            while self._drain_history and now - self._drain_history[0][0] > window:
+                self._drain_history.popleft()
+            recent = sum(count for _, count in self._drain_history)
+            segments = self._segments()
+            size = sum(os.path.getsize(self._path(seq)) for seq in segments) - self._read_offset
+            return {
+                "records": self._records,
+                "bytes": max(0, size),
+                "segments": len(segments),
+                "spooled": self.spooled,
+                "drained": self.drained,
+                "failed": self.failed,
+                "drainRate": round(recent / window, 2),
+            }
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+
+class SpoolDrainer:
+    """
+    Hilo que reenvía el contenido del spool por lotes cuando vuelve la conectividad.
+
+    Solo avanza el cursor sobre el prefijo procesado de cada lote, así el orden se
+    conserva y lo no confirmado se reintenta (entrega al menos una vez). Un registro
+    con un error permanente (sin ``retryable``) no bloquea a los siguientes: se
+    aparta con su error y el cursor pasa de largo.
+    """
+
+    def __init__(self, spool, send_batch, batch_size=1000, retry_interval=1.0):
+        """
+        Args:
+            spool: MessageSpool a vaciar
+            send_batch: Función que recibe una lista de registros y devuelve, en el
+                mismo orden, un resultado {status, error, retryable, ...} por registro
+            batch_size: Registros por lote
+            retry_interval: Espera entre intentos mientras el broker no responde
+        """
+        self.spool = spool
+        self.send_batch = send_batch
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='spool-drainer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    def drain_once(self):
+        """
+        Envía un lote del spool
+
+        Returns:
+            Número de registros consumidos (confirmados o apartados por error permanente)
+        """
+        batch = self.spool.read(self.batch_size)
+        if not batch:
+            return 0
+        try:
+            results = self.send_batch([record for record, _ in batch])
+        except Exception as e:
+            logger.error('Error al vaciar el spool: %s', e)
+            return 0
+        consumed = 0
+        failed = []
+        for (record, _), result in zip(batch, results):
+            if not result or (result.get('status') != 'ack' and result.get('retryable', True)):
+                # Sin conectividad: este y los siguientes se reintentan en orden
+                break
+            if result.get('status') != 'ack':
+                logger.error('Registro del spool descartado por error permanente: %s', result.get('error'))
+                failed.append((record, result.get('error')))
+            consumed += 1
+        if consumed:
+            self.spool.commit(batch[consumed - 1][1], consumed, failed)
+        return consumed
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self.spool.pending() and self.drain_once():
+                continue
+            # Sin pendientes o sin conectividad: esperar antes de reintentar
+            self._wakeup.wait(self.retry_interval)
+            self._wakeup.clear()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
@@ -0,0 +1,120 @@
+import itertools
+import threading
+
+
+class _Node:
+    __slots__ = ('children', 'star', 'hash', 'values')
+
+    def __init__(self):
+        self.children = {}
+        self.star = None
+        self.hash = None
+        self.values = {}  # valor -> número de secuencia de inserción
+
+
+class TopicTrie:
+    """
+    Trie de patrones de routing AMQP de tipo topic.
+
+    Los patrones se dividen en palabras separadas por puntos; ``*`` encaja con
+    exactamente una palabra y ``#`` con cero o más. El coste de ``match`` depende
+    de la longitud de la clave y de los comodines del camino recorrido, no del
+    número de patrones registrados. Los resultados se memorizan por clave hasta
+    el siguiente cambio en el trie.
+    """
+
+    def __init__(self, cache_size=4096):
+        self._root = _Node()
+        self._sequence = itertools.count()
+        self._cache = {}
+        self._cache_size = cache_size
+        self._lock = threading.RLock()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, pattern, value):
+        """Registra un valor para un patrón (idempotente)."""
+        with self._lock:
+            node = self._root
+            for word in pattern.split('.'):
+                if word == '*':
+                    if node.star is None:
+                        node.star = _Node()
+                    node = node.star
+                elif word == '#':
+                    if node.hash is None:
+                        node.hash = _Node()
+                    node = node.hash
+                else:
+                    node = node.children.setdefault(word, _Node())
+            if value not in node.values:
+                node.values[value] = next(self._sequence)
+                self._size += 1
+            self._cache.clear()
+
+    def remove(self, pattern, value):
+        """Elimina un valor de un patrón. Devuelve True si existía."""
+        with self._lock:
+            node = self._root
+            for word in pattern.split('.'):
+                if word == '*':
+                    node = node.star
+                elif word == '#':
+                    node = node.hash
+                else:
+                    node = node.children.get(word)
+                if node is None:
+                    return False
+            if node.values.pop(value, None) is None:
+                return False
+            self._size -= 1
+            self._cache.clear()
+            return True
+
+    def match(self, routing_key):
+        """
+        Devuelve los valores cuyos patrones encajan con la clave
+
+        Returns:
+            Tupla sin duplicados, en orden de registro
+        """
+        cached = self._cache.get(routing_key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            words = routing_key.split('.')
+            total = len(words)
+            found = {}
+            visited = set()
+            stack = [(self._root, 0)]
+
+            while stack:
+                node, index = stack.pop()
+                if (id(node), index) in visited:
+                    continue
+                visited.add((id(node), index))
+
+                if node.hash is not None:
+                    # '#' consume de cero a todas las palabras restantes
+                    for next_index in range(index, total + 1):
+                        stack.append((node.hash, next_index))
+
+                if index == total:
+                    for value, sequence in node.values.items():
+                        found[value] = sequence
+                    continue
+
+                child = node.children.get(words[index])
+                if child is not None:
+                    stack.append((child, index + 1))
+                if node.star is not None:
+                    stack.append((node.star, index + 1))
+
+            result = tuple(sorted(found, key=found.__getitem__))
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[routing_key] = result
+            return result
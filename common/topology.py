@@ -0,0 +1,71 @@
+import threading
+
+
+class TopologyCache:
+    """
+    Registro compartido de la topología ya declarada.
+
+    Recuerda, por ámbito (una conexión de pika o la URL de la API del broker), qué
+    exchanges se declararon y con qué parámetros, para evitar redeclararlos en cada
+    publicación. El ámbito debe invalidarse al reconectar o cuando el broker cierra
+    el canal, ya que la topología no durable o mal declarada deja de ser fiable.
+    """
+
+    def __init__(self):
+        self._declared = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _scope_key(scope):
+        # Las conexiones se identifican por id(); las URLs por su valor
+        return scope if isinstance(scope, str) else id(scope)
+
+    def is_declared(self, scope, exchange_name, exchange_type='topic', durable=True):
+        with self._lock:
+            declared = self._declared.get(self._scope_key(scope), {})
+            return declared.get(exchange_name) == (exchange_type, durable)
+
+    def mark_declared(self, scope, exchange_name, exchange_type='topic', durable=True):
+        with self._lock:
+            self._declared.setdefault(self._scope_key(scope), {})[exchange_name] = (exchange_type, durable)
+
+    def invalidate(self, scope=None):
+        """Olvida la topología de un ámbito (o de todos si scope es None)."""
+        with self._lock:
+            if scope is None:
+                self._declared.clear()
+            else:
+                self._declared.pop(self._scope_key(scope), None)
+
+    def declare_exchange(self, channel, exchange_name, exchange_type='topic', durable=True, scope=None):
+        """
+        Declara un exchange solo si no está registrado en el ámbito
+
+        Args:
+            channel: Canal de pika con el que declarar
+            exchange_name: Nombre del exchange
+            exchange_type: Tipo de exchange (direct, fanout, topic, headers)
+            durable: Si el exchange debe persistir después de reiniciar el broker
+            scope: Ámbito del registro (por defecto la conexión del canal)
+
+        Returns:
+            True si se hizo la declaración, False si ya estaba registrada
+        """
+        scope = channel.connection if scope is None else scope
+        if self.is_declared(scope, exchange_name, exchange_type, durable):
+            return False
+        try:
+            channel.exchange_declare(
+                exchange=exchange_name,
+                exchange_type=exchange_type,
+                durable=durable
+            )
+        except Exception:
+            self.invalidate(scope)
+            raise
+        self.mark_declared(scope, exchange_name, exchange_type, durable)
+        return True
+
+
+# Registro compartido por productores y publicadores del proceso
+topology = TopologyCache()
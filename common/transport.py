@@ -0,0 +1,54 @@
+import os
+
+import pika
+
+from common.memory_broker import get_memory_broker
+
+
+class RabbitMQTransport:
+    """Transporte por defecto: conexiones bloqueantes de pika contra RabbitMQ."""
+
+    name = 'rabbitmq'
+
+    def connect(self, host='localhost', port=5672, **params):
+        return pika.BlockingConnection(
+            pika.ConnectionParameters(host=host, port=port, **params)
+        )
+
+
+class MemoryTransport:
+    """Transporte en memoria: un InMemoryBroker por (host, puerto) dentro del proceso."""
+
+    name = 'memory'
+
+    def connect(self, host='localhost', port=5672, **params):
+        # heartbeat, credenciales, etc. no aplican en memoria
+        return get_memory_broker(host, port).connect()
+
+
+TRANSPORTS = {
+    RabbitMQTransport.name: RabbitMQTransport,
+    MemoryTransport.name: MemoryTransport,
+}
+
+
+def get_transport(transport=None):
+    """
+    Resuelve el transporte a usar
+
+    Args:
+        transport: Nombre registrado ('rabbitmq', 'memory'), una instancia con
+            método connect(host, port, **params) o None para usar la variable de
+            entorno EVENT_TRANSPORT (por defecto 'rabbitmq')
+
+    Returns:
+        Instancia del transporte
+    """
+    if transport is None:
+        transport = os.environ.get('EVENT_TRANSPORT', RabbitMQTransport.name)
+    if not isinstance(transport, str):
+        return transport
+    try:
+        return TRANSPORTS[transport]()
+    except KeyError:
+        raise ValueError(f"Transporte desconocido: {transport} (disponibles: {', '.join(TRANSPORTS)})")
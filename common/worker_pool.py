@@ -0,0 +1,49 @@
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+WORKER_MODES = ('thread', 'process')
+
+
+class WorkerPool:
+    """
+    Pool de workers para ejecutar manejadores fuera del hilo de I/O del consumidor.
+
+    Con ``ordered`` cada clave (la clave de routing) se asigna siempre al mismo
+    carril de un solo worker, de modo que los mensajes de una misma clave se
+    procesan en orden y los de claves distintas en paralelo.
+    """
+
+    def __init__(self, workers=4, mode='thread', ordered=False):
+        """
+        Args:
+            workers: Número de workers (o de carriles si ordered)
+            mode: 'thread' (hilos) o 'process' (procesos; manejador y mensaje deben
+                poder serializarse con pickle)
+            ordered: Si es True, garantiza orden por clave
+        """
+        if workers < 1:
+            raise ValueError("El pool necesita al menos un worker")
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Modo de worker desconocido: {mode} (disponibles: {', '.join(WORKER_MODES)})")
+        self.workers = workers
+        self.mode = mode
+        self.ordered = ordered
+        executor = ThreadPoolExecutor if mode == 'thread' else ProcessPoolExecutor
+        if ordered:
+            self._lanes = [executor(max_workers=1) for _ in range(workers)]
+        else:
+            self._lanes = [executor(max_workers=workers)]
+
+    def submit(self, key, func, *args):
+        """
+        Programa func(*args) en el carril de la clave
+
+        Returns:
+            Future con el resultado
+        """
+        lane = self._lanes[zlib.crc32((key or '').encode('utf-8')) % len(self._lanes)]
+        return lane.submit(func, *args)
+
+    def shutdown(self, wait=True):
+        for lane in self._lanes:
+            lane.shutdown(wait=wait)
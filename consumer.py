@@ -1,89 +1,626 @@
 #!/usr/bin/env python
-import pika
-import json
+import random
 import uuid
 import threading
 import time
-from typing import Callable, Dict, Any
+import requests
+from functools import partial
+from typing import Callable, Dict, Any, Iterable, List, Optional
+from common.log import SAMPLED, get_logger
+from common.metrics import ConsumerMetrics, published_at
+from common.retry import DEFAULT_RETRY_POLICY, original_routing_key, parking_queue_name
+from common.topic_trie import TopicTrie
+from common.topology import topology
+from common.transport import get_transport
+from common.serialization import SerializationError, decode
+from common.worker_pool import WorkerPool
+
+# Mensajes sin ack que RabbitMQ entrega como máximo a cada consumidor (0 = sin límite)
+DEFAULT_PREFETCH = 10
+
+# Espera máxima (segundos) al detenerse para que terminen los mensajes en curso
+DRAIN_TIMEOUT = 20.0
+
+BatchHandler = Callable[[List[Dict[str, Any]]], Optional[Iterable[int]]]
+
+
+def _timed_call(handler, payload):
+    """Ejecuta un manejador midiendo su duración: (resultado, segundos, excepción)."""
+    started = time.perf_counter()
+    try:
+        return handler(payload), time.perf_counter() - started, None
+    except Exception as e:
+        return None, time.perf_counter() - started, e
+
+
+def _timed_result(future):
+    """Resultado de un _timed_call ejecutado en el pool (o el error del propio pool)."""
+    error = future.exception()
+    if error is not None:
+        return None, None, error
+    return future.result()
+
+
+class _BatchState:
+    """Entregas acumuladas de una cola con manejador por lotes."""
+
+    def __init__(self, queue_name, handler, max_batch, max_wait, channel):
+        self.queue_name = queue_name
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.channel = channel
+        self.buffer = []  # (delivery_tag, mensaje, (clave, propiedades, cuerpo))
+        self.first_at = None
+        self.timer = None
+        self.in_flight = False
 
 class EventConsumer:
-    def __init__(self, rabbitmq_host='localhost', rabbitmq_port=5672, consumer_id=None):
+    def __init__(self, rabbitmq_host='localhost', rabbitmq_port=5672, consumer_id=None,
+                 broker_api=None, transport=None, prefetch_count=DEFAULT_PREFETCH,
+                 workers=0, worker_mode='thread', ordered=False, retry_policy=DEFAULT_RETRY_POLICY,
+                 dedup=None, metrics=None, reconnect_base_delay=1.0, reconnect_max_delay=30.0,
+                 max_reconnect_attempts=None, drain_timeout=DRAIN_TIMEOUT):
+        """
+        Args:
+            prefetch_count: Mensajes sin ack en vuelo por consumidor (basic_qos; 0 = sin límite)
+            workers: Manejadores en paralelo; con 0 se ejecutan en el hilo de I/O
+            worker_mode: 'thread' o 'process' (el manejador debe poder serializarse)
+            ordered: Procesar en orden los mensajes de una misma clave de routing
+            retry_policy: RetryPolicy para los mensajes que fallan; con None se
+                devuelven a la cola de inmediato
+            dedup: DedupStore para descartar mensajes ya procesados (por message_id)
+            metrics: ConsumerMetrics donde registrar entregas, resultados y tiempos
+                (por defecto uno propio, accesible en ``self.metrics``)
+            reconnect_base_delay: Espera inicial antes de reintentar la conexión
+            reconnect_max_delay: Espera máxima entre reintentos de conexión
+            max_reconnect_attempts: Reintentos seguidos antes de rendirse (None = sin límite)
+            drain_timeout: Segundos que stop() espera a los mensajes en curso
+        """
         self.rabbitmq_host = rabbitmq_host
         self.rabbitmq_port = rabbitmq_port
+        self.broker_api = broker_api
+        self.transport = get_transport(transport)
         self.consumer_id = consumer_id or f"consumer-{uuid.uuid4().hex[:6]}"
+        self.log = get_logger('consumer', consumer=self.consumer_id)
+        self.prefetch_count = prefetch_count
+        self.pool = WorkerPool(workers, worker_mode, ordered) if workers else None
+        self.retry_policy = retry_policy
+        self.dedup = dedup
+        self.metrics = metrics or ConsumerMetrics()
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.drain_timeout = drain_timeout
         self.connection = None
         self.channel = None
         self.message_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self.routes: Dict[str, TopicTrie] = {}  # cola -> patrón de routing -> manejador
+        self.batch_handlers: Dict[str, _BatchState] = {}
+        self.subscriptions = set()  # Tuplas (cola, exchange, clave de routing)
         self.running = False
+
+        # Estado del ciclo de vida: consuming, reconnecting, draining, stopped o failed
+        self.state = 'disconnected'
+        self.last_error = None
+        self.reconnect_attempts = 0
+        self.reconnections = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._consumer_tags = []  # (canal, consumer tag) de las suscripciones activas
+        self._pending = 0  # Mensajes entregados al pool sin confirmar (solo hilo de I/O)
         self.connect()
 
     def connect(self):
         """Establece conexión con RabbitMQ."""
         try:
-            self.connection = pika.BlockingConnection(
-                pika.ConnectionParameters(host=self.rabbitmq_host, port=self.rabbitmq_port)
-            )
+            self.connection = self.transport.connect(self.rabbitmq_host, self.rabbitmq_port)
             self.channel = self.connection.channel()
-            print(f"[{self.consumer_id}] Conectado a RabbitMQ")
+            if self.prefetch_count:
+                self.channel.basic_qos(prefetch_count=self.prefetch_count)
+            self.state = 'connected'
+            self.log.info("Conectado a RabbitMQ")
         except Exception as e:
-            print(f"[{self.consumer_id}] Error de conexión: {str(e)}")
+            self.state = 'disconnected'
+            self.last_error = str(e)
+            self.log.error("Error de conexión: %s", e)
             raise
 
-    def register_handler(self, queue_name: str, handler: Callable[[Dict[str, Any]], None]):
-        """Registra un manejador para una cola."""
+    def is_connected(self):
+        """Indica si la conexión y todos los canales del consumidor están abiertos."""
+        return bool(
+            self.connection and self.connection.is_open
+            and self.channel and self.channel.is_open
+            and all(state.channel.is_open for state in self.batch_handlers.values())
+        )
+
+    def register_handler(self, queue_name: str, handler: Callable[[Dict[str, Any]], None],
+                         pattern: Optional[str] = None):
+        """
+        Registra un manejador para una cola.
+
+        Args:
+            queue_name: Cola de la que se consume
+            handler: Función que recibe el mensaje decodificado
+            pattern: Patrón de routing (``pedido.*``, ``usuario.#``) para atender solo
+                esas claves; sin patrón es el manejador por defecto de la cola
+        """
         if not callable(handler):
             raise ValueError("El manejador debe ser una función.")
-        self.message_handlers[queue_name] = handler
+        if queue_name not in self.message_handlers and queue_name not in self.routes:
+            self._setup_queue(queue_name)
+        if pattern is None:
+            self.message_handlers[queue_name] = handler
+            self.log.info("Manejador registrado para '%s'", queue_name)
+        else:
+            self.routes.setdefault(queue_name, TopicTrie()).add(pattern, handler)
+            self.log.info("Manejador registrado para '%s' con patrón '%s'", queue_name, pattern)
+
+    def _resolve_handler(self, queue_name: str, routing_key: str):
+        """
+        Manejador de una entrega: el del primer patrón registrado que encaje con la
+        clave de routing o, si ninguno encaja, el manejador por defecto de la cola.
+        """
+        routes = self.routes.get(queue_name)
+        if routes is not None:
+            matches = routes.match(routing_key)
+            if matches:
+                return matches[0]
+        return self.message_handlers.get(queue_name)
+
+    def register_batch_handler(self, queue_name: str, handler: BatchHandler,
+                               max_batch: int = 100, max_wait: float = 1.0):
+        """
+        Registra un manejador que recibe los mensajes de una cola por lotes.
+
+        El manejador recibe una lista de hasta max_batch mensajes (o los que hayan
+        llegado en max_wait segundos) y puede devolver los índices de los que
+        fallaron; esos se devuelven a la cola y el resto se confirma con un único
+        ack múltiple. Si lanza una excepción se devuelve el lote entero.
+        """
+        if not callable(handler):
+            raise ValueError("El manejador debe ser una función.")
+        if max_batch < 1:
+            raise ValueError("max_batch debe ser al menos 1.")
+        channel = self._batch_channel(max_batch)
+        self.batch_handlers[queue_name] = _BatchState(queue_name, handler, max_batch, max_wait, channel)
         self._setup_queue(queue_name)
-        print(f"[{self.consumer_id}] Manejador registrado para '{queue_name}'")
+        self.log.info("Manejador por lotes registrado para '%s' (máx. %d)", queue_name, max_batch)
+
+    def _batch_channel(self, max_batch):
+        # Canal propio: el ack múltiple solo debe cubrir entregas de esta cola
+        channel = self.connection.channel()
+        channel.basic_qos(prefetch_count=max(self.prefetch_count or 0, 2 * max_batch))
+        return channel
 
     def _setup_queue(self, queue_name: str):
-        """Declara una cola y la vincula al exchange."""
+        """Declara una cola (con sus colas de reintento) y la vincula al exchange."""
         self.channel.queue_declare(queue=queue_name, durable=True)
+        if self.retry_policy is not None:
+            self.retry_policy.declare(self.channel, queue_name)
         self.channel.queue_bind(
             queue=queue_name,
             exchange='amq.topic',
             routing_key=queue_name
         )
+        self._register_with_broker(queue_name)
+
+    def subscribe(self, queue_name: str, exchange_name: str, routing_key: str = ''):
+        """Vincula una cola a un exchange (topic) con una clave de routing."""
+        self._bind(queue_name, exchange_name, routing_key)
+        self.subscriptions.add((queue_name, exchange_name, routing_key))
+        self._register_with_broker(queue_name)
+        self.log.info("'%s' suscrita a '%s' con clave '%s'", queue_name, exchange_name, routing_key)
 
-    def _message_callback(self, ch, method, properties, body):
-        """Callback interno para procesar mensajes."""
-        queue_name = method.routing_key
+    def _bind(self, queue_name, exchange_name, routing_key):
+        topology.declare_exchange(self.channel, exchange_name, 'topic', scope=self.connection)
+        self.channel.queue_declare(queue=queue_name, durable=True)
+        self.channel.queue_bind(
+            queue=queue_name,
+            exchange=exchange_name,
+            routing_key=routing_key
+        )
+
+    def _register_with_broker(self, queue_name: str):
+        """Informa de la cola a la API del broker para sus estadísticas (si está configurada)."""
+        if not self.broker_api:
+            return
         try:
-            message = json.loads(body)
-            print(f"[{self.consumer_id}] Mensaje recibido en '{queue_name}': {message}")
-            
-            if queue_name in self.message_handlers:
-                self.message_handlers[queue_name](message)
+            requests.post(
+                f"{self.broker_api}/queues/watch",
+                json={"queueName": queue_name},
+                timeout=2
+            )
+        except Exception as e:
+            self.log.warning("No se pudo registrar '%s' en el broker: %s", queue_name, e)
+
+    def _message_callback(self, queue_name, ch, method, properties, body):
+        """Callback interno para procesar mensajes de una cola."""
+        routing_key = original_routing_key(properties, method.routing_key)
+        self.metrics.delivered(queue_name)
+        try:
+            message = decode(body, properties.content_type, properties.content_encoding)
+            self.log.debug("Mensaje %s recibido en '%s' (%s)", properties.message_id, queue_name, routing_key, extra=SAMPLED)
+            handler = self._resolve_handler(queue_name, routing_key)
+            delivery = (routing_key, properties, body)
+
+            if self._already_processed(properties):
                 ch.basic_ack(delivery_tag=method.delivery_tag)
-            else:
-                print(f"[{self.consumer_id}] No hay manejador para '{queue_name}'")
+                self.metrics.outcome(queue_name, 'duplicate')
+            elif handler is None:
+                self.log.warning("No hay manejador en '%s' para '%s'", queue_name, routing_key)
                 ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-        except json.JSONDecodeError:
-            print(f"[{self.consumer_id}] Mensaje no es JSON válido")
+                self.metrics.outcome(queue_name, 'reject')
+            elif self.pool is not None:
+                # El ack vuelve al hilo de I/O cuando termine el worker
+                self._pending += 1
+                future = self.pool.submit(routing_key, _timed_call, handler, message)
+                future.add_done_callback(partial(
+                    self._on_handler_done, ch, queue_name, method.delivery_tag, delivery,
+                    published_at(message, properties)
+                ))
+            else:
+                _, elapsed, error = _timed_call(handler, message)
+                self.metrics.handler_time(queue_name, elapsed)
+                if error is not None:
+                    raise error
+                self._mark_processed([properties.message_id])
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                self._record_ack(queue_name, published_at(message, properties))
+        except SerializationError as e:
+            self.log.warning("Mensaje no decodificable: %s", e)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self.metrics.outcome(queue_name, 'reject')
+        except Exception as e:
+            self.log.error("Error procesando mensaje: %s", e)
+            self._retry(ch, queue_name, method.delivery_tag, (routing_key, properties, body), e)
+
+    def _record_ack(self, queue_name, sent_at, count=1):
+        """Registra mensajes confirmados y su latencia desde que se publicaron."""
+        self.metrics.outcome(queue_name, 'ack', count)
+        if sent_at is not None:
+            self.metrics.latency(queue_name, time.time() - sent_at)
+
+    def _already_processed(self, properties):
+        """Consulta el registro de deduplicación; si falla, se procesa el mensaje."""
+        if self.dedup is None or not properties.message_id:
+            return False
+        try:
+            if self.dedup.seen(properties.message_id):
+                self.log.debug("Mensaje %s ya procesado, se descarta", properties.message_id, extra=SAMPLED)
+                return True
+        except Exception as e:
+            self.log.warning("Error consultando la deduplicación: %s", e)
+        return False
+
+    def _mark_processed(self, message_ids):
+        if self.dedup is None:
+            return
+        try:
+            self.dedup.mark_processed(message_ids)
+        except Exception as e:
+            self.log.warning("Error registrando mensajes procesados: %s", e)
+
+    def _republish(self, ch, queue_name, delivery, error):
+        """
+        Publica un mensaje fallido en su cola de espera (o en aparcados)
+
+        Returns:
+            True si se republicó; False si debe devolverse a la cola
+        """
+        if self.retry_policy is None:
+            return False
+        routing_key, properties, body = delivery
+        try:
+            target = self.retry_policy.republish(ch, queue_name, routing_key, properties, body, error)
+        except Exception as e:
+            self.log.error("No se pudo programar el reintento: %s", e)
+            return False
+        self.metrics.outcome(queue_name, 'parked' if target == parking_queue_name(queue_name) else 'retry')
+        self.log.info("Mensaje %s enviado a '%s'", properties.message_id, target, extra=SAMPLED)
+        return True
+
+    def _retry(self, ch, queue_name, delivery_tag, delivery, error):
+        """
+        Envía un mensaje fallido a su cola de espera (o a aparcados) y lo confirma.
+
+        Sin política de reintentos, o si no se puede republicar, vuelve a la cola.
+        """
+        if self._republish(ch, queue_name, delivery, error):
+            ch.basic_ack(delivery_tag=delivery_tag)
+        elif ch.is_open:
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+            self.metrics.outcome(queue_name, 'requeue')
+
+    def _on_handler_done(self, ch, queue_name, delivery_tag, delivery, sent_at, future):
+        """Se ejecuta en el worker: pika no es thread-safe, el ack se delega al hilo de I/O."""
+        _, elapsed, error = _timed_result(future)
+        if elapsed is not None:
+            self.metrics.handler_time(queue_name, elapsed)
+        if error is None:
+            # Antes del ack: si la confirmación se pierde, la reentrega se descarta
+            self._mark_processed([delivery[1].message_id])
+        try:
+            self.connection.add_callback_threadsafe(
+                partial(self._settle, ch, queue_name, delivery_tag, delivery, sent_at, error)
+            )
+        except Exception as e:
+            # Conexión cerrada: RabbitMQ reentregará el mensaje
+            self.log.warning("No se pudo confirmar el mensaje %s: %s", delivery_tag, e)
+
+    def _settle(self, ch, queue_name, delivery_tag, delivery, sent_at, error):
+        """Confirma (o reintenta más tarde) un mensaje procesado por el pool."""
+        if ch is not self.channel:
+            # Entregado antes de una reconexión: RabbitMQ ya lo ha vuelto a entregar
+            return
+        self._pending -= 1
+        if not ch.is_open:
+            return
+        if error is None:
+            ch.basic_ack(delivery_tag=delivery_tag)
+            self._record_ack(queue_name, sent_at)
+        else:
+            self.log.error("Error procesando mensaje: %s", error)
+            self._retry(ch, queue_name, delivery_tag, delivery, error)
+
+    def _batch_callback(self, state, ch, method, properties, body):
+        """Acumula una entrega en el lote de su cola."""
+        self.metrics.delivered(state.queue_name)
+        try:
+            message = decode(body, properties.content_type, properties.content_encoding)
+        except SerializationError as e:
+            self.log.warning("Mensaje no decodificable: %s", e)
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self.metrics.outcome(state.queue_name, 'reject')
+            return
+        if self._already_processed(properties):
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self.metrics.outcome(state.queue_name, 'duplicate')
+            return
+
+        if not state.buffer:
+            state.first_at = time.monotonic()
+        delivery = (original_routing_key(properties, method.routing_key), properties, body)
+        state.buffer.append((method.delivery_tag, message, delivery))
+        if len(state.buffer) >= state.max_batch or self.state == 'draining':
+            self._flush_batch(state)
+        elif state.timer is None and not state.in_flight:
+            state.timer = self.connection.call_later(state.max_wait, partial(self._batch_timeout, state))
+
+    def _batch_timeout(self, state):
+        state.timer = None
+        self._flush_batch(state)
+
+    def _flush_batch(self, state):
+        """Entrega el lote al manejador (un lote en curso por cola)."""
+        if state.in_flight or not state.buffer:
+            return
+        if state.timer is not None:
+            self.connection.remove_timeout(state.timer)
+            state.timer = None
+        batch, state.buffer = state.buffer[:state.max_batch], state.buffer[state.max_batch:]
+        state.first_at = time.monotonic() if state.buffer else None
+        state.in_flight = True
+        messages = [message for _, message, _ in batch]
+
+        if self.pool is not None:
+            future = self.pool.submit(state.queue_name, _timed_call, state.handler, messages)
+            future.add_done_callback(partial(self._on_batch_done, state, state.channel, batch))
+            return
+
+        self._finish_batch(state, state.channel, batch, *_timed_call(state.handler, messages))
+
+    def _on_batch_done(self, state, ch, batch, future):
+        """Se ejecuta en el worker: el ack del lote se delega al hilo de I/O."""
+        try:
+            self.connection.add_callback_threadsafe(
+                partial(self._finish_batch, state, ch, batch, *_timed_result(future))
+            )
         except Exception as e:
-            print(f"[{self.consumer_id}] Error procesando mensaje: {str(e)}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            self.log.warning("No se pudo confirmar el lote de '%s': %s", state.queue_name, e)
+
+    def _finish_batch(self, state, ch, batch, failed, elapsed, error):
+        if elapsed is not None:
+            self.metrics.handler_time(state.queue_name, elapsed)
+        if error is not None:
+            self.log.error("Error procesando lote de '%s': %s", state.queue_name, error)
+            failed = range(len(batch))
+        self._settle_batch(state, ch, batch, failed, error)
+
+    def _settle_batch(self, state, ch, batch, failed, error=None):
+        """Reintenta más tarde los fallidos y confirma el lote con un ack múltiple."""
+        if ch is not state.channel:
+            # Lote de un canal anterior a una reconexión: RabbitMQ ya lo ha vuelto a entregar
+            return
+        state.in_flight = False
+        if not ch.is_open:
+            return
+        failed = set(failed or ())
+        error = error or "El manejador por lotes marcó el mensaje como fallido"
+        self._mark_processed([delivery[1].message_id for index, (_, _, delivery) in enumerate(batch)
+                              if index not in failed])
+        requeued = set()
+        for index in sorted(failed):
+            tag, _, delivery = batch[index]
+            if not self._republish(ch, state.queue_name, delivery, error):
+                ch.basic_nack(delivery_tag=tag, requeue=True)
+                requeued.add(index)
+        if requeued:
+            self.metrics.outcome(state.queue_name, 'requeue', len(requeued))
+        # Los fallidos ya republicados se confirman junto con el resto
+        acked = [tag for index, (tag, _, _) in enumerate(batch) if index not in requeued]
+        if acked and ch.is_open:
+            # Los tags menores ya están confirmados o devueltos: un solo ack los cubre
+            ch.basic_ack(delivery_tag=max(acked), multiple=True)
+            for index, (_, message, (_, properties, _)) in enumerate(batch):
+                if index not in failed:
+                    self._record_ack(state.queue_name, published_at(message, properties))
+        if failed:
+            destination = "enviados a reintento" if self.retry_policy is not None else "devueltos a la cola"
+            self.log.info("%d de %d mensajes de '%s' %s", len(failed), len(batch), state.queue_name, destination)
+
+        # Siguiente lote: ya lleno o con la espera agotada, al momento; si no, con temporizador
+        if state.buffer:
+            remaining = state.max_wait - (time.monotonic() - state.first_at)
+            if len(state.buffer) >= state.max_batch or remaining <= 0 or self.state == 'draining':
+                self._flush_batch(state)
+            elif state.timer is None:
+                state.timer = self.connection.call_later(remaining, partial(self._batch_timeout, state))
+
+
+    def _start_consuming(self):
+        """Suscribe los callbacks a todas las colas registradas."""
+        self._consumer_tags = []
+        for queue_name in dict.fromkeys([*self.message_handlers, *self.routes]):
+            tag = self.channel.basic_consume(
+                queue=queue_name,
+                on_message_callback=partial(self._message_callback, queue_name),
+                auto_ack=False
+            )
+            self._consumer_tags.append((self.channel, tag))
+        for queue_name, state in self.batch_handlers.items():
+            tag = state.channel.basic_consume(
+                queue=queue_name,
+                on_message_callback=partial(self._batch_callback, state),
+                auto_ack=False
+            )
+            self._consumer_tags.append((state.channel, tag))
+
+    def _restore(self):
+        """Tras reconectar: vuelve a declarar colas y suscripciones y abre los canales de lotes."""
+        for queue_name in dict.fromkeys([*self.message_handlers, *self.routes, *self.batch_handlers]):
+            self._setup_queue(queue_name)
+        for queue_name, exchange_name, routing_key in self.subscriptions:
+            self._bind(queue_name, exchange_name, routing_key)
+        # Lo acumulado o en curso en los canales anteriores se reentregará
+        self._pending = 0
+        for state in self.batch_handlers.values():
+            state.channel = self._batch_channel(state.max_batch)
+            state.buffer = []
+            state.first_at = None
+            state.timer = None
+            state.in_flight = False
+
+    def _close_connection(self):
+        if self.connection is not None and self.connection.is_open:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+
+    def _reconnect(self):
+        """
+        Reconecta con backoff exponencial y jitter y restablece el consumo
+
+        Returns:
+            True si se reconectó, False si el consumidor se detiene o se agotaron los intentos
+        """
+        self.state = 'reconnecting'
+        self.reconnect_attempts = 0
+        while not self._stop_event.is_set():
+            self._close_connection()
+            try:
+                self.connect()
+                self._restore()
+                self._start_consuming()
+                self.state = 'consuming'
+                self.reconnections += 1
+                self.reconnect_attempts = 0
+                self.log.info("Consumo restablecido en %d colas", len(self._consumer_tags))
+                return True
+            except Exception as e:
+                self.state = 'reconnecting'
+                self.last_error = str(e)
+                self.log.error("Error al restablecer el consumo: %s", e)
+
+            if self.max_reconnect_attempts is not None and self.reconnect_attempts >= self.max_reconnect_attempts:
+                self.state = 'failed'
+                self.log.error("Reconexión abandonada tras %d intentos", self.reconnect_attempts)
+                return False
+            # Full jitter: espera aleatoria entre 0 y el límite exponencial
+            delay = random.uniform(0, min(
+                self.reconnect_max_delay,
+                self.reconnect_base_delay * (2 ** self.reconnect_attempts)
+            ))
+            self.reconnect_attempts += 1
+            self.log.warning("Reintento de conexión #%d en %.1fs", self.reconnect_attempts, delay)
+            self._stop_event.wait(delay)
+        return False
+
+    def _busy(self):
+        """Indica si quedan mensajes entregados sin confirmar (manejadores o lotes en curso)."""
+        return self._pending > 0 or any(state.buffer or state.in_flight for state in self.batch_handlers.values())
+
+    def _drain(self):
+        """
+        Deja de recibir mensajes y espera a que terminen los que están en curso
+
+        Se ejecuta en el hilo de I/O, que sigue atendiendo los acks de los workers
+        hasta que no quede nada pendiente o se agote drain_timeout.
+        """
+        if not self.is_connected():
+            return
+        self.state = 'draining'
+        try:
+            for ch, tag in self._consumer_tags:
+                ch.basic_cancel(tag)
+            self._consumer_tags = []
+            for state in self.batch_handlers.values():
+                self._flush_batch(state)
+            deadline = time.monotonic() + self.drain_timeout
+            while self._busy() and self.connection.is_open and time.monotonic() < deadline:
+                self.connection.process_data_events(time_limit=0.1)
+        except Exception as e:
+            self.log.warning("Error esperando los mensajes en curso: %s", e)
+        if self._busy():
+            self.log.warning("Quedan mensajes sin terminar tras %.1fs; RabbitMQ los reentregará", self.drain_timeout)
+
+    def _run(self):
+        """Hilo de I/O: entrega mensajes, reconecta si se pierde la conexión y drena al detenerse."""
+        while not self._stop_event.is_set():
+            if not self.is_connected():
+                self.log.warning("Conexión perdida. Intentando reconectar...")
+                if not self._reconnect():
+                    break
+                continue
+            try:
+                self.connection.process_data_events(time_limit=1)
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    self.last_error = str(e)
+                    self.log.error("Error en el bucle de consumo: %s", e)
+        self._drain()
+        # pika no es thread-safe: la conexión se cierra desde su propio hilo
+        self._close_connection()
+        if self.state != 'failed':
+            self.state = 'stopped'
 
     def start(self):
         """Inicia el consumo de mensajes."""
         if not self.running:
             self.running = True
-            for queue_name in self.message_handlers:
-                self.channel.basic_consume(
-                    queue=queue_name,
-                    on_message_callback=self._message_callback,
-                    auto_ack=False
-                )
-            print(f"[{self.consumer_id}] Escuchando mensajes...")
-            threading.Thread(target=self.channel.start_consuming, daemon=True).start()
+            self._stop_event.clear()
+            self._start_consuming()
+            self.state = 'consuming'
+            self.log.info("Escuchando mensajes...")
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
 
     def stop(self):
-        """Detiene el consumidor."""
+        """
+        Detiene el consumidor de forma ordenada.
+
+        Cancela las suscripciones, espera (como mucho drain_timeout segundos) a que
+        terminen los manejadores en curso y confirma sus mensajes antes de cerrar
+        la conexión. Lo que quede sin ack vuelve a la cola.
+        """
         if self.running:
             self.running = False
-            self.channel.stop_consuming()
-            if self.connection and self.connection.is_open:
-                self.connection.close()
-            print(f"[{self.consumer_id}] Detenido")
\ No newline at end of file
+            self._stop_event.set()
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join(self.drain_timeout + 5)
+            if self.pool is not None:
+                self.pool.shutdown(wait=False)
+            if self.dedup is not None:
+                self.log.info("Deduplicación: %s", self.dedup.stats())
+            self.log.info("Detenido")
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+import argparse
+import importlib
+import math
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from collections import deque
+
+from consumer import DEFAULT_PREFETCH, EventConsumer
+from common.log import get_logger
+from common.queue_stats import QueueStatsCollector
+from common.transport import get_transport
+
+# Cada cuánto un worker informa al supervisor de su latencia (segundos)
+METRICS_INTERVAL = 1.0
+
+# Reinicios de un mismo grupo tolerados por minuto antes de espaciarlos
+MAX_RESTARTS_PER_MINUTE = 5
+
+# Reconexiones fallidas seguidas tras las que un worker sale para que se le reinicie
+WORKER_RECONNECT_ATTEMPTS = 10
+
+logger = get_logger('consumer_supervisor')
+
+
+def load_handler(path):
+    """Importa un manejador indicado como 'paquete.modulo:funcion'"""
+    module_name, _, attr = path.partition(':')
+    if not module_name or not attr:
+        raise ValueError(f"Manejador no válido: {path} (formato modulo:funcion)")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def run_worker(queue_name, handler_path, options, metrics, stop_event):
+    """
+    Proceso worker: un EventConsumer para una cola
+
+    Mide el tiempo de cada llamada al manejador y lo envía agregado al supervisor.
+    Sale con código 1 si pierde la conexión, para que el supervisor lo reinicie.
+    """
+    # Ctrl+C lo gestiona el supervisor, que detiene los workers de forma ordenada
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    handler = load_handler(handler_path)
+    window = {'count': 0, 'seconds': 0.0, 'since': time.monotonic()}
+    # Con threads > 0 el manejador corre en varios hilos que comparten la ventana
+    window_lock = threading.Lock()
+
+    def timed(payload):
+        started = time.perf_counter()
+        try:
+            return handler(payload)
+        finally:
+            elapsed = time.perf_counter() - started
+            report = None
+            with window_lock:
+                window['count'] += len(payload) if options['batch'] else 1
+                window['seconds'] += elapsed
+                if time.monotonic() - window['since'] >= METRICS_INTERVAL:
+                    report = (queue_name, window['count'], window['seconds'])
+                    window.update(count=0, seconds=0.0, since=time.monotonic())
+            if report is not None:
+                try:
+                    metrics.put_nowait(report)
+                except queue.Full:
+                    pass
+
+    consumer = EventConsumer(
+        rabbitmq_host=options['host'],
+        rabbitmq_port=options['port'],
+        broker_api=options['broker_api'],
+        prefetch_count=options['prefetch'],
+        workers=options['threads'],
+        max_reconnect_attempts=WORKER_RECONNECT_ATTEMPTS
+    )
+    if options['batch']:
+        consumer.register_batch_handler(queue_name, timed, max_batch=options['max_batch'],
+                                        max_wait=options['max_wait'])
+    else:
+        consumer.register_handler(queue_name, timed)
+    consumer.start()
+
+    exit_code = 0
+    while not stop_event.wait(1.0):
+        # El consumidor reconecta solo; si se rinde, el supervisor reinicia el worker
+        if consumer.state == 'failed':
+            consumer.log.warning("Sin conexión con RabbitMQ, saliendo para que el supervisor reinicie")
+            exit_code = 1
+            break
+    consumer.stop()
+    raise SystemExit(exit_code)
+
+
+class _WorkerGroup:
+    """Workers de una cola y sus métricas."""
+
+    def __init__(self, queue_name, handler_path):
+        self.queue_name = queue_name
+        self.handler_path = handler_path
+        self.workers = []  # (proceso, evento de parada)
+        self.stopping = []
+        self.latency = None  # segundos por mensaje (media móvil)
+        self.last_scaled_at = 0.0
+        self.idle_since = None
+        self.restarts = deque()
+
+
+class ConsumerSupervisor:
+    """
+    Supervisor de procesos EventConsumer por cola.
+
+    Cada proceso usa como mucho un núcleo (GIL + hilo de I/O de pika), así que la
+    capacidad se escala añadiendo procesos. El supervisor reinicia los que caen y
+    ajusta cuántos hay por cola entre min_workers y max_workers: estima el tiempo
+    en vaciar la cola (profundidad x latencia del manejador / workers) y añade
+    workers si supera target_drain, o quita uno si la cola sigue vacía.
+    """
+
+    def __init__(self, handlers, min_workers=1, max_workers=4, host='localhost', port=5672,
+                 broker_api=None, prefetch=DEFAULT_PREFETCH, threads=0, batch=False, max_batch=100,
+                 max_wait=1.0, interval=5.0, target_drain=30.0, scale_down_depth=0, cooldown=15.0,
+                 management_url=None):
+        """
+        Args:
+            handlers: Diccionario cola -> 'modulo:funcion'
+            min_workers: Procesos mínimos por cola
+            max_workers: Procesos máximos por cola
+            host: Host de RabbitMQ
+            port: Puerto de RabbitMQ
+            broker_api: URL de la API del broker (registro de colas)
+            prefetch: prefetch_count de cada worker
+            threads: Hilos de manejadores por proceso (0 = en el hilo de I/O)
+            batch: Registrar los manejadores como manejadores por lotes
+            max_batch: Tamaño máximo de lote
+            max_wait: Espera máxima para completar un lote
+            interval: Segundos entre revisiones
+            target_drain: Segundos objetivo para vaciar el backlog
+            scale_down_depth: Profundidad a partir de la cual se considera la cola ociosa
+            cooldown: Segundos mínimos entre dos cambios de escala de una cola
+            management_url: API de management de RabbitMQ para las tasas (opcional)
+        """
+        if min_workers < 0 or max_workers < max(min_workers, 1):
+            raise ValueError("Se requiere 0 <= min_workers <= max_workers y max_workers >= 1")
+        self.groups = {name: _WorkerGroup(name, path) for name, path in handlers.items()}
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+        self.target_drain = target_drain
+        self.scale_down_depth = scale_down_depth
+        self.cooldown = cooldown
+        self.options = {
+            'host': host,
+            'port': port,
+            'broker_api': broker_api,
+            'prefetch': prefetch,
+            'threads': threads,
+            'batch': batch,
+            'max_batch': max_batch,
+            'max_wait': max_wait,
+        }
+        self.context = multiprocessing.get_context('spawn')
+        self.metrics = self.context.Queue(maxsize=10000)
+        transport = get_transport('rabbitmq')
+        self.stats = QueueStatsCollector(
+            lambda: transport.connect(host, port),
+            ttl=interval,
+            management_url=management_url
+        )
+        self.stats.watch(*self.groups)
+        self.running = False
+
+    # Procesos
+
+    def _spawn(self, group):
+        stop_event = self.context.Event()
+        process = self.context.Process(
+            target=run_worker,
+            args=(group.queue_name, group.handler_path, self.options, self.metrics, stop_event),
+            name=f"consumer-{group.queue_name}",
+            daemon=True
+        )
+        process.start()
+        group.workers.append((process, stop_event))
+        logger.info("Worker %s iniciado para '%s' (%d en total)", process.pid, group.queue_name, len(group.workers))
+
+    def _retire(self, group):
+        """Detiene de forma ordenada el worker más reciente de un grupo"""
+        process, stop_event = group.workers.pop()
+        stop_event.set()
+        group.stopping.append(process)
+        logger.info("Worker %s de '%s' deteniéndose (%d restantes)", process.pid, group.queue_name, len(group.workers))
+
+    def _reap(self, group):
+        """Reinicia los workers caídos y olvida los ya detenidos"""
+        group.stopping = [process for process in group.stopping if process.is_alive()]
+        now = time.monotonic()
+        while group.restarts and now - group.restarts[0] > 60:
+            group.restarts.popleft()
+
+        for process, stop_event in list(group.workers):
+            if process.is_alive():
+                continue
+            group.workers.remove((process, stop_event))
+            logger.warning("Worker %s de '%s' terminó con código %s", process.pid, group.queue_name, process.exitcode)
+            if len(group.restarts) >= MAX_RESTARTS_PER_MINUTE:
+                # Fallo en bucle: se deja para la próxima revisión
+                logger.error("Demasiados reinicios en '%s'; se reintentará más tarde", group.queue_name)
+                continue
+            group.restarts.append(now)
+            self._spawn(group)
+
+        while len(group.workers) < self.min_workers and len(group.restarts) < MAX_RESTARTS_PER_MINUTE:
+            group.restarts.append(now)
+            self._spawn(group)
+
+    # Métricas y escalado
+
+    def _collect_metrics(self):
+        """Actualiza la latencia media por mensaje de cada cola con lo que informan los workers"""
+        totals = {}
+        while True:
+            try:
+                queue_name, count, seconds = self.metrics.get_nowait()
+            except queue.Empty:
+                break
+            total = totals.setdefault(queue_name, [0, 0.0])
+            total[0] += count
+            total[1] += seconds
+        for queue_name, (count, seconds) in totals.items():
+            group = self.groups.get(queue_name)
+            if group is None or not count:
+                continue
+            latency = seconds / count
+            group.latency = latency if group.latency is None else 0.7 * group.latency + 0.3 * latency
+
+    def desired_workers(self, group, depth, depth_rate):
+        """Número de workers deseado para una cola según su backlog y latencia"""
+        current = len(group.workers)
+        if depth is None:
+            return current
+        if depth > self.scale_down_depth:
+            group.idle_since = None
+            if group.latency is None:
+                # Sin latencia medida todavía: crecer de uno en uno mientras haya backlog
+                return min(self.max_workers, current + 1) if depth_rate is None or depth_rate >= 0 else current
+            needed = math.ceil(depth * group.latency / self.target_drain)
+            return max(self.min_workers, min(self.max_workers, max(current, needed)))
+
+        if group.idle_since is None:
+            group.idle_since = time.monotonic()
+        if time.monotonic() - group.idle_since >= self.cooldown:
+            return max(self.min_workers, current - 1)
+        return current
+
+    def _scale(self, group, depth, depth_rate):
+        target = self.desired_workers(group, depth, depth_rate)
+        current = len(group.workers)
+        if target == current or time.monotonic() - group.last_scaled_at < self.cooldown:
+            return
+        latency = f"{group.latency * 1000:.1f}ms" if group.latency is not None else "?"
+        logger.info("Escalando '%s': %d -> %d workers (profundidad %s, latencia %s)",
+                    group.queue_name, current, target, depth, latency)
+        while len(group.workers) < target:
+            self._spawn(group)
+        while len(group.workers) > target:
+            self._retire(group)
+        group.last_scaled_at = time.monotonic()
+        if target < current:
+            group.idle_since = None
+
+    def check(self):
+        """Una revisión: reinicios, métricas y escalado"""
+        for group in self.groups.values():
+            self._reap(group)
+        self._collect_metrics()
+        self.stats.refresh()
+        queues = {item['name']: item for item in self.stats.snapshot()['queues']}
+        for group in self.groups.values():
+            queue_stats = queues.get(group.queue_name, {})
+            self._scale(group, queue_stats.get('messages'), queue_stats.get('depthRate'))
+
+    def status(self):
+        return {
+            name: {
+                "workers": [process.pid for process, _ in group.workers],
+                "latencyMs": round(group.latency * 1000, 3) if group.latency is not None else None,
+                "restartsLastMinute": len(group.restarts),
+            }
+            for name, group in self.groups.items()
+        }
+
+    # Ciclo de vida
+
+    def run(self):
+        """Arranca los workers y supervisa hasta stop() o Ctrl+C"""
+        self.running = True
+        signal.signal(signal.SIGTERM, lambda *args: self.stop())
+        for group in self.groups.values():
+            for _ in range(self.min_workers or 1):
+                self._spawn(group)
+        try:
+            while self.running:
+                time.sleep(self.interval)
+                if self.running:
+                    self.check()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self.running = False
+
+    def shutdown(self, timeout=30.0):
+        """Detiene todos los workers, esperando a que terminen los mensajes en curso"""
+        self.running = False
+        processes = []
+        for group in self.groups.values():
+            for process, stop_event in group.workers:
+                stop_event.set()
+                processes.append(process)
+            processes.extend(group.stopping)
+            group.workers, group.stopping = [], []
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self.stats.stop()
+        logger.info("Supervisor detenido")
+
+
+def handler_spec(value):
+    queue_name, sep, path = value.partition('=')
+    if not sep or not queue_name or ':' not in path:
+        raise argparse.ArgumentTypeError("Formato: cola=paquete.modulo:funcion")
+    return queue_name, path
+
+
+def main():
+    """Función principal para uso como script"""
+    parser = argparse.ArgumentParser(description='Supervisor de procesos consumidores con autoescalado')
+    parser.add_argument('--queue', dest='queues', type=handler_spec, action='append', required=True,
+                        help='Cola y manejador: cola=paquete.modulo:funcion (repetible)')
+    parser.add_argument('--host', default='localhost', help='Host de RabbitMQ')
+    parser.add_argument('--port', type=int, default=5672, help='Puerto de RabbitMQ')
+    parser.add_argument('--api', default=None, help='URL de la API del broker')
+    parser.add_argument('--management-url', default=None, help='API de management de RabbitMQ')
+    parser.add_argument('--min-workers', type=int, default=1, help='Procesos mínimos por cola')
+    parser.add_argument('--max-workers', type=int, default=multiprocessing.cpu_count(),
+                        help='Procesos máximos por cola')
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH, help='prefetch_count por worker')
+    parser.add_argument('--threads', type=int, default=0, help='Hilos de manejadores por proceso')
+    parser.add_argument('--batch', action='store_true', help='Los manejadores reciben lotes de mensajes')
+    parser.add_argument('--max-batch', type=int, default=100, help='Tamaño máximo de lote')
+    parser.add_argument('--max-wait', type=float, default=1.0, help='Espera máxima para completar un lote')
+    parser.add_argument('--interval', type=float, default=5.0, help='Segundos entre revisiones')
+    parser.add_argument('--target-drain', type=float, default=30.0, help='Segundos objetivo para vaciar el backlog')
+    parser.add_argument('--cooldown', type=float, default=15.0, help='Segundos mínimos entre cambios de escala')
+
+    args = parser.parse_args()
+
+    supervisor = ConsumerSupervisor(
+        dict(args.queues),
+        min_workers=args.min_workers,
+        max_workers=args.max_workers,
+        host=args.host,
+        port=args.port,
+        broker_api=args.api,
+        prefetch=args.prefetch,
+        threads=args.threads,
+        batch=args.batch,
+        max_batch=args.max_batch,
+        max_wait=args.max_wait,
+        interval=args.interval,
+        target_drain=args.target_drain,
+        cooldown=args.cooldown,
+        management_url=args.management_url
+    )
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,37 @@
 #!/usr/bin/env python
 import pika
-import json
 import uuid
 import threading
 import time
+import random
 from flask import Flask, request, jsonify
+from common.channel_pool import ChannelPool
+from common.log import SAMPLED, get_logger
+from common.queue_stats import QueueStatsCollector
+from common.transport import get_transport
+from common.serialization import SerializationError, decode, get_codec
+from common.retry import (LAST_ERROR_HEADER, ORIGINAL_ROUTING_KEY_HEADER, PARKED_AT_HEADER,
+                          RETRY_COUNT_HEADER, copy_properties, parking_queue_name)
+
+# Máximo de mensajes aceptados en una sola petición de lote
+MAX_BATCH_SIZE = 1000
+
+# Intervalo (segundos) con el que el supervisor atiende I/O y heartbeats
+IO_INTERVAL = 0.5
+
+# Mensajes aparcados devueltos como máximo por una inspección
+MAX_PARKED_INSPECT = 500
+
+# Espera máxima (segundos) de las confirmaciones de un lote
+BATCH_CONFIRM_TIMEOUT = 30.0
+
+logger = get_logger('event_broker')
 
 class EventBroker:
-    def __init__(self, host='localhost', port=5672, management_port=5000):
+    def __init__(self, host='localhost', port=5672, management_port=5000,
+                 heartbeat=60, reconnect_base_delay=1.0, reconnect_max_delay=30.0,
+                 pool_size=8, stats_ttl=5.0, management_url=None, transport=None,
+                 serializer='json', compression=None, compress_threshold=1024):
         """
         Inicializa el Event Broker usando RabbitMQ
         
@@ -15,13 +39,47 @@ class EventBroker:
             host: Host donde se ejecuta RabbitMQ
             port: Puerto de RabbitMQ
             management_port: Puerto para la API REST de gestión
+            heartbeat: Intervalo de heartbeat negociado con RabbitMQ (segundos)
+            reconnect_base_delay: Espera inicial antes de reintentar la conexión
+            reconnect_max_delay: Espera máxima entre reintentos de conexión
+            pool_size: Número de conexiones del pool usado para publicar en paralelo
+            stats_ttl: Segundos de validez de la caché de estadísticas de colas
+            management_url: URL de la API de management de RabbitMQ (tasas y descubrimiento de colas)
+            transport: Transporte AMQP ('rabbitmq' por defecto, 'memory' para pruebas sin RabbitMQ)
+            serializer: Serializador por defecto de los mensajes ('json', 'orjson', 'msgpack')
+            compression: Compresión por defecto ('gzip', 'deflate') o None
+            compress_threshold: Tamaño mínimo en bytes para comprimir
         """
         self.host = host
         self.port = port
+        self.transport = get_transport(transport)
+        self.codec = get_codec(serializer, compression, compress_threshold)
+        self.heartbeat = heartbeat
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
         self.connection = None
         self.channel = None
-        self.exchanges = set()
+        self.exchanges = {}  # Mapeo de nombre de exchange -> info
         self.queues = {}  # Mapeo de nombre de cola -> info
+        self.bindings = set()  # Tuplas (cola, exchange, clave de routing)
+        
+        # Estado de la conexión expuesto por la API de gestión
+        self.state = 'disconnected'
+        self.last_error = None
+        self.connected_at = None
+        self.reconnect_attempts = 0
+        self.reconnections = 0
+        
+        # La conexión de pika no es thread-safe: el supervisor y la API la comparten
+        # para declarar topología; las publicaciones usan el pool de canales
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self.pool = ChannelPool(self._new_connection, size=pool_size)
+        self.stats = QueueStatsCollector(
+            self._new_connection,
+            ttl=stats_ttl,
+            management_url=management_url
+        )
         
         # API REST para gestión
         self.app = Flask(__name__)
@@ -33,16 +91,104 @@ class EventBroker:
     
     def connect(self):
         """Establece conexión con RabbitMQ"""
-        try:
-            self.connection = pika.BlockingConnection(
-                pika.ConnectionParameters(host=self.host, port=self.port)
+        with self._lock:
+            self.state = 'connecting'
+            try:
+                self.connection = self._new_connection()
+                self.channel = self.connection.channel()
+                self.state = 'connected'
+                self.connected_at = time.time()
+                self.last_error = None
+                logger.info("Conectado a RabbitMQ en %s:%s", self.host, self.port)
+                return True
+            except Exception as e:
+                self.state = 'disconnected'
+                self.last_error = str(e)
+                logger.error("Error al conectar a RabbitMQ: %s", e)
+                return False
+    
+    def _new_connection(self):
+        """Crea una conexión nueva con RabbitMQ (usada también por el pool)"""
+        return self.transport.connect(self.host, self.port, heartbeat=self.heartbeat)
+    
+    def is_connected(self):
+        """Indica si la conexión y el canal principal están abiertos"""
+        return bool(
+            self.connection and self.connection.is_open
+            and self.channel and self.channel.is_open
+        )
+    
+    def redeclare_topology(self):
+        """Vuelve a declarar exchanges, colas y bindings registrados tras una reconexión"""
+        with self._lock:
+            for exchange_name, info in list(self.exchanges.items()):
+                self.channel.exchange_declare(
+                    exchange=exchange_name,
+                    exchange_type=info['type'],
+                    durable=info['durable']
+                )
+            for queue_name, info in list(self.queues.items()):
+                self.channel.queue_declare(queue=queue_name, durable=info['durable'])
+            for queue_name, exchange_name, routing_key in list(self.bindings):
+                self.channel.queue_bind(
+                    queue=queue_name,
+                    exchange=exchange_name,
+                    routing_key=routing_key
+                )
+        logger.info("Topología restaurada: %d exchanges, %d colas, %d bindings",
+                    len(self.exchanges), len(self.queues), len(self.bindings))
+    
+    def reconnect(self):
+        """
+        Reconecta con backoff exponencial y jitter hasta lograrlo o hasta que se detenga el broker
+        
+        Returns:
+            True si se reconectó, False si el broker se está deteniendo
+        """
+        self.reconnect_attempts = 0
+        while not self._stop_event.is_set():
+            with self._lock:
+                if self.connection and self.connection.is_open:
+                    try:
+                        self.connection.close()
+                    except Exception:
+                        pass
+                # Las conexiones del pool pueden estar igual de rotas
+                self.pool.reset()
+                if self.connect():
+                    try:
+                        self.redeclare_topology()
+                        self.reconnections += 1
+                        self.reconnect_attempts = 0
+                        return True
+                    except Exception as e:
+                        self.state = 'disconnected'
+                        self.last_error = str(e)
+                        logger.error("Error al restaurar la topología: %s", e)
+            
+            # Full jitter: espera aleatoria entre 0 y el límite exponencial
+            delay = min(
+                self.reconnect_max_delay,
+                self.reconnect_base_delay * (2 ** self.reconnect_attempts)
             )
-            self.channel = self.connection.channel()
-            print(f"Conectado a RabbitMQ en {self.host}:{self.port}")
-            return True
-        except Exception as e:
-            print(f"Error al conectar a RabbitMQ: {str(e)}")
-            return False
+            delay = random.uniform(0, delay)
+            self.reconnect_attempts += 1
+            logger.warning("Reintento de conexión #%d en %.1fs", self.reconnect_attempts, delay)
+            self._stop_event.wait(delay)
+        return False
+    
+    def connection_status(self):
+        """Devuelve el estado de la conexión para la API de gestión"""
+        return {
+            "state": self.state,
+            "host": self.host,
+            "port": self.port,
+            "connectedAt": self.connected_at,
+            "reconnectAttempts": self.reconnect_attempts,
+            "reconnections": self.reconnections,
+            "lastError": self.last_error,
+            "pool": self.pool.stats(),
+        }
     
     def setup_routes(self):
         """Configura las rutas de la API REST para gestión del broker"""
@@ -111,7 +257,12 @@ class EventBroker:
                 return jsonify({"error": "Mensaje requerido"}), 400
             
             try:
-                message_id = self.publish_message(exchange_name, routing_key, message)
+                codec = self.request_codec(data)
+            except SerializationError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            try:
+                message_id = self.publish_message(exchange_name, routing_key, message, codec=codec)
                 return jsonify({
                     "messageId": message_id,
                     "message": "Mensaje publicado correctamente"
@@ -119,6 +270,35 @@ class EventBroker:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
         
+        @self.app.route('/messages/batch', methods=['POST'])
+        def publish_message_batch():
+            """Publicar un lote de mensajes con confirmación del broker"""
+            data = request.json
+            entries = data.get('messages') if isinstance(data, dict) else data
+            
+            if not isinstance(entries, list) or not entries:
+                return jsonify({"error": "Lista de mensajes requerida"}), 400
+            
+            if len(entries) > MAX_BATCH_SIZE:
+                return jsonify({"error": f"El lote excede el máximo de {MAX_BATCH_SIZE} mensajes"}), 400
+            
+            try:
+                # Codec común del lote; cada entrada puede sobrescribirlo
+                codec = self.request_codec(data) if isinstance(data, dict) else self.codec
+            except SerializationError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            try:
+                results = self.publish_batch(entries, codec=codec)
+                acked = sum(1 for r in results if r['status'] == 'ack')
+                return jsonify({
+                    "results": results,
+                    "acked": acked,
+                    "failed": len(results) - acked
+                }), 201 if acked == len(results) else 207
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        
         @self.app.route('/queues', methods=['GET'])
         def list_queues():
             """Listar todas las colas"""
@@ -127,6 +307,52 @@ class EventBroker:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
         
+        @self.app.route('/queues/stats', methods=['GET'])
+        def queue_stats():
+            """Profundidad, consumidores y tasas de las colas conocidas (en caché)"""
+            try:
+                return jsonify(self.stats.snapshot()), 200
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        
+        @self.app.route('/queues/watch', methods=['POST'])
+        def watch_queue():
+            """Registrar una cola declarada fuera del broker para sus estadísticas"""
+            data = request.json
+            queue_name = data.get('queueName')
+            
+            if not queue_name:
+                return jsonify({"error": "Nombre de cola requerido"}), 400
+            
+            self.stats.watch(queue_name)
+            return jsonify({"message": f'Cola "{queue_name}" registrada para estadísticas'}), 201
+        
+        @self.app.route('/queues/<queue_name>/parked', methods=['GET'])
+        def list_parked(queue_name):
+            """Mensajes aparcados de una cola tras agotar sus reintentos (sin retirarlos)"""
+            try:
+                limit = min(int(request.args.get('limit', 50)), MAX_PARKED_INSPECT)
+                parked = self.inspect_parked(queue_name, limit)
+                return jsonify({"queue": parking_queue_name(queue_name), "messages": parked}), 200
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except pika.exceptions.ChannelClosedByBroker as e:
+                return jsonify({"error": str(e)}), 404
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        
+        @self.app.route('/queues/<queue_name>/parked/replay', methods=['POST'])
+        def replay_parked(queue_name):
+            """Devolver a su cola los mensajes aparcados (todos, los N primeros o los indicados)"""
+            data = request.get_json(silent=True) or {}
+            try:
+                replayed = self.replay_parked(queue_name, data.get('limit'), data.get('messageIds'))
+                return jsonify({"replayed": len(replayed), "messageIds": replayed}), 200
+            except pika.exceptions.ChannelClosedByBroker as e:
+                return jsonify({"error": str(e)}), 404
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        
         @self.app.route('/exchanges', methods=['GET'])
         def list_exchanges():
             """Listar todos los exchanges"""
@@ -134,6 +360,23 @@ class EventBroker:
                 return jsonify({"exchanges": list(self.exchanges)}), 200
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
+        
+        @self.app.route('/status', methods=['GET'])
+        def get_status():
+            """Estado de la conexión con RabbitMQ"""
+            status = self.connection_status()
+            return jsonify(status), 200 if status["state"] == 'connected' else 503
+    
+    def request_codec(self, data, default=None):
+        """Codec pedido por el cliente ('serializer'/'compression') o el codec por defecto"""
+        base = default or self.codec
+        if 'serializer' not in data and 'compression' not in data:
+            return base
+        return get_codec(
+            data.get('serializer', base.serializer.name),
+            data.get('compression', base.compression),
+            base.compress_threshold
+        )
     
     def declare_queue(self, queue_name, durable=True):
         """
@@ -147,16 +390,18 @@ class EventBroker:
             True si se creó correctamente
         """
         try:
-            self.channel.queue_declare(queue=queue_name, durable=durable)
+            with self._lock:
+                self.channel.queue_declare(queue=queue_name, durable=durable)
             self.queues[queue_name] = {
                 'name': queue_name,
                 'durable': durable,
                 'created_at': time.time()
             }
-            print(f'Cola "{queue_name}" declarada')
+            self.stats.watch(queue_name)
+            logger.info('Cola "%s" declarada', queue_name)
             return True
         except Exception as e:
-            print(f'Error al declarar cola "{queue_name}": {str(e)}')
+            logger.error('Error al declarar cola "%s": %s', queue_name, e)
             raise
     
     def declare_exchange(self, exchange_name, exchange_type='topic', durable=True):
@@ -171,17 +416,28 @@ class EventBroker:
         Returns:
             True si se creó correctamente
         """
+        # Ya declarado con los mismos parámetros: el supervisor lo redeclara tras reconectar
+        info = self.exchanges.get(exchange_name)
+        if info and info['type'] == exchange_type and info['durable'] == durable:
+            return True
+        
         try:
-            self.channel.exchange_declare(
-                exchange=exchange_name,
-                exchange_type=exchange_type,
-                durable=durable
-            )
-            self.exchanges.add(exchange_name)
-            print(f'Exchange "{exchange_name}" declarado')
+            with self._lock:
+                self.channel.exchange_declare(
+                    exchange=exchange_name,
+                    exchange_type=exchange_type,
+                    durable=durable
+                )
+            self.exchanges[exchange_name] = {
+                'name': exchange_name,
+                'type': exchange_type,
+                'durable': durable,
+                'created_at': time.time()
+            }
+            logger.info('Exchange "%s" declarado', exchange_name)
             return True
         except Exception as e:
-            print(f'Error al declarar exchange "{exchange_name}": {str(e)}')
+            logger.error('Error al declarar exchange "%s": %s', exchange_name, e)
             raise
     
     def bind_queue(self, queue_name, exchange_name, routing_key=''):
@@ -197,63 +453,291 @@ class EventBroker:
             True si se vinculó correctamente
         """
         try:
-            self.channel.queue_bind(
-                queue=queue_name,
-                exchange=exchange_name,
-                routing_key=routing_key
-            )
-            print(f'Cola "{queue_name}" vinculada a exchange "{exchange_name}" con clave "{routing_key}"')
+            with self._lock:
+                self.channel.queue_bind(
+                    queue=queue_name,
+                    exchange=exchange_name,
+                    routing_key=routing_key
+                )
+            self.bindings.add((queue_name, exchange_name, routing_key))
+            logger.info('Cola "%s" vinculada a exchange "%s" con clave "%s"', queue_name, exchange_name, routing_key)
             return True
         except Exception as e:
-            print(f'Error al vincular cola "{queue_name}" a exchange "{exchange_name}": {str(e)}')
+            logger.error('Error al vincular cola "%s" a exchange "%s": %s', queue_name, exchange_name, e)
             raise
     
-    def publish_message(self, exchange_name, routing_key, message):
+    def publish_message(self, exchange_name, routing_key, message, channel=None, codec=None):
         """
         Publica un mensaje en un exchange
         
         Args:
             exchange_name: Nombre del exchange
             routing_key: Clave de routing para el mensaje
-            message: Mensaje a publicar (será convertido a JSON)
+            message: Mensaje a publicar (será serializado con el codec)
+            channel: Canal a usar (por defecto se toma uno del pool)
+            codec: MessageCodec a usar (por defecto el del broker)
         
         Returns:
             ID del mensaje publicado
         """
         try:
-            # Generar ID único para el mensaje
-            message_id = str(uuid.uuid4())
-            
-            # Preparar propiedades del mensaje
-            properties = pika.BasicProperties(
-                message_id=message_id,
-                timestamp=int(time.time()),
-                content_type='application/json',
-                delivery_mode=2  # Mensaje persistente
-            )
-            
-            # Si el mensaje no es un diccionario, lo encapsulamos
-            if not isinstance(message, dict):
-                message = {'data': message}
+            message_id, body, properties = self._encode_message(message, codec)
             
-            # Asegurarnos de que tenga un ID
-            message['message_id'] = message_id
-            
-            # Convertir mensaje a JSON y publicar
-            message_json = json.dumps(message)
-            self.channel.basic_publish(
-                exchange=exchange_name,
-                routing_key=routing_key,
-                body=message_json,
-                properties=properties
-            )
+            if channel is None:
+                with self.pool.acquire() as pooled:
+                    pooled.channel.basic_publish(
+                        exchange=exchange_name,
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties
+                    )
+            else:
+                channel.basic_publish(
+                    exchange=exchange_name,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=properties
+                )
             
-            print(f'Mensaje {message_id} publicado en exchange "{exchange_name}" con clave "{routing_key}"')
+            logger.debug('Mensaje %s publicado en exchange "%s" con clave "%s"', message_id, exchange_name, routing_key,
+                         extra=SAMPLED)
             return message_id
         except Exception as e:
-            print(f'Error al publicar mensaje: {str(e)}')
+            logger.error('Error al publicar mensaje: %s', e)
             raise
     
+    def _encode_message(self, message, codec=None):
+        """
+        Serializa un mensaje y prepara sus propiedades
+        
+        Returns:
+            Tupla (message_id, body, properties)
+        """
+        # Si el mensaje no es un diccionario, lo encapsulamos
+        if not isinstance(message, dict):
+            message = {'data': message}
+        
+        # Conservar el ID que puso el productor: sus reintentos, el spool y la
+        # vía directa reutilizan el mismo y la deduplicación lo reconoce
+        message_id = str(message.get('message_id') or uuid.uuid4())
+        message['message_id'] = message_id
+        
+        # Serializar (y comprimir si corresponde) el mensaje
+        body, content_type, content_encoding = (codec or self.codec).encode(message)
+        
+        # Preparar propiedades del mensaje
+        properties = pika.BasicProperties(
+            message_id=message_id,
+            timestamp=int(time.time()),
+            content_type=content_type,
+            content_encoding=content_encoding,
+            delivery_mode=2  # Mensaje persistente
+        )
+        return message_id, body, properties
+    
+    def publish_batch(self, entries, codec=None):
+        """
+        Publica un lote de mensajes con confirmaciones del broker
+        
+        Todo el lote se publica seguido en un canal en modo confirm y las
+        confirmaciones se esperan una sola vez al final; cada ack o nack se asigna
+        a su mensaje por delivery tag. Los exchanges que el broker no declaró se
+        comprueban antes, así uno inexistente solo hace fallar a sus mensajes.
+        
+        Args:
+            entries: Lista de diccionarios {exchangeName, routingKey, message}
+            codec: MessageCodec por defecto del lote (por defecto el del broker)
+        
+        Returns:
+            Lista con el resultado de cada mensaje (messageId y estado ack/nack/error)
+        """
+        results = [None] * len(entries)
+        tags = {}  # delivery tag -> resultado
+        error = "Sin confirmación del broker"
+        
+        with self.pool.acquire() as pooled:
+            exchange_errors = self._check_exchanges(pooled, entries)
+            tracker = pooled.confirm_tracker
+            try:
+                for index, entry in enumerate(entries):
+                    results[index], tag = self._publish_batch_entry(index, entry, tracker, exchange_errors, codec)
+                    if tag is not None:
+                        tags[tag] = results[index]
+                tracker.wait(timeout=BATCH_CONFIRM_TIMEOUT)
+            except pika.exceptions.AMQPConnectionError:
+                raise
+            except pika.exceptions.AMQPError as e:
+                # Canal cerrado por el broker: lo no confirmado falla
+                error = str(e)
+            confirmed = tracker.take()
+        
+        for tag, result in tags.items():
+            if tag not in confirmed:
+                result["error"] = error
+            elif confirmed[tag] is None:
+                result["status"] = "ack"
+            else:
+                result["status"] = "nack"
+                result["error"] = confirmed[tag]
+        
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {"index": index, "messageId": None, "status": "error", "error": error}
+        
+        return results
+    
+    def _check_exchanges(self, pooled, entries):
+        """
+        Comprueba con una declaración pasiva los exchanges del lote que no declaró el broker
+        
+        Returns:
+            Diccionario exchange -> error de los que no existen
+        """
+        errors = {}
+        names = {entry.get('exchangeName', '') for entry in entries if isinstance(entry, dict)}
+        for exchange_name in names:
+            if not exchange_name or exchange_name in self.exchanges:
+                continue
+            try:
+                pooled.channel.exchange_declare(exchange=exchange_name, passive=True)
+            except pika.exceptions.ChannelClosedByBroker as e:
+                errors[exchange_name] = str(e)
+                pooled.reopen_channel()
+        return errors
+    
+    def _publish_batch_entry(self, index, entry, tracker, exchange_errors, codec=None):
+        """
+        Publica una entrada de un lote sin esperar su confirmación
+        
+        Returns:
+            Tupla (resultado, delivery tag o None si no se llegó a publicar)
+        """
+        result = {"index": index, "messageId": None, "status": "error"}
+        
+        if not isinstance(entry, dict) or entry.get('message') is None:
+            result["error"] = "Mensaje requerido"
+            return result, None
+        
+        exchange_name = entry.get('exchangeName', '')
+        if exchange_name in exchange_errors:
+            result["error"] = exchange_errors[exchange_name]
+            return result, None
+        
+        message = entry['message']
+        if isinstance(message, dict):
+            # Evitar que se modifique el payload del cliente
+            message = dict(message)
+        
+        try:
+            message_id, body, properties = self._encode_message(message, self.request_codec(entry, codec))
+        except Exception as e:
+            result["error"] = str(e)
+            return result, None
+        
+        result["messageId"] = message_id
+        tag = tracker.basic_publish(
+            exchange=exchange_name,
+            routing_key=entry.get('routingKey', ''),
+            body=body,
+            properties=properties
+        )
+        return result, tag
+    
+    def inspect_parked(self, queue_name, limit=50):
+        """
+        Lee los mensajes aparcados de una cola sin retirarlos
+        
+        Args:
+            queue_name: Cola original (se lee su cola de aparcados)
+            limit: Número máximo de mensajes a leer
+        
+        Returns:
+            Lista de diccionarios con el mensaje y sus datos de reintento
+        """
+        parked = []
+        with self.pool.acquire() as pooled:
+            last_tag = None
+            try:
+                while len(parked) < limit:
+                    method, properties, body = pooled.channel.basic_get(
+                        queue=parking_queue_name(queue_name),
+                        auto_ack=False
+                    )
+                    if method is None:
+                        break
+                    last_tag = method.delivery_tag
+                    parked.append(self._describe_parked(method, properties, body))
+            finally:
+                if last_tag is not None and pooled.channel.is_open:
+                    # Solo lectura: todos vuelven a la cola de aparcados en su orden
+                    pooled.channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+        return parked
+    
+    def _describe_parked(self, method, properties, body):
+        headers = properties.headers or {}
+        try:
+            message = decode(body, properties.content_type, properties.content_encoding)
+        except SerializationError:
+            message = None
+        return {
+            "messageId": properties.message_id,
+            "routingKey": headers.get(ORIGINAL_ROUTING_KEY_HEADER, method.routing_key),
+            "retries": headers.get(RETRY_COUNT_HEADER, 0),
+            "error": headers.get(LAST_ERROR_HEADER),
+            "parkedAt": headers.get(PARKED_AT_HEADER),
+            "message": message
+        }
+    
+    def replay_parked(self, queue_name, limit=None, message_ids=None):
+        """
+        Devuelve mensajes aparcados a su cola original con el contador de reintentos a cero
+        
+        Args:
+            queue_name: Cola original
+            limit: Número máximo de mensajes a reenviar (por defecto todos)
+            message_ids: Reenviar solo estos mensajes (el resto sigue aparcado)
+        
+        Returns:
+            IDs de los mensajes reenviados
+        """
+        wanted = set(message_ids) if message_ids else None
+        replayed = []
+        skipped = []
+        reset = (RETRY_COUNT_HEADER, LAST_ERROR_HEADER, PARKED_AT_HEADER)
+        
+        with self.pool.acquire() as pooled:
+            channel = pooled.channel
+            try:
+                while limit is None or len(replayed) < limit:
+                    if wanted is not None and len(replayed) == len(wanted):
+                        break
+                    method, properties, body = channel.basic_get(
+                        queue=parking_queue_name(queue_name),
+                        auto_ack=False
+                    )
+                    if method is None:
+                        break
+                    if wanted is not None and properties.message_id not in wanted:
+                        skipped.append(method.delivery_tag)
+                        continue
+                    headers = {k: v for k, v in (properties.headers or {}).items() if k not in reset}
+                    # Con confirmación: el aparcado solo se retira si la cola original lo recibió
+                    pooled.confirm_channel.basic_publish(
+                        exchange='',
+                        routing_key=queue_name,
+                        body=body,
+                        properties=copy_properties(properties, headers)
+                    )
+                    channel.basic_ack(delivery_tag=method.delivery_tag)
+                    replayed.append(properties.message_id)
+            finally:
+                if channel.is_open:
+                    for delivery_tag in skipped:
+                        channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+        
+        logger.info('%d mensajes aparcados de "%s" reenviados', len(replayed), queue_name)
+        return replayed
+    
     def start(self):
         """Inicia el broker y su API de gestión"""
         # Iniciar API de gestión en un hilo separado
@@ -263,22 +747,60 @@ class EventBroker:
         api_thread.daemon = True
         api_thread.start()
         
-        print(f"Event Broker iniciado. API de gestión en puerto {self.management_port}")
+        # Refresco de estadísticas de colas en segundo plano
+        self.stats.start()
+        
+        logger.info("Event Broker iniciado. API de gestión en puerto %s", self.management_port)
         
-        # Mantener conexión con RabbitMQ
         try:
-            # Simplemente mantenemos el proceso vivo
-            while True:
-                # time.sleep(1)
-                # Si la conexión se perdió, intentar reconectar
-                if not self.connection.is_open:
-                    print("Conexión perdida. Intentando reconectar...")
-                    self.connect()
+            self.supervise()
         except KeyboardInterrupt:
-            print("Deteniendo Event Broker...")
+            pass
+        finally:
+            self.stop()
+    
+    def supervise(self):
+        """
+        Supervisa la conexión con RabbitMQ hasta que se detenga el broker
+        
+        Atiende I/O y heartbeats periódicamente sin bloquear la conexión para la API,
+        y reconecta con backoff cuando la conexión o los canales se pierden.
+        """
+        while not self._stop_event.is_set():
+            if not self.is_connected():
+                logger.warning("Conexión perdida. Intentando reconectar...")
+                self.state = 'reconnecting'
+                if not self.reconnect():
+                    break
+                continue
+            
+            try:
+                with self._lock:
+                    # time_limit=0 procesa los frames pendientes sin esperar
+                    self.connection.process_data_events(time_limit=0)
+                self.pool.heartbeat()
+            except pika.exceptions.AMQPError as e:
+                self.state = 'disconnected'
+                self.last_error = str(e)
+                logger.error("Error en la conexión con RabbitMQ: %s", e)
+                continue
+            
+            self._stop_event.wait(IO_INTERVAL)
+    
+    def stop(self):
+        """Detiene el supervisor y cierra la conexión con RabbitMQ"""
+        logger.info("Deteniendo Event Broker...")
+        self._stop_event.set()
+        self.stats.stop()
+        self.pool.close()
+        with self._lock:
             if self.connection and self.connection.is_open:
-                self.connection.close()
-            print("Event Broker detenido")
+                try:
+                    self.connection.close()
+                except Exception:
+                    pass
+            self.state = 'stopped'
+        logger.info("Event Broker detenido")
 
 
 if __name__ == "__main__":
@@ -288,14 +810,43 @@ if __name__ == "__main__":
     parser.add_argument('--host', default='localhost', help='Host de RabbitMQ')
     parser.add_argument('--port', type=int, default=5672, help='Puerto de RabbitMQ')
     parser.add_argument('--api-port', type=int, default=5000, help='Puerto para API de gestión')
+    parser.add_argument('--heartbeat', type=int, default=60, help='Intervalo de heartbeat (segundos)')
+    parser.add_argument('--max-reconnect-delay', type=float, default=30.0,
+                        help='Espera máxima entre reintentos de conexión (segundos)')
+    parser.add_argument('--pool-size', type=int, default=8,
+                        help='Conexiones del pool para publicar en paralelo')
+    parser.add_argument('--stats-ttl', type=float, default=5.0,
+                        help='Segundos de caché de las estadísticas de colas')
+    parser.add_argument('--management-url', default=None,
+                        help='URL de la API de management de RabbitMQ (p. ej. http://localhost:15672)')
+    parser.add_argument('--watch-queue', action='append', default=[],
+                        help='Cola existente a incluir en las estadísticas (repetible)')
+    parser.add_argument('--transport', default=None, choices=['rabbitmq', 'memory'],
+                        help='Transporte AMQP (por defecto EVENT_TRANSPORT o rabbitmq)')
+    parser.add_argument('--serializer', default='json', choices=['json', 'orjson', 'msgpack'],
+                        help='Serializador por defecto de los mensajes')
+    parser.add_argument('--compression', default=None, choices=['gzip', 'deflate'],
+                        help='Compresión de mensajes grandes')
+    parser.add_argument('--compress-threshold', type=int, default=1024,
+                        help='Tamaño mínimo en bytes para comprimir')
     
     args = parser.parse_args()
     
     broker = EventBroker(
         host=args.host,
         port=args.port,
-        management_port=args.api_port
+        management_port=args.api_port,
+        heartbeat=args.heartbeat,
+        reconnect_max_delay=args.max_reconnect_delay,
+        pool_size=args.pool_size,
+        stats_ttl=args.stats_ttl,
+        management_url=args.management_url,
+        transport=args.transport,
+        serializer=args.serializer,
+        compression=args.compression,
+        compress_threshold=args.compress_threshold
     )
+    broker.stats.watch(*args.watch_queue)
     
     # Declarar exchange y cola por defecto
     try:
@@ -303,6 +854,6 @@ if __name__ == "__main__":
         broker.declare_queue('default')
         broker.bind_queue('default', 'default', '#')
     except Exception as e:
-        print(f"Error al configurar recursos por defecto: {str(e)}")
+        logger.error("Error al configurar recursos por defecto: %s", e)
     
     broker.start()
\ No newline at end of file
@@ -6,6 +6,7 @@ import json
 import random
 import os
 from datetime import datetime
+from urllib.parse import urlparse
 
 # Importar las clases necesarias
 from producer import EventProducer
@@ -18,6 +19,19 @@ def run_example():
     RABBITMQ_HOST = os.environ.get('RABBITMQ_HOST', 'localhost')
     RABBITMQ_PORT = int(os.environ.get('RABBITMQ_PORT', 5672))
     BROKER_API = os.environ.get('BROKER_API', 'http://localhost:5000')
+    TRANSPORT = os.environ.get('EVENT_TRANSPORT', 'rabbitmq')
+    
+    if TRANSPORT == 'memory':
+        # Sin RabbitMQ: broker en memoria con su API de gestión en este mismo proceso
+        from event_broker import EventBroker
+        broker = EventBroker(
+            host=RABBITMQ_HOST,
+            port=RABBITMQ_PORT,
+            management_port=urlparse(BROKER_API).port or 5000,
+            transport='memory'
+        )
+        threading.Thread(target=broker.start, daemon=True).start()
+        time.sleep(1)
     
     # Definir exchange y colas
     EXCHANGE_NAME = 'pedidos-exchange'
@@ -42,14 +56,16 @@ def run_example():
         rabbitmq_host=RABBITMQ_HOST,
         rabbitmq_port=RABBITMQ_PORT,
         broker_api=BROKER_API,
-        consumer_id='consumidor-pedidos-normal'
+        consumer_id='consumidor-pedidos-normal',
+        workers=4  # los manejadores son lentos: procesar varios pedidos a la vez
     )
     
     consumidor_prioritario = EventConsumer(
         rabbitmq_host=RABBITMQ_HOST,
         rabbitmq_port=RABBITMQ_PORT,
         broker_api=BROKER_API,
-        consumer_id='consumidor-pedidos-prioritarios'
+        consumer_id='consumidor-pedidos-prioritarios',
+        workers=4  # los manejadores son lentos: procesar varios pedidos a la vez
     )
     
     # Definir manejadores para procesar mensajes
@@ -161,5 +177,6 @@ if __name__ == "__main__":
     # Verificar que se esté ejecutando RabbitMQ y el broker
     print("Iniciando ejemplo de Event Broker con RabbitMQ")
     print("Nota: Asegúrate de que RabbitMQ y el broker estén ejecutándose")
+    print("      (o usa EVENT_TRANSPORT=memory para ejecutarlo sin RabbitMQ)")
     
     run_example()
\ No newline at end of file
@@ -1,14 +1,36 @@
 #!/usr/bin/env python
 import pika
-import json
 import uuid
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 import argparse
+import threading
+from common.topology import topology
+from common.transport import get_transport
+from common.serialization import get_codec
+from common.accumulator import MessageAccumulator
+from common.spool import MessageSpool, SpoolDrainer
+from common.hash_ring import parse_nodes
+from common.node_connections import NodeConnections
+from common.log import SAMPLED, get_logger
+
+# Mensajes por petición a /messages/batch (y por espera de confirmaciones en la vía directa)
+BATCH_CHUNK_SIZE = 500
+
+# Conexiones HTTP keep-alive reutilizables hacia la API del broker
+HTTP_POOL_SIZE = 10
+
+logger = get_logger('producer')
 
 class EventProducer:
     def __init__(self, rabbitmq_host='localhost', rabbitmq_port=5672, 
-                 broker_api='http://localhost:5000', producer_id=None):
+                 broker_api='http://localhost:5000', producer_id=None, transport=None,
+                 serializer='json', compression=None, compress_threshold=1024,
+                 async_mode=False, linger_ms=5, batch_size=BATCH_CHUNK_SIZE, buffer_size=10000,
+                 block_on_full=True, max_block_ms=None, http_pool_size=HTTP_POOL_SIZE,
+                 spool_dir=None, spool_segment_bytes=16 * 1024 * 1024, spool_fsync_interval_ms=50,
+                 rabbitmq_nodes=None, node_retry_interval=5.0):
         """
         Inicializa un productor de eventos usando RabbitMQ
         
@@ -17,42 +39,132 @@ class EventProducer:
             rabbitmq_port: Puerto de RabbitMQ
             broker_api: URL de la API del broker
             producer_id: Identificador único del productor
+            transport: Transporte AMQP ('rabbitmq' por defecto, 'memory' para pruebas sin RabbitMQ)
+            serializer: Serializador de los mensajes ('json', 'orjson', 'msgpack')
+            compression: Compresión ('gzip', 'deflate') o None
+            compress_threshold: Tamaño mínimo en bytes para comprimir
+            async_mode: Si es True, publish() encola el mensaje y devuelve un Future;
+                un hilo en segundo plano envía los mensajes por lotes
+            linger_ms: Espera máxima de un mensaje encolado antes de enviar el lote
+            batch_size: Máximo de mensajes por lote en modo asíncrono
+            buffer_size: Máximo de mensajes encolados sin enviar
+            block_on_full: Con el buffer lleno, esperar hueco (True) o lanzar BufferFullError
+            max_block_ms: Espera máxima con el buffer lleno (None = sin límite)
+            http_pool_size: Conexiones keep-alive a la API del broker
+            spool_dir: Directorio del spool en disco; si se indica, los mensajes que no
+                se pueden publicar se guardan ahí y se reenvían al volver el broker
+            spool_segment_bytes: Tamaño de cada segmento del spool
+            spool_fsync_interval_ms: Tiempo máximo sin fsync de lo escrito en el spool
+            rabbitmq_nodes: Nodos de RabbitMQ ('h1:5672,h2:5672' o lista); la vía directa
+                reparte los mensajes entre ellos por hash consistente de la clave de
+                routing. Por defecto solo rabbitmq_host:rabbitmq_port
+            node_retry_interval: Segundos sin reintentar un nodo que falló
         """
         self.rabbitmq_host = rabbitmq_host
         self.rabbitmq_port = rabbitmq_port
         self.broker_api = broker_api
         self.producer_id = producer_id or str(uuid.uuid4())
-        self.connection = None
-        self.channel = None
+        self.transport = get_transport(transport)
+        self.codec = get_codec(serializer, compression, compress_threshold)
+        self.http = self._create_session(http_pool_size)
+        self.nodes = NodeConnections(
+            self.transport,
+            parse_nodes(rabbitmq_nodes) if rabbitmq_nodes else [(rabbitmq_host, rabbitmq_port)],
+            retry_interval=node_retry_interval
+        )
+        # Las conexiones de pika las comparten el hilo que publica, el emisor y el vaciado
+        # del spool; las peticiones a la API no lo toman y usan el pool de la sesión HTTP
+        self._io_lock = threading.RLock()
         self.connect()
+        
+        self.spool = None
+        self.drainer = None
+        if spool_dir:
+            self.spool = MessageSpool(
+                spool_dir,
+                segment_bytes=spool_segment_bytes,
+                fsync_interval_ms=spool_fsync_interval_ms
+            )
+            self.drainer = SpoolDrainer(self.spool, self._send_spooled, batch_size=BATCH_CHUNK_SIZE)
+            self.drainer.start()
+        
+        # En modo asíncrono solo el hilo emisor usa la conexión
+        self.accumulator = None
+        if async_mode:
+            self.accumulator = MessageAccumulator(
+                self._send_accumulated,
+                batch_size=batch_size,
+                linger_ms=linger_ms,
+                buffer_size=buffer_size,
+                block_on_full=block_on_full,
+                max_block_ms=max_block_ms
+            )
+    
+    @staticmethod
+    def _create_session(pool_size):
+        """Sesión HTTP que reutiliza las conexiones TCP con la API del broker"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    @property
+    def connection(self):
+        """Conexión con el nodo primario"""
+        return self.nodes.primary.connection
+    
+    @property
+    def channel(self):
+        """Canal del nodo primario (declaración de topología)"""
+        return self.nodes.primary.channel
     
     def connect(self):
-        """Establece conexión directa con RabbitMQ"""
-        try:
-            self.connection = pika.BlockingConnection(
-                pika.ConnectionParameters(host=self.rabbitmq_host, port=self.rabbitmq_port)
-            )
-            self.channel = self.connection.channel()
-            print(f"Productor {self.producer_id} conectado a RabbitMQ en {self.rabbitmq_host}:{self.rabbitmq_port}")
+        """Establece conexión directa con RabbitMQ (nodo primario; el resto bajo demanda)"""
+        if self.nodes.connect(self.nodes.primary):
+            logger.info("Productor %s conectado a RabbitMQ en %s", self.producer_id, self.nodes.primary.name)
             return True
-        except Exception as e:
-            print(f"Error al conectar a RabbitMQ: {str(e)}")
-            return False
+        return False
     
-    def ensure_exchange(self, exchange_name, exchange_type='topic'):
+    def _ensure_exchange_on(self, node, exchange_name, exchange_type='topic'):
+        """Declara el exchange en el nodo si no consta ya declarado (API o esa conexión)"""
+        if not exchange_name or topology.is_declared(self.broker_api, exchange_name, exchange_type):
+            return
+        topology.declare_exchange(node.channel, exchange_name, exchange_type, scope=node.connection)
+    
+    def ensure_exchange(self, exchange_name, exchange_type='topic', use_api=True):
         """
         Asegura que exista un exchange, creándolo si es necesario
         
+        Las declaraciones se recuerdan en el registro de topología compartido, de modo
+        que un exchange ya declarado en esta conexión o mediante la API no vuelve a
+        generar peticiones.
+        
         Args:
             exchange_name: Nombre del exchange
             exchange_type: Tipo de exchange (direct, fanout, topic, headers)
+            use_api: Si es True, intenta primero la API del broker
         
         Returns:
             True si se creó o ya existía
         """
+        # El exchange por defecto ('') siempre existe y no se puede declarar
+        if not exchange_name:
+            return True
+        
+        if (topology.is_declared(self.broker_api, exchange_name, exchange_type)
+                or topology.is_declared(self.connection, exchange_name, exchange_type)):
+            return True
+        
         try:
+            if not use_api:
+                with self._io_lock:
+                    topology.declare_exchange(self.channel, exchange_name, exchange_type, scope=self.connection)
+                logger.info('Exchange "%s" declarado directamente', exchange_name)
+                return True
+            
             # Intentar usar la API del broker primero
-            response = requests.post(
+            response = self.http.post(
                 f"{self.broker_api}/exchanges",
                 json={
                     "exchangeName": exchange_name,
@@ -62,19 +174,17 @@ class EventProducer:
             )
             
             if response.status_code in [201, 200]:
-                print(f'Exchange "{exchange_name}" verificado/creado mediante API')
+                topology.mark_declared(self.broker_api, exchange_name, exchange_type)
+                logger.info('Exchange "%s" verificado/creado mediante API', exchange_name)
                 return True
                 
             # Si falla, intentar directamente con RabbitMQ
-            self.channel.exchange_declare(
-                exchange=exchange_name,
-                exchange_type=exchange_type,
-                durable=True
-            )
-            print(f'Exchange "{exchange_name}" declarado directamente')
+            with self._io_lock:
+                topology.declare_exchange(self.channel, exchange_name, exchange_type, scope=self.connection)
+            logger.info('Exchange "%s" declarado directamente', exchange_name)
             return True
         except Exception as e:
-            print(f'Error al asegurar exchange "{exchange_name}": {str(e)}')
+            logger.error('Error al asegurar exchange "%s": %s', exchange_name, e)
             return False
     
     def publish(self, message, exchange_name='default', routing_key='', use_api=True):
@@ -88,97 +198,510 @@ class EventProducer:
             use_api: Si es True, usa la API del broker, sino usa conexión directa
         
         Returns:
-            ID del mensaje si se publicó correctamente, None en caso contrario
+            ID del mensaje si se publicó correctamente (o quedó en el spool), None en
+            caso contrario. En modo asíncrono, un Future que se resuelve con el ID del mensaje
+            (o con PublishError) cuando se confirma su lote
+        
+        Raises:
+            BufferFullError: En modo asíncrono, si el buffer está lleno
         """
-        # Asegurar que el mensaje tenga un ID y timestamp
-        message_id = str(uuid.uuid4())
+        message_id, message_data = self._build_message(message)
+        entry = {
+            "exchangeName": exchange_name,
+            "routingKey": routing_key,
+            "message": message_data,
+            "messageId": message_id,
+        }
         
-        # Si el mensaje no es un diccionario, lo encapsulamos
-        if not isinstance(message, dict):
-            message_data = {'data': message}
-        else:
-            message_data = message.copy()
+        if self.accumulator is not None:
+            return self.accumulator.append((use_api, entry))
         
-        # Agregar metadatos al mensaje
-        message_data.update({
-            'message_id': message_id,
-            'producer_id': self.producer_id,
-            'timestamp': datetime.now().isoformat(),
-        })
+        # Con mensajes en el spool el broker no responde (o se está vaciando):
+        # los nuevos van detrás para conservar el orden y sin esperar a la red
+        if self.spool is not None and self.spool.pending():
+            return self._spool_entry(use_api, entry)
+        
+        result = self._publish_now(use_api, exchange_name, routing_key, message_id, message_data)
+        if result["status"] == "ack":
+            return result["messageId"]
+        # Solo se guarda lo que falló por falta de conectividad: un error del propio
+        # mensaje se repetiría en cada intento de vaciar el spool
+        if result["retryable"] and self.spool is not None:
+            return self._spool_entry(use_api, entry)
+        return None
+    
+    @staticmethod
+    def _error_result(error, path, retryable=False):
+        """
+        Resultado de un mensaje no publicado
+        
+        Args:
+            error: Descripción del error
+            path: Vía por la que se intentó ('api' o 'direct')
+            retryable: True si el broker no estaba disponible (reintentarlo puede
+                funcionar), False si el error es del mensaje (exchange inexistente o
+                de otro tipo, payload no serializable...)
+        """
+        return {
+            "messageId": None,
+            "status": "error",
+            "error": error,
+            "path": path,
+            "retryable": retryable,
+        }
+    
+    def _publish_now(self, use_api, exchange_name, routing_key, message_id, message_data):
+        """
+        Publica un mensaje ya preparado por la API o directamente
         
+        Returns:
+            Resultado como los de publish_batch ("messageId", "status", "error", "path")
+            con "retryable" (ver _error_result)
+        """
         try:
             if use_api:
                 # Publicar usando la API del broker
-                response = requests.post(
+                response = self.http.post(
                     f"{self.broker_api}/messages",
                     json={
                         "exchangeName": exchange_name,
                         "routingKey": routing_key,
-                        "message": message_data
+                        "message": message_data,
+                        **self._codec_fields()
                     }
                 )
                 
                 if response.status_code == 201:
                     result = response.json()
-                    print(f'Mensaje publicado con ID: {result.get("messageId")}')
-                    return result.get("messageId")
+                    logger.debug('Mensaje %s publicado mediante API', result.get("messageId"), extra=SAMPLED)
+                    return {
+                        "messageId": result.get("messageId"),
+                        "status": "ack",
+                        "error": None,
+                        "path": "api",
+                        "retryable": False,
+                    }
                 else:
-                    print(f'Error al publicar mensaje mediante API: {response.text}')
+                    logger.error('Error al publicar mensaje mediante API: %s', response.text)
                     # Si falla la API, intentar publicación directa
-                    return self.publish(message, exchange_name, routing_key, use_api=False)
+                    return self._publish_now(False, exchange_name, routing_key, message_id, message_data)
             else:
-                # Publicar directamente usando RabbitMQ
-                # Asegurar que el exchange exista
-                self.ensure_exchange(exchange_name)
-                
-                # Propiedades del mensaje
-                properties = pika.BasicProperties(
-                    message_id=message_id,
-                    timestamp=int(datetime.now().timestamp()),
-                    content_type='application/json',
-                    delivery_mode=2  # Mensaje persistente
-                )
-                
-                # Publicar mensaje
-                self.channel.basic_publish(
-                    exchange=exchange_name,
-                    routing_key=routing_key,
-                    body=json.dumps(message_data),
-                    properties=properties
-                )
-                
-                print(f'Mensaje {message_id} publicado directamente en "{exchange_name}" con clave "{routing_key}"')
-                return message_id
+                return self._publish_direct(exchange_name, routing_key, message_id, message_data)
+        except pika.exceptions.AMQPError as e:
+            # El canal o la conexión se cerraron: la topología registrada ya no es fiable
+            topology.invalidate(self.connection)
+            logger.error('Error al publicar mensaje: %s', e)
+            return self._error_result(str(e), "direct", retryable=True)
+        except requests.RequestException as e:
+            # La API del broker no responde
+            logger.error('Error al publicar mensaje: %s', e)
+            return self._error_result(str(e), "api", retryable=True)
         except Exception as e:
-            print(f'Error al publicar mensaje: {str(e)}')
-            return None
+            logger.error('Error al publicar mensaje: %s', e)
+            return self._error_result(str(e), "api" if use_api else "direct")
+    
+    def _publish_direct(self, exchange_name, routing_key, message_id, message_data):
+        """
+        Publica un mensaje directamente en el nodo de su clave de routing
+        
+        Solo esta vía usa las conexiones de pika (no thread-safe): el bloqueo cubre la
+        declaración del exchange, la publicación y el paso a otro nodo, no las
+        peticiones HTTP a la API.
+        """
+        with self._io_lock:
+            # Publicar directamente en el nodo de la clave de routing; si falla,
+            # en el siguiente del anillo
+            for node in self.nodes.candidates(routing_key):
+                try:
+                    # Asegurar que el exchange exista (sin ida y vuelta si ya está en caché)
+                    self._ensure_exchange_on(node, exchange_name)
+                    self._basic_publish(node.channel, exchange_name, routing_key, message_id, message_data)
+                except pika.exceptions.AMQPError as e:
+                    logger.warning('Error al publicar en el nodo %s: %s', node.name, e)
+                    if self.nodes.mark_failed(node, e):
+                        continue
+                    # Error del canal (exchange inexistente, PRECONDITION_FAILED...):
+                    # es del mensaje, otro nodo no lo arreglaría
+                    logger.error('Error al publicar mensaje: %s', e)
+                    return self._error_result(str(e), "direct")
+                
+                logger.debug('Mensaje %s publicado directamente en "%s" con clave "%s"',
+                             message_id, exchange_name, routing_key, extra=SAMPLED)
+                return {
+                    "messageId": message_id,
+                    "status": "ack",
+                    "error": None,
+                    "path": "direct",
+                    "retryable": False,
+                }
+            
+            logger.error('Error al publicar mensaje: ningún nodo de RabbitMQ disponible')
+            return self._error_result("Ningún nodo de RabbitMQ disponible", "direct", retryable=True)
+    
+    def _build_message(self, message):
+        """Genera el ID y agrega los metadatos del productor al mensaje"""
+        # Asegurar que el mensaje tenga un ID y timestamp
+        message_id = str(uuid.uuid4())
+        
+        # Si el mensaje no es un diccionario, lo encapsulamos
+        if not isinstance(message, dict):
+            message_data = {'data': message}
+        else:
+            message_data = message.copy()
+        
+        # Agregar metadatos al mensaje
+        message_data.update({
+            'message_id': message_id,
+            'producer_id': self.producer_id,
+            'timestamp': datetime.now().isoformat(),
+        })
+        return message_id, message_data
+    
+    def _basic_publish(self, channel, exchange_name, routing_key, message_id, message_data):
+        """
+        Serializa y publica un mensaje ya preparado en el canal indicado
+        
+        Returns:
+            Lo que devuelva el canal (el delivery tag si es un ConfirmTracker)
+        """
+        # Serializar (y comprimir si corresponde) el mensaje
+        body, content_type, content_encoding = self.codec.encode(message_data)
+        
+        # Propiedades del mensaje
+        properties = pika.BasicProperties(
+            message_id=message_id,
+            timestamp=int(datetime.now().timestamp()),
+            content_type=content_type,
+            content_encoding=content_encoding,
+            delivery_mode=2  # Mensaje persistente
+        )
+        
+        return channel.basic_publish(
+            exchange=exchange_name,
+            routing_key=routing_key,
+            body=body,
+            properties=properties
+        )
+    
+    def _codec_fields(self):
+        """Campos para que el broker use el mismo codec que este productor"""
+        if self.codec.serializer.name == 'json' and not self.codec.compression:
+            return {}
+        return {
+            "serializer": self.codec.serializer.name,
+            "compression": self.codec.compression,
+        }
     
-    def publish_batch(self, messages, exchange_name='default', routing_key=''):
+    def publish_batch(self, messages, exchange_name='default', routing_key='', use_api=True,
+                      chunk_size=BATCH_CHUNK_SIZE):
         """
         Publica un lote de mensajes
         
+        Con use_api los mensajes se envían en peticiones a /messages/batch de hasta
+        chunk_size mensajes, confirmados por el broker. Solo los que fallan se
+        reintentan por conexión directa, con confirmaciones esperadas cada chunk_size
+        mensajes.
+        
         Args:
             messages: Lista de mensajes a publicar
             exchange_name: Nombre del exchange
             routing_key: Clave de routing
+            use_api: Si es True, usa la API del broker, sino usa conexión directa
+            chunk_size: Mensajes por petición o por espera de confirmaciones
         
         Returns:
-            Lista de IDs de mensajes publicados
+            Lista con el resultado de cada mensaje, en el mismo orden:
+            {"messageId", "status" ('ack', 'spooled' o 'error'), "error",
+            "path" ('api', 'direct' o 'spool'), "retryable"}. Con spool, solo los
+            errores de conectividad se guardan en él; los del mensaje se devuelven.
+            En modo asíncrono, lista de Futures como los de publish()
         """
-        message_ids = []
+        if self.accumulator is not None:
+            return [self.publish(message, exchange_name, routing_key, use_api) for message in messages]
         
+        items = []
         for message in messages:
-            message_id = self.publish(message, exchange_name, routing_key)
-            if message_id:
-                message_ids.append(message_id)
+            message_id, message_data = self._build_message(message)
+            items.append((use_api, {
+                "exchangeName": exchange_name,
+                "routingKey": routing_key,
+                "message": message_data,
+                "messageId": message_id,
+            }))
+        return self._send_or_spool(items, chunk_size)
+    
+    def _publish_entries(self, entries, use_api=True, chunk_size=BATCH_CHUNK_SIZE):
+        """Publica entradas {exchangeName, routingKey, message, messageId} ya preparadas"""
+        results = [None] * len(entries)
+        pending = list(range(len(entries)))
+        
+        if use_api:
+            pending = self._publish_entries_api(entries, pending, results, chunk_size)
+            if pending:
+                logger.warning('%d mensajes del lote fallaron en la API; reintentando directamente', len(pending))
+        
+        if pending:
+            # Las conexiones de pika no son thread-safe; la API se llama sin bloqueo
+            with self._io_lock:
+                self._publish_entries_direct(entries, pending, results, chunk_size)
+        
+        return results
+    
+    def _publish_entries_api(self, entries, indexes, results, chunk_size):
+        """
+        Envía las entradas a /messages/batch por bloques
+        
+        Returns:
+            Índices de las entradas que no fueron confirmadas
+        """
+        failed = []
+        
+        for offset in range(0, len(indexes), chunk_size):
+            chunk = indexes[offset:offset + chunk_size]
+            try:
+                response = self.http.post(
+                    f"{self.broker_api}/messages/batch",
+                    json={
+                        "messages": [
+                            {key: entries[i][key] for key in ("exchangeName", "routingKey", "message")}
+                            for i in chunk
+                        ],
+                        **self._codec_fields()
+                    }
+                )
+                if response.status_code not in (201, 207):
+                    logger.error('Error al publicar lote mediante API: %s', response.text)
+                    failed.extend(chunk)
+                    continue
+                
+                for i, result in zip(chunk, response.json().get("results", [])):
+                    if result.get("status") == "ack":
+                        results[i] = {
+                            "messageId": result.get("messageId"),
+                            "status": "ack",
+                            "error": None,
+                            "path": "api",
+                            "retryable": False,
+                        }
+                # Entradas rechazadas o sin resultado en la respuesta
+                failed.extend(i for i in chunk if results[i] is None)
+            except Exception as e:
+                logger.error('Error al publicar lote mediante API: %s', e)
+                failed.extend(chunk)
+        
+        return failed
+    
+    def _send_items(self, items, chunk_size=BATCH_CHUNK_SIZE):
+        """Publica elementos (use_api, entrada) agrupándolos por vía"""
+        results = [None] * len(items)
+        for use_api in (True, False):
+            indexes = [i for i, (api, _) in enumerate(items) if api == use_api]
+            if not indexes:
+                continue
+            sent = self._publish_entries([items[i][1] for i in indexes], use_api, chunk_size)
+            for i, result in zip(indexes, sent):
+                results[i] = result
+        return results
+    
+    def _send_or_spool(self, items, chunk_size=BATCH_CHUNK_SIZE):
+        """Publica elementos (use_api, entrada); con spool, guarda ahí los que no se confirman"""
+        if self.spool is not None and self.spool.pending():
+            return [self._spool_result(use_api, entry) for use_api, entry in items]
+        
+        results = self._send_items(items, chunk_size)
+        if self.spool is not None:
+            for i, result in enumerate(results):
+                # Los errores del propio mensaje se devuelven; solo se guarda lo que
+                # falló por falta de conectividad
+                if result is None or (result["status"] != "ack" and result["retryable"]):
+                    results[i] = self._spool_result(*items[i])
+        return results
+    
+    def _send_accumulated(self, items):
+        """Envía un lote del buffer asíncrono; se ejecuta en el hilo emisor"""
+        return self._send_or_spool(items, len(items))
+    
+    def _spool_entry(self, use_api, entry):
+        """Guarda una entrada en el spool para reenviarla más tarde"""
+        self.spool.append({"useApi": use_api, "entry": entry})
+        logger.info('Broker no disponible: mensaje %s guardado en el spool', entry["messageId"], extra=SAMPLED)
+        return entry["messageId"]
+    
+    def _spool_result(self, use_api, entry):
+        return {
+            "messageId": self._spool_entry(use_api, entry),
+            "status": "spooled",
+            "error": None,
+            "path": "spool",
+            "retryable": False,
+        }
+    
+    def _send_spooled(self, records):
+        """Reenvía registros del spool; se ejecuta en el hilo de vaciado"""
+        return self._send_items([(record["useApi"], record["entry"]) for record in records])
+    
+    def spool_stats(self):
+        """
+        Estado del spool en disco
+        
+        Returns:
+            Diccionario con registros pendientes, bytes, segmentos y ritmo de vaciado,
+            o None si el productor no usa spool
+        """
+        return self.spool.stats() if self.spool is not None else None
+    
+    def flush(self, timeout=None):
+        """
+        Espera a que se envíen los mensajes encolados en modo asíncrono
+        
+        Returns:
+            True si no quedan mensajes pendientes
+        """
+        if self.accumulator is None:
+            return True
+        return self.accumulator.flush(timeout)
+    
+    def _publish_entries_direct(self, entries, indexes, results, chunk_size):
+        """
+        Publica entradas directamente con confirmaciones del broker
+        
+        Los mensajes de cada bloque se publican seguidos en un canal en modo confirm
+        (ConfirmTracker) y sus confirmaciones se esperan una vez por bloque; cada ack
+        o nack se asigna a su mensaje por delivery tag.
+        
+        Las entradas se agrupan por el nodo de su clave de routing. Si un nodo falla,
+        sus bloques pendientes se reintentan en el siguiente nodo del anillo.
+        """
+        pending = list(indexes)
+        for _ in range(len(self.nodes.nodes)):
+            if not pending:
+                return
+            pending = self._publish_entries_to_nodes(entries, pending, results, chunk_size)
+        
+        for i in pending:
+            results[i] = self._error_result("Ningún nodo de RabbitMQ disponible", "direct", retryable=True)
+    
+    def _publish_entries_to_nodes(self, entries, indexes, results, chunk_size):
+        """
+        Publica cada entrada en el nodo que le corresponde
+        
+        Returns:
+            Índices a reintentar (sin nodo disponible o cuyo nodo falló)
+        """
+        groups = {}
+        retry = []
+        nodes_by_key = {}
+        for i in indexes:
+            routing_key = entries[i]["routingKey"]
+            if routing_key not in nodes_by_key:
+                nodes_by_key[routing_key] = self.nodes.node_for(routing_key)
+            node = nodes_by_key[routing_key]
+            if node is None:
+                retry.append(i)
+            else:
+                groups.setdefault(node.name, (node, []))[1].append(i)
+        
+        for node, node_indexes in groups.values():
+            retry.extend(self._publish_chunks_to_node(node, entries, node_indexes, results, chunk_size))
+        return retry
+    
+    def _publish_chunks_to_node(self, node, entries, indexes, results, chunk_size):
+        """
+        Publica entradas en un nodo por bloques confirmados
+        
+        Un exchange inexistente o de otro tipo, un mensaje que no se puede serializar
+        o un nack solo hacen fallar a sus mensajes.
         
-        return message_ids
+        Returns:
+            Entradas no confirmadas si el nodo falla (para el siguiente nodo del anillo)
+        """
+        for offset in range(0, len(indexes), chunk_size):
+            chunk = indexes[offset:offset + chunk_size]
+            rest = indexes[offset + chunk_size:]
+            
+            # Exchanges del bloque, antes de publicar: un error aquí cierra el canal
+            exchange_errors = {}
+            for exchange_name in {entries[i]["exchangeName"] for i in chunk}:
+                try:
+                    self._ensure_exchange_on(node, exchange_name)
+                except pika.exceptions.AMQPError as e:
+                    logger.warning('Error al declarar exchange "%s" en el nodo %s: %s', exchange_name, node.name, e)
+                    if self.nodes.mark_failed(node, e):
+                        # El nodo no responde: este bloque y los siguientes van a otro nodo
+                        return chunk + rest
+                    exchange_errors[exchange_name] = str(e)
+            
+            tags = {}  # delivery tag -> índice de la entrada
+            tracker = None
+            error = None
+            try:
+                tracker = node.get_confirm_tracker()
+                for i in chunk:
+                    entry = entries[i]
+                    if entry["exchangeName"] in exchange_errors:
+                        results[i] = self._error_result(exchange_errors[entry["exchangeName"]], "direct")
+                        continue
+                    try:
+                        tag = self._basic_publish(
+                            tracker,
+                            entry["exchangeName"],
+                            entry["routingKey"],
+                            entry["messageId"],
+                            entry["message"]
+                        )
+                    except pika.exceptions.AMQPError:
+                        raise
+                    except Exception as e:
+                        logger.error('Error al publicar mensaje %s directamente: %s', entry["messageId"], e)
+                        results[i] = self._error_result(str(e), "direct")
+                        continue
+                    tags[tag] = i
+                tracker.wait()
+            except pika.exceptions.AMQPError as e:
+                error = e
+            
+            confirmed = tracker.take() if tracker is not None else {}
+            unconfirmed = []
+            for tag, i in tags.items():
+                if tag not in confirmed:
+                    unconfirmed.append(i)
+                elif confirmed[tag] is None:
+                    results[i] = {
+                        "messageId": entries[i]["messageId"],
+                        "status": "ack",
+                        "error": None,
+                        "path": "direct",
+                        "retryable": False,
+                    }
+                else:
+                    # Nack: error interno del broker, reintentarlo puede funcionar
+                    results[i] = self._error_result(confirmed[tag], "direct", retryable=True)
+            
+            if error is not None:
+                logger.warning('Error al publicar lote en el nodo %s: %s', node.name, error)
+                if self.nodes.mark_failed(node, error):
+                    # El nodo no responde: lo no confirmado y los bloques siguientes van a otro nodo
+                    return unconfirmed + rest
+                # Error del canal: lo no confirmado falla y los siguientes bloques
+                # siguen en un canal nuevo
+                for i in unconfirmed:
+                    results[i] = self._error_result(str(error), "direct")
+            else:
+                logger.debug('Lote de %d mensajes publicado directamente en %s', len(tags), node.name)
+        return []
     
     def close(self):
         """Cierra la conexión con RabbitMQ"""
-        if self.connection and self.connection.is_open:
-            self.connection.close()
-            print(f"Productor {self.producer_id} desconectado")
+        # Enviar lo que quede en el buffer antes de cerrar la conexión
+        if self.accumulator is not None:
+            self.accumulator.close()
+        # Lo que quede en el spool se reenvía en el próximo arranque
+        if self.drainer is not None:
+            self.drainer.stop()
+            self.spool.close()
+        self.http.close()
+        self.nodes.close()
+        logger.info("Productor %s desconectado", self.producer_id)
 
 
 def main():
@@ -190,6 +713,16 @@ def main():
     parser.add_argument('--exchange', default='default', help='Nombre del exchange')
     parser.add_argument('--routing-key', default='', help='Clave de routing')
     parser.add_argument('--message', required=True, help='Mensaje a enviar')
+    parser.add_argument('--transport', default=None, choices=['rabbitmq', 'memory'],
+                        help='Transporte AMQP (por defecto EVENT_TRANSPORT o rabbitmq)')
+    parser.add_argument('--serializer', default='json', choices=['json', 'orjson', 'msgpack'],
+                        help='Serializador de los mensajes')
+    parser.add_argument('--compression', default=None, choices=['gzip', 'deflate'],
+                        help='Compresión de mensajes grandes')
+    parser.add_argument('--nodes', default=None,
+                        help='Nodos de RabbitMQ separados por comas (host:puerto) para repartir la carga')
+    parser.add_argument('--spool-dir', default=None,
+                        help='Directorio del spool para no perder mensajes si el broker no responde')
     
     args = parser.parse_args()
     
@@ -197,7 +730,12 @@ def main():
     producer = EventProducer(
         rabbitmq_host=args.host,
         rabbitmq_port=args.port,
-        broker_api=args.api
+        broker_api=args.api,
+        transport=args.transport,
+        serializer=args.serializer,
+        compression=args.compression,
+        spool_dir=args.spool_dir,
+        rabbitmq_nodes=args.nodes
     )
     
     # Publicar mensaje
@@ -1,26 +1,27 @@
-import json
-import pika
+from common.log import get_logger
 from common.rabbitmq import rabbitmq
 from services.provider_service.app.schemas import StockReserved
 
 EXCHANGE = 'provider.events'
 ROUTING_KEY = 'stock.reserved'
 
+logger = get_logger('provider_service.publisher')
+
 def publish_stock_reserved(stock_data: StockReserved):
     # channel = rabbitmq.get_channel()
     # channel.exchange_declare(exchange=EXCHANGE, exchange_type='topic', durable=True)
     # message = json.dumps(stock_data.dict())
     # channel.basic_publish(exchange=EXCHANGE, routing_key=ROUTING_KEY, body=message)
     try:
-        channel = rabbitmq.get_channel()
-        channel.exchange_declare(exchange=EXCHANGE, exchange_type='topic', durable=True)
-        message = json.dumps(stock_data.dict())
-        channel.basic_publish(
-            exchange=EXCHANGE,
-            routing_key=ROUTING_KEY,
-            body=message,
-            properties=pika.BasicProperties(delivery_mode=2)  # Mensaje persistente
+        rabbitmq.declare_exchange(EXCHANGE, 'topic')
+        rabbitmq.publish(
+            EXCHANGE,
+            ROUTING_KEY,
+            stock_data.dict(),
+            delivery_mode=2,  # Mensaje persistente
+            # Un evento por orden: si se republica, los consumidores descartan la copia
+            message_id=f"stock-reserved-{stock_data.order_id}"
         )
     except Exception as e:
-        print(f"Error publicando evento: {str(e)}")
+        logger.error("Error publicando evento: %s", e)
         raise
\ No newline at end of file
@@ -4,18 +4,46 @@ from sqlalchemy.orm import Session
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
 from common.db import SessionLocal
+from common.log import get_logger
 from schemas import ProviderOrderCreate
-from services import process_provider_order
+from services import process_provider_order, process_provider_orders, publish_orders_reserved
+
+logger = get_logger('provider_service.handlers')
 
 def handle_provider_order(message: dict):
     db = SessionLocal()
     try:
         order_data = ProviderOrderCreate(**message)
-        process_provider_order(db, order_data)
+        process_provider_order(order_data, db)
         db.commit()
     except Exception as e:
         db.rollback()
-        print(f"Error procesando orden: {str(e)}")
+        logger.warning("Error procesando orden: %s", e)
         raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def handle_provider_orders(messages: list):
+    # Un lote de ordenes: una sesión, una transacción y un insert masivo
+    db = SessionLocal()
+    try:
+        orders = [ProviderOrderCreate(**message) for message in messages]
+        db_orders = process_provider_orders(orders, db)
+    except Exception as e:
+        db.rollback()
+        logger.warning("Error procesando lote de %d ordenes, reintentando una a una: %s", len(messages), e)
+    else:
+        # Las que fallan al publicar se reintentan; process_provider_orders no las
+        # vuelve a insertar, solo se republica su evento
+        return publish_orders_reserved(db_orders)
+    finally:
+        db.close()
+
+    # Si falla el lote, se procesan por separado para devolver solo las que fallan
+    failed = []
+    for index, message in enumerate(messages):
+        try:
+            handle_provider_order(message)
+        except Exception:
+            failed.append(index)
+    return failed
\ No newline at end of file
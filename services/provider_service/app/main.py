@@ -1,20 +1,34 @@
 from fastapi import FastAPI, Depends
 from sqlalchemy.orm import Session
-import threading
 from . import models
-from services.provider_service.app.handlers import handle_provider_order
+from services.provider_service.app.handlers import handle_provider_orders
 from services.provider_service.app.db import init_db, get_db
-from consumer import EventConsumer
+from common.settings import settings
+from async_consumer import AsyncEventConsumer
+from common.dedup import DedupStore
 
-def startup():
+# Consumidor en el mismo event loop que uvicorn (sin hilo bloqueante aparte)
+consumer = AsyncEventConsumer(
+    rabbitmq_host=settings.rabbit_host,
+    rabbitmq_port=settings.rabbit_port,
+    consumer_id="provider-service",
+    # Una orden reentregada (p. ej. tras perder el ack) no se vuelve a insertar
+    dedup=DedupStore()
+)
+# Las ordenes se guardan por lotes: una transacción por cada 100 mensajes
+# (el manejador es síncrono, se ejecuta en un hilo)
+consumer.register_batch_handler("provider_orders", handle_provider_orders, max_batch=100, max_wait=0.5)
+
+async def startup():
     init_db()
-    # Inicia RabbitMQ 
-    consumer = EventConsumer()
-    consumer.register_handler("provider_orders", handle_provider_order)
-    threading.Thread(target=consumer.start, daemon=True).start()
+    await consumer.start()
+
+async def shutdown():
+    await consumer.stop()
 
 app = FastAPI(title="Provider Service")
 app.add_event_handler("startup", startup)
+app.add_event_handler("shutdown", shutdown)
 
 # endpoint para recibir ordenes de proveedor 
 @app.get("/orders")
@@ -8,28 +8,60 @@ def assign_vendor(items: list) -> str:
     # Asigna un proveedor basado en los items
     return items[0]["supplier_id"]
 
-def process_provider_order(order_data: ProviderOrderCreate, db: Session):
+def build_provider_order(order_data: ProviderOrderCreate) -> ProviderOrder:
     # asigno proveedor si no viene en el payload
     if not order_data.vendor_id:
         order_data.vendor_id = assign_vendor(order_data.items)
         
     items_json = [item.dict() for item in order_data.items]
     
-    # Guarda la orden en la base de datos
-    db_order = ProviderOrder(
+    return ProviderOrder(
         order_id=order_data.order_id,
         vendor_id=order_data.vendor_id,
         items=items_json,
         status="reserved" # estado de la orden/pedido
     )
-    db.add(db_order)
-    db.commit()
+
+def process_provider_order(order_data: ProviderOrderCreate, db: Session):
+    # Guarda la orden en la base de datos (si no estaba ya)
+    db_order = process_provider_orders([order_data], db)[0]
 
     # evento de stock reservado
     reserved_payload = StockReserved(
-        order_id=order_data.order_id,
-        reserved_items=items_json
+        order_id=db_order.order_id,
+        reserved_items=db_order.items
     )
     publish_stock_reserved(reserved_payload)
 
-    return db_order
\ No newline at end of file
+    return db_order
+
+def process_provider_orders(orders: list, db: Session):
+    # Guarda todas las ordenes del lote en una sola transacción. Es idempotente por
+    # order_id: si se reintenta porque falló la publicación del evento, las ordenes
+    # ya guardadas no se insertan otra vez y solo se vuelve a publicar
+    order_ids = [order_data.order_id for order_data in orders]
+    saved = {
+        db_order.order_id: db_order
+        for db_order in db.query(ProviderOrder).filter(ProviderOrder.order_id.in_(order_ids))
+    }
+    new_orders = []
+    for order_data in orders:
+        if order_data.order_id not in saved:
+            saved[order_data.order_id] = build_provider_order(order_data)
+            new_orders.append(saved[order_data.order_id])
+    db.add_all(new_orders)
+    db.commit()
+    return [saved[order_id] for order_id in order_ids]
+
+def publish_orders_reserved(db_orders: list) -> list:
+    # eventos de stock reservado, tras confirmar la transacción; devuelve los que fallan
+    failed = []
+    for index, db_order in enumerate(db_orders):
+        try:
+            publish_stock_reserved(StockReserved(
+                order_id=db_order.order_id,
+                reserved_items=db_order.items
+            ))
+        except Exception:
+            failed.append(index)
+    return failed
\ No newline at end of file
@@ -1,12 +1,14 @@
-import json
 from common.rabbitmq import rabbitmq
 from services.request_service.app.schemas import OrderCreate
 
 EXCHANGE = 'order.events'
 ROUTING_KEY = 'order.generated'
 
+def order_message_id(order: OrderCreate) -> str:
+    # ID estable por orden (sus requests no se repiten en otra): si la publicación
+    # se reintenta, el consumidor descarta la copia
+    return f"order-{order.product_id}-{min(order.request_ids)}"
+
 def publish_order(order: OrderCreate):
-    channel = rabbitmq.get_channel()
-    channel.exchange_declare(exchange=EXCHANGE, exchange_type='topic', durable=True)
-    message = json.dumps(order.dict())
-    channel.basic_publish(exchange=EXCHANGE, routing_key=ROUTING_KEY, body=message)
\ No newline at end of file
+    rabbitmq.declare_exchange(EXCHANGE, 'topic')
+    return rabbitmq.publish(EXCHANGE, ROUTING_KEY, order.dict(), message_id=order_message_id(order))
\ No newline at end of file
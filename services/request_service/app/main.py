@@ -1,15 +1,44 @@
+import asyncio
 from fastapi import FastAPI
 from services.request_service.app.db import init_db, SessionLocal
 from services.request_service.app.routers import router
+from services.request_service.app.services import publish_pending_orders
+from common.log import get_logger
+
+# Segundos entre pasadas del relay que publica las ordenes pendientes del outbox
+OUTBOX_INTERVAL = 5.0
+
+logger = get_logger('request_service')
+
+def relay_outbox_once():
+    db = SessionLocal()
+    try:
+        return publish_pending_orders(db)
+    finally:
+        db.close()
+
+async def relay_outbox():
+    # Publica las ordenes que no se pudieron publicar al generarse
+    while True:
+        try:
+            await asyncio.to_thread(relay_outbox_once)
+        except Exception as e:
+            logger.warning("Error en el relay del outbox: %s", e)
+        await asyncio.sleep(OUTBOX_INTERVAL)
 
 # Crear tablas al iniciar
-def startup():
+async def startup():
     init_db()
+    app.state.outbox_relay = asyncio.create_task(relay_outbox())
+
+async def shutdown():
+    app.state.outbox_relay.cancel()
 
 app = FastAPI(title="Request Service")
 app.add_event_handler("startup", startup)
+app.add_event_handler("shutdown", shutdown)
 app.include_router(router)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("request_service.app.main:app", host="0.0.0.0", port=8003, reload=True)
+    uvicorn.run("request_service.app.main:app", host="0.0.0.0", port=8003, reload=True)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, JSON, func
 from common.db import Base
 
 class Request(Base):
@@ -7,4 +7,19 @@ class Request(Base):
     client_id = Column(String, index=True, nullable=False)
     product_id = Column(String, index=True, nullable=False)
     quantity = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ProductPendingTotal(Base):
+    # Suma de las cantidades pendientes por producto, mantenida al crear cada request
+    __tablename__ = 'product_pending_totals'
+    product_id = Column(String, primary_key=True)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class OrderOutbox(Base):
+    # Ordenes generadas pendientes de publicar; se escriben en la misma transacción
+    __tablename__ = 'order_outbox'
+    id = Column(Integer, primary_key=True, index=True)
+    message_id = Column(String, unique=True, nullable=False)
+    payload = Column(JSON, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
@@ -1,14 +1,40 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from services.request_service.app.models import Request as RequestModel
+from sqlalchemy.dialects.postgresql import insert
+from services.request_service.app.models import Request as RequestModel, ProductPendingTotal, OrderOutbox
 from services.request_service.app.schemas import RequestCreate, OrderCreate
-from services.request_service.app.events.publisher import publish_order
+from services.request_service.app.events.publisher import order_message_id, publish_order
+from common.log import get_logger
 from common.settings import settings
 
 MIN_THRESHOLD = settings.min_threshold
 
+logger = get_logger('request_service.services')
+
+
+def _add_pending(db: Session, product_id: str, quantity: int) -> int:
+    """
+    Suma una cantidad al total pendiente del producto y devuelve el nuevo total
+
+    El upsert bloquea la fila del producto hasta el final de la transacción: los
+    requests concurrentes del mismo producto esperan aquí y ven el total ya
+    actualizado, así que solo uno de ellos cruza el umbral.
+    """
+    stmt = insert(ProductPendingTotal).values(product_id=product_id, total_quantity=quantity)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductPendingTotal.product_id],
+        set_={
+            'total_quantity': ProductPendingTotal.total_quantity + stmt.excluded.total_quantity,
+            'updated_at': func.now(),
+        }
+    ).returning(ProductPendingTotal.total_quantity)
+    return db.execute(stmt).scalar_one()
+
 
 def create_request(db: Session, req: RequestCreate) -> RequestModel:
+    # Total pendiente del producto (con la fila bloqueada) antes de guardar el request
+    total = _add_pending(db, req.product_id, req.quantity)
+
     # Guardar el request
     new_req = RequestModel(
         client_id=req.client_id,
@@ -16,25 +42,81 @@ def create_request(db: Session, req: RequestCreate) -> RequestModel:
         quantity=req.quantity
     )
     db.add(new_req)
-    db.commit()
+    db.flush()
     db.refresh(new_req)
 
-    # Sumar cantidades pendientes por producto
-    total = db.query(func.sum(RequestModel.quantity)) \
-             .filter(RequestModel.product_id == req.product_id) \
-             .scalar() or 0
-
+    outbox_id = None
     if total >= MIN_THRESHOLD:
         # Recoger IDs para encapsular en la orden
-        reqs = db.query(RequestModel).filter(RequestModel.product_id == req.product_id).all()
+        reqs = db.query(RequestModel.id).filter(RequestModel.product_id == req.product_id).all()
         order_payload = OrderCreate(
             product_id=req.product_id,
             total_quantity=total,
             request_ids=[r.id for r in reqs]
         )
-        # Publicar evento y limpiar requests procesados
-        publish_order(order_payload)
-        db.query(RequestModel).filter(RequestModel.product_id == req.product_id).delete()
-        db.commit()
+        # La orden va al outbox junto con la limpieza de los requests procesados:
+        # se publica tras el commit, fuera del bloqueo del total
+        outbox = OrderOutbox(message_id=order_message_id(order_payload), payload=order_payload.dict())
+        db.add(outbox)
+        db.flush()
+        outbox_id = outbox.id
+        db.query(RequestModel).filter(RequestModel.product_id == req.product_id) \
+          .delete(synchronize_session=False)
+        db.query(ProductPendingTotal).filter(ProductPendingTotal.product_id == req.product_id) \
+          .update({'total_quantity': 0}, synchronize_session=False)
+
+    # Se devuelve ya cargado: si entró en la orden, su fila ya no existe tras el commit
+    db.expunge(new_req)
+    # Request, total, limpieza y outbox en una sola transacción (libera el bloqueo)
+    db.commit()
 
-    return new_req
\ No newline at end of file
+    if outbox_id is not None:
+        _publish_outbox_entry(db, outbox_id)
+    return new_req
+
+
+def _publish_outbox_entry(db: Session, entry_id: int) -> bool:
+    """
+    Publica una orden del outbox y la borra
+
+    Si la publicación falla, la orden queda en el outbox para publish_pending_orders.
+    """
+    # Bloqueo de la fila: si el relay ya la está publicando, se le deja a él
+    entry = db.query(OrderOutbox).filter(OrderOutbox.id == entry_id) \
+              .with_for_update(skip_locked=True).first()
+    if entry is None:
+        db.rollback()
+        return False
+    try:
+        publish_order(OrderCreate(**entry.payload))
+    except Exception as e:
+        db.rollback()
+        logger.warning("Orden %s pendiente de publicar: %s", entry_id, e)
+        return False
+    db.delete(entry)
+    db.commit()
+    return True
+
+
+def publish_pending_orders(db: Session, limit: int = 100) -> int:
+    """
+    Publica las ordenes que quedaron en el outbox (p. ej. con RabbitMQ caído)
+
+    Returns:
+        Número de ordenes publicadas
+    """
+    entries = db.query(OrderOutbox).order_by(OrderOutbox.id) \
+                .with_for_update(skip_locked=True).limit(limit).all()
+    published = 0
+    for entry in entries:
+        try:
+            publish_order(OrderCreate(**entry.payload))
+        except Exception as e:
+            logger.warning("No se pudieron publicar las ordenes pendientes: %s", e)
+            break
+        db.delete(entry)
+        published += 1
+    db.commit()
+    if published:
+        logger.info("%d ordenes pendientes publicadas", published)
+    return published
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS product_pending_totals (
+    product_id      VARCHAR(255) PRIMARY KEY,
+    total_quantity  INT NOT NULL DEFAULT 0 CHECK (total_quantity >= 0),
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Totales de los requests que ya estaban pendientes
+INSERT INTO product_pending_totals (product_id, total_quantity)
+SELECT product_id, SUM(quantity) FROM requests GROUP BY product_id
+ON CONFLICT (product_id) DO UPDATE
+    SET total_quantity = EXCLUDED.total_quantity, updated_at = NOW();
+
+CREATE INDEX IF NOT EXISTS ix_requests_product_id ON requests (product_id);
\ No newline at end of file
@@ -0,0 +1,6 @@
+CREATE TABLE IF NOT EXISTS order_outbox (
+    id          SERIAL PRIMARY KEY,
+    message_id  VARCHAR(255) NOT NULL UNIQUE,
+    payload     JSON NOT NULL,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
\ No newline at end of file
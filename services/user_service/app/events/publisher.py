@@ -1,16 +1,15 @@
-import json
+from common.log import SAMPLED, get_logger
 from common.rabbitmq import rabbitmq
 from services.user_service.app.schemas import UserEvent
 
 EXCHANGE = 'user.events'
 ROUTING_KEY = 'user.{event_type}'  # user.created, user.updated, etc.
 
+logger = get_logger('user_service.publisher')
+
 def publish_user_event(event: UserEvent):
-    channel = rabbitmq.get_channel()
-    channel.exchange_declare(exchange=EXCHANGE, exchange_type='topic', durable=True)
+    rabbitmq.declare_exchange(EXCHANGE, 'topic')
     
     routing_key = ROUTING_KEY.format(event_type=event.event_type)
-    message = json.dumps(event.dict())
-    
-    channel.basic_publish(exchange=EXCHANGE, routing_key=routing_key, body=message)
-    print(f"Evento publicado: {routing_key}")
\ No newline at end of file
+    rabbitmq.publish(EXCHANGE, routing_key, event.dict())
+    logger.debug("Evento publicado: %s", routing_key, extra=SAMPLED)
\ No newline at end of file
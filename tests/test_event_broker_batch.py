@@ -0,0 +1,42 @@
+import uuid
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('pika')
+
+from common.memory_broker import get_memory_broker
+from event_broker import EventBroker
+
+
+@pytest.fixture
+def broker():
+    # Host propio por prueba: el broker en memoria se comparte por (host, puerto)
+    broker = EventBroker(host=f"test-{uuid.uuid4().hex}", transport='memory', pool_size=2)
+    broker.declare_exchange('events', 'topic')
+    broker.declare_queue('events.all')
+    broker.bind_queue('events.all', 'events', '#')
+    yield broker
+    broker.stop()
+
+
+def test_batch_reports_each_message(broker):
+    # Declarado fuera del broker: se comprueba con una declaración pasiva
+    get_memory_broker(broker.host, broker.port).exchange_declare('external', 'topic', durable=True)
+
+    response = broker.app.test_client().post('/messages/batch', json={"messages": [
+        {"exchangeName": 'events', "routingKey": 'a', "message": {'n': 0}},
+        {"exchangeName": 'missing', "routingKey": 'a', "message": {'n': 1}},
+        {"exchangeName": 'events', "routingKey": 'a'},
+        {"exchangeName": 'external', "routingKey": 'a', "message": {'n': 3}},
+        {"exchangeName": 'events', "routingKey": 'a', "message": {'n': 4, 'message_id': 'keep-me'}},
+    ]})
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [result["status"] for result in body["results"]] == ['ack', 'error', 'error', 'ack', 'ack']
+    assert [result["index"] for result in body["results"]] == list(range(5))
+    assert "NOT_FOUND" in body["results"][1]["error"]
+    assert body["results"][4]["messageId"] == 'keep-me'
+    assert (body["acked"], body["failed"]) == (3, 2)
+    assert len(get_memory_broker(broker.host, broker.port).queues['events.all'].messages) == 2
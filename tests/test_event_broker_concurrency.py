@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('pika')
+
+from event_broker import EventBroker
+
+THREADS = 16
+MESSAGES_PER_THREAD = 50
+POOL_SIZE = 4
+
+
+class FakeConnection:
+    """
+    Conexión falsa que, como una BlockingConnection de pika, no admite dos hilos a
+    la vez: cada operación de sus canales marca la conexión como ocupada y anota
+    una colisión si otro hilo ya la estaba usando.
+    """
+
+    def __init__(self, published, collisions):
+        self.published = published
+        self.collisions = collisions
+        self.is_open = True
+        self._busy = threading.Lock()
+
+    def use(self):
+        if not self._busy.acquire(blocking=False):
+            self.collisions.append(threading.current_thread().name)
+            return False
+        # Ensancha la ventana en la que otro hilo podría entrar en la misma conexión
+        time.sleep(0.0005)
+        return True
+
+    def release(self):
+        self._busy.release()
+
+    def channel(self):
+        return FakeChannel(self)
+
+    def process_data_events(self, time_limit=0):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_open = True
+
+    def _call(self, action=None):
+        if not self.connection.use():
+            return
+        try:
+            if action is not None:
+                action()
+        finally:
+            self.connection.release()
+
+    def exchange_declare(self, **kwargs):
+        self._call()
+
+    def queue_declare(self, **kwargs):
+        self._call()
+
+    def queue_bind(self, **kwargs):
+        self._call()
+
+    def confirm_delivery(self):
+        self._call()
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self._call(lambda: self.connection.published.append((routing_key, properties, body)))
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    published = []
+    collisions = []
+    monkeypatch.setattr(EventBroker, '_new_connection', lambda self: FakeConnection(published, collisions))
+    broker = EventBroker(pool_size=POOL_SIZE)
+    broker.declare_exchange('events', 'topic')
+    broker.published = published
+    broker.collisions = collisions
+    yield broker
+    broker.stop()
+
+
+def test_concurrent_publishes(broker):
+    start = threading.Barrier(THREADS)
+    responses = []
+    errors = []
+    lock = threading.Lock()
+
+    def hammer(thread):
+        client = broker.app.test_client()
+        start.wait()
+        for seq in range(MESSAGES_PER_THREAD):
+            try:
+                response = client.post('/messages', json={
+                    'exchangeName': 'events',
+                    'routingKey': f'hammer.{thread}',
+                    'message': {'thread': thread, 'seq': seq}
+                })
+                with lock:
+                    responses.append((response.status_code, response.get_json()))
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=hammer, args=(thread,)) for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    total = THREADS * MESSAGES_PER_THREAD
+    assert not errors
+    assert len(responses) == total
+    assert all(status == 201 for status, _ in responses), [body for status, body in responses if status != 201][:5]
+
+    # Ninguna conexión se usó desde dos hilos a la vez
+    assert not broker.collisions
+
+    # Las publicaciones se repartieron entre varias conexiones del pool, sin pasar de su tamaño
+    stats = broker.pool.stats()
+    assert 1 < stats["created"] <= POOL_SIZE
+
+    # Cada mensaje se publicó una sola vez, íntegro y con el ID que devolvió la API
+    message_ids = {body['messageId'] for _, body in responses}
+    assert len(message_ids) == total
+    messages = [(properties, json.loads(body)) for _, properties, body in broker.published]
+    assert len(messages) == total
+    assert {properties.message_id for properties, _ in messages} == message_ids
+    assert sorted((message['thread'], message['seq']) for _, message in messages) == [
+        (thread, seq) for thread in range(THREADS) for seq in range(MESSAGES_PER_THREAD)
+    ]
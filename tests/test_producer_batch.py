@@ -0,0 +1,106 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+pika = pytest.importorskip('pika')
+pytest.importorskip('requests')
+
+from pika.adapters.blocking_connection import BlockingChannel
+
+from common.confirms import NACK_ERROR, ConfirmTracker
+from common.memory_broker import get_memory_broker
+from producer import EventProducer
+
+
+class FakeImpl:
+    """Canal asíncrono de pika falso: guarda lo publicado y el callback de confirmaciones"""
+
+    is_open = True
+    is_closed = False
+
+    def __init__(self):
+        self.published = []
+        self.on_confirm = None
+
+    def confirm_delivery(self, ack_nack_callback, callback=None):
+        self.on_confirm = ack_nack_callback
+        callback(SimpleNamespace(method=pika.spec.Confirm.SelectOk()))
+
+    def basic_publish(self, **kwargs):
+        self.published.append(kwargs)
+
+
+class FakeBlockingChannel(BlockingChannel):
+    """BlockingChannel que entrega unas confirmaciones fijas al atender la E/S"""
+
+    def __init__(self):
+        self._impl = FakeImpl()
+        self.confirms = []
+        self.flushes = 0
+
+    def _flush_output(self, *waiters):
+        self.flushes += 1
+        for method in self.confirms:
+            self._impl.on_confirm(SimpleNamespace(method=method))
+        self.confirms = []
+
+
+def test_tracker_maps_grouped_confirms_to_delivery_tags():
+    channel = FakeBlockingChannel()
+    tracker = ConfirmTracker(channel)
+    channel.flushes = 0
+    channel.confirms = [
+        pika.spec.Basic.Ack(delivery_tag=3, multiple=True),
+        pika.spec.Basic.Nack(delivery_tag=4),
+        pika.spec.Basic.Ack(delivery_tag=5),
+    ]
+
+    tags = [tracker.basic_publish(exchange='events', routing_key='a', body=b'{}') for _ in range(5)]
+    assert tags == [1, 2, 3, 4, 5]
+    # Publicar no espera confirmaciones: todo el lote sale antes de atender la E/S
+    assert len(channel._impl.published) == 5
+    assert channel.flushes == 0
+
+    tracker.wait()
+    assert channel.flushes == 1
+    assert tracker.take() == {1: None, 2: None, 3: None, 4: NACK_ERROR, 5: None}
+
+
+@pytest.fixture
+def rabbit():
+    # Host propio por prueba: el broker en memoria se comparte por (host, puerto)
+    host = f"test-{uuid.uuid4().hex}"
+    broker = get_memory_broker(host, 5672)
+    broker.exchange_declare('legacy', 'fanout', durable=True)
+    broker.exchange_declare('events', 'topic', durable=True)
+    broker.queue_declare('events.all', durable=True)
+    broker.queue_bind('events.all', 'events', '#')
+    return host, broker
+
+
+def test_direct_batch_reports_errors_per_message(rabbit):
+    host, broker = rabbit
+    producer = EventProducer(rabbitmq_host=host, transport='memory')
+
+    entries = []
+    for n in range(6):
+        message_id, message = producer._build_message({'n': n})
+        if n == 5:
+            message['payload'] = object()  # no serializable
+        entries.append({
+            "exchangeName": 'legacy' if n % 3 == 1 else 'events',
+            "routingKey": 'a',
+            "message": message,
+            "messageId": message_id,
+        })
+
+    results = producer._publish_entries(entries, use_api=False)
+    producer.close()
+
+    assert [result["status"] for result in results] == ['ack', 'error', 'ack', 'ack', 'error', 'error']
+    assert all(result["retryable"] is False for result in results)
+    assert [result["messageId"] for result in results if result["status"] == 'ack'] == [
+        entries[n]["messageId"] for n in (0, 2, 3)
+    ]
+    assert len(broker.queues['events.all'].messages) == 3
@@ -0,0 +1,100 @@
+import uuid
+
+import pytest
+
+pytest.importorskip('pika')
+pytest.importorskip('requests')
+
+from common.memory_broker import get_memory_broker
+from common.spool import PARKED_FILE, MessageSpool, SpoolDrainer
+from producer import EventProducer
+
+
+@pytest.fixture
+def rabbit():
+    # Host propio por prueba: el broker en memoria se comparte por (host, puerto)
+    host = f"test-{uuid.uuid4().hex}"
+    broker = get_memory_broker(host, 5672)
+    # 'legacy' existe con otro tipo: declararlo como topic da PRECONDITION_FAILED
+    broker.exchange_declare('legacy', 'fanout', durable=True)
+    broker.exchange_declare('events', 'topic', durable=True)
+    broker.queue_declare('events.all', durable=True)
+    broker.queue_bind('events.all', 'events', '#')
+    return host, broker
+
+
+@pytest.fixture
+def producer(rabbit, tmp_path):
+    host, _ = rabbit
+    producer = EventProducer(rabbitmq_host=host, transport='memory', spool_dir=str(tmp_path / 'spool'))
+    yield producer
+    producer.close()
+
+
+def test_permanent_error_is_not_spooled(rabbit, producer):
+    _, broker = rabbit
+
+    assert producer.publish({'n': 0}, exchange_name='legacy', routing_key='a', use_api=False) is None
+    assert producer.spool_stats()["records"] == 0
+
+    # Los mensajes siguientes se publican en lugar de quedar detrás en el spool
+    ids = [producer.publish({'n': n}, exchange_name='events', routing_key='a', use_api=False) for n in range(1, 4)]
+    assert all(ids)
+    assert producer.spool_stats()["records"] == 0
+    assert len(broker.queues['events.all'].messages) == 3
+
+
+def test_batch_permanent_errors_are_returned(rabbit, producer):
+    results = producer.publish_batch([{'n': 0}], exchange_name='legacy', routing_key='a', use_api=False)
+    assert results[0]["status"] == "error"
+    assert results[0]["retryable"] is False
+    assert producer.spool_stats()["records"] == 0
+
+
+def test_drainer_parks_permanent_failures(rabbit, producer, tmp_path):
+    _, broker = rabbit
+    spool = MessageSpool(str(tmp_path / 'drain'))
+
+    def record(exchange_name, n):
+        message_id, message = producer._build_message({'n': n})
+        return {"useApi": False, "entry": {
+            "exchangeName": exchange_name,
+            "routingKey": 'a',
+            "message": message,
+            "messageId": message_id,
+        }}
+
+    # Un registro que ya no se puede publicar delante de tres válidos
+    spool.append(record('legacy', 0))
+    for n in range(1, 4):
+        spool.append(record('events', n))
+
+    drainer = SpoolDrainer(spool, producer._send_spooled, batch_size=1)
+    assert [drainer.drain_once() for _ in range(4)] == [1, 1, 1, 1]
+
+    stats = spool.stats()
+    assert stats["records"] == 0
+    assert stats["drained"] == 3
+    assert stats["failed"] == 1
+    assert len(broker.queues['events.all'].messages) == 3
+    assert (tmp_path / 'drain' / PARKED_FILE).read_text().count('\n') == 1
+    spool.close()
+
+
+def test_drainer_stops_at_unreachable_broker(tmp_path):
+    spool = MessageSpool(str(tmp_path / 'drain'))
+    for n in range(3):
+        spool.append({"n": n})
+
+    results = [
+        {"status": "ack", "retryable": False},
+        {"status": "error", "error": "Ningún nodo de RabbitMQ disponible", "retryable": True},
+        {"status": "ack", "retryable": False},
+    ]
+    drainer = SpoolDrainer(spool, lambda records: results)
+    assert drainer.drain_once() == 1
+
+    # Lo que sigue al error de conectividad se reintenta en orden
+    assert [record for record, _ in spool.read()] == [{"n": 1}, {"n": 2}]
+    assert spool.stats()["failed"] == 0
+    spool.close()